@@ -0,0 +1,431 @@
+import numpy as np
+
+from consts import Powerups, Smart, Speed
+from game import LEVEL_ENEMIES, LEVEL_POWERUPS, LIVES, MAP_SIZE, MIN_BOMB_RADIUS, TIMEOUT, new_seed
+from mapa import level_map
+
+KEYS = ["", "w", "a", "s", "d", "A", "B"]  # Key codes understood by BatchGame.step
+KEY_CODES = {key: code for code, key in enumerate(KEYS)}
+MOVES = np.array([(0, 0), (0, -1), (-1, 0), (0, 1), (1, 0)])  # By key code: "", w, a, s, d
+DIRECTIONS = MOVES[1:]
+
+MAX_BOMBS = 1 + list(LEVEL_POWERUPS.values()).count(Powerups.Bombs)
+MAX_ENEMIES = max(len(enemies) for enemies in LEVEL_ENEMIES.values())
+
+
+def compute_reach(stones):
+    """
+    Function that computes, for every tile of a batch of maps, how many tiles a blast can
+    travel in each direction (w, a, s, d) before hitting a stone or the end of the map
+    @param stones: Boolean array (games, hor_tiles, ver_tiles) of stones
+    @returns: Array (4, games, hor_tiles, ver_tiles)
+    """
+    reach = np.zeros((4,) + stones.shape, dtype=np.int16)
+    free = ~stones
+    w, a, s, d = reach
+    for y in range(1, stones.shape[2]):
+        w[:, :, y] = np.where(free[:, :, y - 1], w[:, :, y - 1] + 1, 0)
+    for x in range(1, stones.shape[1]):
+        a[:, x] = np.where(free[:, x - 1], a[:, x - 1] + 1, 0)
+    for y in range(stones.shape[2] - 2, -1, -1):
+        s[:, :, y] = np.where(free[:, :, y + 1], s[:, :, y + 1] + 1, 0)
+    for x in range(stones.shape[1] - 2, -1, -1):
+        d[:, x] = np.where(free[:, x + 1], d[:, x + 1] + 1, 0)
+    return reach
+
+
+class BatchGame:
+    """
+    N Bomberman games held as stacked numpy arrays and stepped all at once, following the same
+    rules as Game.step: bombs count down and blow up, the bomberman moves, enemies move (one
+    enemy slot at a time, so each sees the ones that already moved) and collisions are checked.
+    Bombs are kept oldest first and enemies in LEVEL_ENEMIES order, like Game's lists.
+    Games that are over aren't stepped anymore.
+    """
+
+    def __init__(self, games, level=1, lives=LIVES, timeout=TIMEOUT, size=MAP_SIZE, seed=None, maps=None):
+        """
+        @param games: How many games to run
+        @param level: Level every game starts at (with the powerups of the previous levels)
+        @param lives: Lives every bomberman starts with
+        @param timeout: Steps allowed per level
+        @param seed: Seed of the first game (the next ones get the next numbers), for its maps
+        @param maps: map_pack.MapPack to load the maps from, when it has them
+        """
+        first_seed = new_seed(seed)
+        self.allocate(games, size, [first_seed + game for game in range(games)], maps)
+        self.timeout[:] = timeout
+        self.lives[:] = lives
+
+        all_games = np.arange(games)
+        for powerup in range(1, level):
+            self.add_powerups(all_games, np.full(games, LEVEL_POWERUPS[powerup]))
+        for game in all_games:
+            self.next_level(game, level)
+
+    def allocate(self, games, size, seeds, maps=None):
+        self.games = games
+        self.size = size
+        self.seeds = seeds  # Seed of every game's maps
+        self.maps = maps
+        hor_tiles, ver_tiles = size
+
+        self.running = np.ones(games, dtype=bool)
+        self.level = np.zeros(games, dtype=np.int32)
+        self.step_number = np.zeros(games, dtype=np.int32)  # Steps in the current level
+        self.total_steps = np.zeros(games, dtype=np.int32)
+        self.timeout = np.zeros(games, dtype=np.int32)
+        self.score = np.zeros(games, dtype=np.int64)
+
+        # Bomberman
+        self.pos = np.ones((games, 2), dtype=np.int32)
+        self.lives = np.zeros(games, dtype=np.int32)
+        self.flames = np.zeros(games, dtype=np.int32)
+        self.extra_bombs = np.zeros(games, dtype=np.int32)
+        self.speed = np.zeros(games, dtype=np.int32)
+        self.detonator = np.zeros(games, dtype=bool)
+        self.wallpass = np.zeros(games, dtype=bool)
+        self.bombpass = np.zeros(games, dtype=bool)
+        self.flamepass = np.zeros(games, dtype=bool)
+
+        # Map
+        self.stones = np.zeros((games, hor_tiles, ver_tiles), dtype=bool)
+        self.walls = np.zeros((games, hor_tiles, ver_tiles), dtype=bool)
+        self.reach = np.zeros((4, games, hor_tiles, ver_tiles), dtype=np.int16)
+        self.exit_door = np.zeros((games, 2), dtype=np.int32)
+        self.exit_visible = np.zeros(games, dtype=bool)
+        self.powerup_pos = np.zeros((games, 2), dtype=np.int32)
+        self.powerup_type = np.zeros(games, dtype=np.int32)
+        self.powerup_visible = np.zeros(games, dtype=bool)
+
+        # Bombs, oldest first. Timers count half seconds: the bomb explodes when it gets to 0
+        self.bomb_count = np.zeros(games, dtype=np.int32)
+        self.bomb_pos = np.zeros((games, MAX_BOMBS, 2), dtype=np.int32)
+        self.bomb_timer = np.zeros((games, MAX_BOMBS), dtype=np.int32)
+        self.bomb_radius = np.zeros((games, MAX_BOMBS), dtype=np.int32)
+        self.bomb_detonator = np.zeros((games, MAX_BOMBS), dtype=bool)
+
+        # Enemies
+        self.enemy_alive = np.zeros((games, MAX_ENEMIES), dtype=bool)
+        self.enemy_pos = np.zeros((games, MAX_ENEMIES, 2), dtype=np.int32)
+        self.enemy_spawn = np.zeros((games, MAX_ENEMIES, 2), dtype=np.int32)
+        self.enemy_lastpos = np.zeros((games, MAX_ENEMIES, 2), dtype=np.int32)
+        self.enemy_moved = np.zeros((games, MAX_ENEMIES), dtype=bool)  # Whether lastpos is set
+        self.enemy_lastdir = np.zeros((games, MAX_ENEMIES), dtype=np.int32)
+        self.enemy_step = np.zeros((games, MAX_ENEMIES), dtype=np.int32)
+        self.enemy_speed = np.zeros((games, MAX_ENEMIES), dtype=np.int32)
+        self.enemy_smart = np.zeros((games, MAX_ENEMIES), dtype=np.int32)
+        self.enemy_wallpass = np.zeros((games, MAX_ENEMIES), dtype=bool)
+        self.enemy_points = np.zeros((games, MAX_ENEMIES), dtype=np.int32)
+
+    @classmethod
+    def from_games(cls, games):
+        """
+        Method that builds a batch out of running Game instances, copying their whole state
+        (the next levels get the same maps as in the games)
+        @param games: The Game instances, all with the same map size
+        """
+        batch = cls.__new__(cls)
+        batch.allocate(len(games), games[0].map.size, [game._seed for game in games], games[0]._maps)
+        for i, game in enumerate(games):
+            bomberman = game._bomberman
+            batch.running[i] = game.running
+            batch.level[i] = game.map.level
+            batch.step_number[i] = game._step
+            batch.total_steps[i] = game.total_steps
+            batch.timeout[i] = game._timeout
+            batch.score[i] = game.score
+            batch.pos[i] = bomberman.pos
+            batch.lives[i] = bomberman.lives
+            batch.add_powerups(np.full(len(bomberman.powers), i), np.array(bomberman.powers, dtype=int))
+
+            batch.load_map(i, game.map)
+            if len(game._exit) > 0:  # Revealed
+                batch.exit_door[i], batch.exit_visible[i] = game._exit, True
+            for pos, _type in game._powerups:
+                batch.powerup_pos[i], batch.powerup_type[i] = pos, _type
+                batch.powerup_visible[i] = True
+
+            batch.bomb_count[i] = len(game._bombs)
+            for j, bomb in enumerate(game._bombs):
+                batch.bomb_pos[i, j] = bomb.pos
+                batch.bomb_timer[i, j] = round(2 * bomb.timeout)
+                batch.bomb_radius[i, j] = bomb.radius
+                batch.bomb_detonator[i, j] = bomb._detonator
+
+            batch.load_enemies(i, game._enemies)
+        return batch
+
+    def load_map(self, game, mapa):
+        self.stones[game] = mapa.stone_mask
+        self.walls[game] = mapa.wall_mask
+        self.reach[:, game] = compute_reach(mapa.stone_mask[None])[:, 0]
+        self.exit_visible[game] = False
+        self.powerup_visible[game] = False
+        # Set whether or not walls are left: the exit can be revealed with no wall left on it
+        if getattr(mapa, "exit_door", None) is not None:
+            self.exit_door[game] = mapa.exit_door
+        if getattr(mapa, "powerup", None) is not None:
+            self.powerup_pos[game] = mapa.powerup
+            self.powerup_type[game] = LEVEL_POWERUPS[mapa.level]
+
+    def load_enemies(self, game, enemies):
+        self.enemy_alive[game] = False
+        for j, enemy in enumerate(enemies):
+            self.enemy_alive[game, j] = True
+            self.enemy_pos[game, j] = enemy.pos
+            self.enemy_spawn[game, j] = enemy._spawn_pos
+            self.enemy_moved[game, j] = enemy.lastpos is not None
+            if enemy.lastpos is not None:
+                self.enemy_lastpos[game, j] = enemy.lastpos
+            self.enemy_lastdir[game, j] = enemy.lastdir
+            self.enemy_step[game, j] = enemy.step
+            self.enemy_speed[game, j] = enemy._speed
+            self.enemy_smart[game, j] = enemy._smart
+            self.enemy_wallpass[game, j] = enemy._wallpass
+            self.enemy_points[game, j] = enemy.points()
+
+    def next_level(self, game, level):
+        if level > len(LEVEL_ENEMIES):  # You WIN
+            self.stop(np.array([game]))
+            return
+
+        mapa = level_map(self.seeds[game], level, self.size, len(LEVEL_ENEMIES[level]), self.maps)
+        self.level[game] = level
+        self.load_map(game, mapa)
+        self.pos[game] = mapa.bomberman_spawn
+        self.total_steps[game] += self.step_number[game]
+        self.step_number[game] = 0
+        self.bomb_count[game] = 0
+        self.load_enemies(game, [t(p) for t, p in zip(LEVEL_ENEMIES[level], mapa.enemies_spawn)])
+
+    def add_powerups(self, games, types):
+        for counter, powerup in [
+            (self.flames, Powerups.Flames),
+            (self.extra_bombs, Powerups.Bombs),
+            (self.speed, Powerups.Speed),
+        ]:
+            np.add.at(counter, games[types == powerup], 1)
+        for flag, powerup in [
+            (self.detonator, Powerups.Detonator),
+            (self.wallpass, Powerups.Wallpass),
+            (self.bombpass, Powerups.Bombpass),
+            (self.flamepass, Powerups.Flamepass),
+        ]:
+            flag[games[types == powerup]] = True
+
+    def stop(self, games):
+        games = games[self.running[games]]  # A game can be lost on its last step, count it once
+        self.total_steps[games] += self.step_number[games]
+        self.running[games] = False
+
+    def kill_bomberman(self, games):
+        self.lives[games] -= 1
+        alive = self.lives[games] > 0
+        self.pos[games[alive]] = (1, 1)  # Respawn
+        self.bomb_count[games[alive]] = 0
+        self.stop(games[~alive])
+
+    def is_blocked(self, games, x, y, wallpass):
+        """
+        Method that checks, for many games at once, whether tiles can't be walked into
+        @param games: Game indexes, broadcastable with x and y
+        @param wallpass: Whether walls can be walked through, broadcastable with x and y
+        """
+        hor_tiles, ver_tiles = self.size
+        outside = (x < 0) | (x >= hor_tiles) | (y < 0) | (y >= ver_tiles)
+        x, y = np.clip(x, 0, hor_tiles - 1), np.clip(y, 0, ver_tiles - 1)
+        return outside | self.stones[games, x, y] | (self.walls[games, x, y] & ~np.asarray(wallpass, dtype=bool))
+
+    def in_blast(self, games, bx, by, radius, x, y):
+        """
+        Method that checks, for many games at once, whether tiles are hit by a bomb's blast
+        @param games: Game indexes, broadcastable with the bombs' bx, by and radius
+        @param x: Tiles' x, broadcastable with the bombs (e.g. a grid to get a whole blast)
+        """
+        up, left, down, right = [np.minimum(radius, reach[games, bx, by]) for reach in self.reach]
+        dx, dy = x - bx, y - by
+        return ((dy == 0) & (-left <= dx) & (dx <= right)) | ((dx == 0) & (-up <= dy) & (dy <= down))
+
+    def step(self, keys):
+        """
+        Method that advances every running game one tick
+        @param keys: Key pressed in each game, as strings or KEYS codes (-1 for none)
+        @returns: Reward (score gained), done flag and state of every game, as arrays
+        """
+        keys = np.array(
+            [KEY_CODES.get(key, -1) for key in keys] if len(keys) and isinstance(keys[0], str) else keys,
+            dtype=np.int32,
+        )
+        score = self.score.copy()
+        active = self.running.copy()
+
+        self.step_number[active] += 1
+        self.stop(np.nonzero(active & (self.step_number == self.timeout))[0])
+
+        self.explode_bombs(active)
+        self.update_bomberman(active, keys)
+        self.collision(active)
+        self.move_enemies(active & (self.step_number % (self.speed + 1) == 0))
+        self.collision(active)
+
+        return self.score - score, ~self.running, self.state
+
+    def explode_bombs(self, active):
+        slots = np.arange(MAX_BOMBS)
+        listed = active[:, None] & (slots < self.bomb_count[:, None])
+        self.bomb_timer[listed & ~self.bomb_detonator] -= 1
+        exploded = listed & (self.bomb_timer <= 0)
+        if not exploded.any():
+            return
+
+        hor_tiles, ver_tiles = self.size
+        grid_x = np.arange(hor_tiles)[None, :, None]
+        grid_y = np.arange(ver_tiles)[None, None, :]
+        for slot in slots:  # Oldest first, as the bomberman respawns on the first hit
+            games = np.nonzero(exploded[:, slot])[0]
+            if not games.size:
+                continue
+            bx, by = self.bomb_pos[games, slot].T
+            radius = self.bomb_radius[games, slot]
+
+            hit = self.in_blast(games, bx, by, radius, self.pos[games, 0], self.pos[games, 1])
+            self.kill_bomberman(games[hit & ~self.flamepass[games]])
+
+            bombs = [array[:, None, None] for array in [games, bx, by, radius]]
+            blast = self.in_blast(*bombs, grid_x, grid_y)
+            destroyed = blast & self.walls[games]
+            self.walls[games] &= ~blast
+            index = np.arange(games.size)
+            self.exit_visible[games] |= destroyed[index, self.exit_door[games, 0], self.exit_door[games, 1]]
+            self.powerup_visible[games] |= destroyed[index, self.powerup_pos[games, 0], self.powerup_pos[games, 1]]
+
+            bombs = [array[:, None] for array in [games, bx, by, radius]]
+            killed = self.enemy_alive[games] & self.in_blast(
+                *bombs, self.enemy_pos[games, :, 0], self.enemy_pos[games, :, 1]
+            )
+            self.score[games] += (killed * self.enemy_points[games]).sum(axis=1)
+            self.enemy_alive[games] &= ~killed
+
+        # Drop exploded bombs, keeping the others in order (bombs of a dead bomberman are all gone)
+        games = np.nonzero(exploded.any(axis=1))[0]
+        keep = (slots < self.bomb_count[games, None]) & ~exploded[games]
+        order = np.argsort(~keep, axis=1, kind="stable")
+        for bombs in [self.bomb_pos, self.bomb_timer, self.bomb_radius, self.bomb_detonator]:
+            bombs[games] = np.take_along_axis(bombs[games], order.reshape(order.shape + (1,) * (bombs.ndim - 2)), axis=1)
+        self.bomb_count[games] = keep.sum(axis=1)
+
+    def update_bomberman(self, active, keys):
+        # Detonate the oldest bomb
+        games = np.nonzero(active & (keys == KEY_CODES["A"]) & (self.bomb_count > 0))[0]
+        games = games[self.bomb_detonator[games, 0]]
+        self.bomb_timer[games, 0] = 0
+
+        # Drop a bomb
+        games = np.nonzero(active & (keys == KEY_CODES["B"]) & (self.bomb_count < self.extra_bombs + 1))[0]
+        games = games[~self.is_blocked(games, self.pos[games, 0], self.pos[games, 1], False)]
+        slots = self.bomb_count[games]
+        self.bomb_pos[games, slots] = self.pos[games]
+        self.bomb_radius[games, slots] = MIN_BOMB_RADIUS + self.flames[games]
+        self.bomb_timer[games, slots] = 2 * (self.bomb_radius[games, slots] + 1)
+        self.bomb_detonator[games, slots] = self.detonator[games]
+        self.bomb_count[games] += 1
+
+        # Move, not into stones/walls nor over bombs, and consume powerups
+        games = np.nonzero(active & (keys >= 0) & (keys < len(MOVES)))[0]
+        new_pos = self.pos[games] + MOVES[keys[games]]
+        blocked = self.is_blocked(games, new_pos[:, 0], new_pos[:, 1], self.wallpass[games])
+        new_pos[blocked] = self.pos[games][blocked]
+        on_bomb = (
+            (self.bomb_pos[games] == new_pos[:, None]).all(axis=2)
+            & (np.arange(MAX_BOMBS) < self.bomb_count[games, None])
+        ).any(axis=1)
+        moved = self.bombpass[games] | ~on_bomb
+        self.pos[games[moved]] = new_pos[moved]
+
+        consumed = self.powerup_visible[games] & (new_pos == self.powerup_pos[games]).all(axis=1)
+        self.add_powerups(games[consumed], self.powerup_type[games[consumed]])
+        self.powerup_visible[games[consumed]] = False
+
+        completed = (
+            active
+            & ~self.enemy_alive.any(axis=1)
+            & self.exit_visible
+            & (self.pos == self.exit_door).all(axis=1)
+        )
+        for game in np.nonzero(completed)[0]:
+            self.next_level(game, int(self.level[game]) + 1)  # Not an int32, map_rng takes it modulo 2**32
+
+    def collision(self, active):
+        for enemy in range(MAX_ENEMIES):
+            games = np.nonzero(
+                active & self.enemy_alive[:, enemy] & (self.enemy_pos[:, enemy] == self.pos).all(axis=1)
+            )[0]
+            if games.size:
+                self.kill_bomberman(games)
+                self.enemy_pos[games, enemy] = self.enemy_spawn[games, enemy]
+
+    def move_enemies(self, moving):
+        for enemy in range(MAX_ENEMIES):
+            games = np.nonzero(moving & self.enemy_alive[:, enemy])[0]
+            self.enemy_step[games, enemy] += self.enemy_speed[games, enemy]
+            games = games[self.enemy_step[games, enemy] >= Speed.FAST]
+            if not games.size:
+                continue
+            self.enemy_step[games, enemy] = 0
+            index = np.arange(games.size)
+
+            pos = self.enemy_pos[games, enemy]
+            options = pos[:, None] + DIRECTIONS[None]  # w, a, s, d
+            blocked = self.is_blocked(
+                games[:, None], options[..., 0], options[..., 1], self.enemy_wallpass[games, enemy, None]
+            )
+            options[blocked] = np.broadcast_to(pos[:, None], options.shape)[blocked]
+
+            # Smart.LOW: keep going the same way, turn when bumping into something
+            lastdir = self.enemy_lastdir[games, enemy]
+            new_pos = options[index, lastdir]
+            low = self.enemy_smart[games, enemy] == Smart.LOW
+            turn = low & (new_pos == pos).all(axis=1)
+            self.enemy_lastdir[games[turn], enemy] = (lastdir[turn] + 1) % len(DIRECTIONS)
+
+            # Smart.NORMAL/HIGH: get away from the bomberman (HIGH: from the oldest bomb, if any),
+            # without going back nor into other enemies
+            others = self.enemy_alive[games] & (np.arange(MAX_ENEMIES) != enemy)
+            taken = ((options[:, :, None] == self.enemy_pos[games, None]).all(axis=3) & others[:, None]).any(axis=2)
+            lastpos = self.enemy_lastpos[games, enemy]
+            taken |= self.enemy_moved[games, enemy, None] & (options == lastpos[:, None]).all(axis=2)
+
+            target = self.pos[games].copy()
+            flee_bomb = (self.enemy_smart[games, enemy] == Smart.HIGH) & (self.bomb_count[games] > 0)
+            target[flee_bomb] = self.bomb_pos[games[flee_bomb], 0]
+            distances = ((options - target[:, None]) ** 2).sum(axis=2)
+            distances[taken] = -1
+            smart_pos = options[index, distances.argmax(axis=1)]
+            cornered = taken.all(axis=1)
+            smart_pos[cornered] = np.where(self.enemy_moved[games, enemy, None], lastpos, pos)[cornered]
+            new_pos[~low] = smart_pos[~low]
+
+            self.enemy_lastpos[games, enemy] = pos
+            self.enemy_moved[games, enemy] = True
+            self.enemy_pos[games, enemy] = new_pos
+
+    @property
+    def state(self):
+        """The state of every game, as (live) arrays indexed by game first."""
+        return {
+            "level": self.level,
+            "step": self.step_number,
+            "score": self.score,
+            "lives": self.lives,
+            "bomberman": self.pos,
+            "bombs": self.bomb_pos,
+            "bomb_timers": self.bomb_timer,
+            "bomb_radius": self.bomb_radius,
+            "bomb_count": self.bomb_count,
+            "enemies": self.enemy_pos,
+            "enemies_alive": self.enemy_alive,
+            "walls": self.walls,
+            "exit": np.where(self.exit_visible[:, None], self.exit_door, -1),
+            "powerup": np.where(self.powerup_visible[:, None], self.powerup_pos, -1),
+        }
@@ -0,0 +1,283 @@
+import argparse
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import time
+
+from bomberman import Bomberman
+from codec import BinaryEncoder, decode_state
+from game import Bomb, Game
+from mapa import Map, map_rng
+from tree_search_star import SearchTree
+
+SEED = 2020
+SIZE = (51, 31)
+OBJECTIVES = ["FIND_WALL", "KILL", "POWER_UP", "EXIT"]
+
+BENCHMARKS = {}  # Benchmark functions by name, in the order they're defined
+
+
+def benchmark(name):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+
+    return register
+
+
+def measure(function, setup=lambda: (), repeat=20, calls=1):
+    """
+    Function that times a function a number of times, with a fresh (untimed) setup for each run
+    @param setup: Function returning the arguments of each run
+    @param calls: How many calls of the timed hot path each run makes
+    @returns: Time per call of every run, in seconds, and calls per run
+    """
+    timings = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        function(*args)
+        timings.append((time.perf_counter() - start) / calls)
+    return timings, calls
+
+
+def generate_map(level=5, seed=SEED):
+    return Map(level=level, size=SIZE, enemies=7, rng=map_rng(seed, level))
+
+
+def free_tiles(mapa):
+    return [(x, y) for x in range(mapa.hor_tiles) for y in range(mapa.ver_tiles) if not mapa.is_blocked((x, y))]
+
+
+@benchmark("map_generation")
+def bench_map_generation():
+    rng = map_rng(SEED, 5)
+    return measure(lambda: Map(level=5, size=SIZE, enemies=7, rng=rng))
+
+
+@benchmark("map_is_blocked")
+def bench_map_is_blocked():
+    mapa = generate_map()
+    tiles = [(x, y) for x in range(mapa.hor_tiles) for y in range(mapa.ver_tiles)]
+
+    def run():
+        for tile in tiles:
+            mapa.is_blocked(tile)
+
+    return measure(run, calls=len(tiles))
+
+
+@benchmark("map_calc_pos")
+def bench_map_calc_pos():
+    mapa = generate_map()
+    tiles = free_tiles(mapa)
+
+    def run():
+        for tile in tiles:
+            for direction in "wasd":
+                mapa.calc_pos(tile, direction)
+
+    return measure(run, calls=4 * len(tiles))
+
+
+def bench_search(objective):
+    mapa = generate_map()
+    rng = random.Random(SEED)
+    if objective == "KILL":
+        targets = rng.sample(free_tiles(mapa), 20)
+    else:  # Walls, or the powerup/exit hidden behind one
+        targets = rng.sample(mapa.walls, 20)
+    tree = SearchTree()
+    targets = iter(targets * 2)
+
+    return measure(
+        lambda target: tree.search_for_path(mapa, (1, 1), target, [], objective=objective),
+        setup=lambda: (next(targets),),
+    )
+
+
+for objective in OBJECTIVES:
+    benchmark(f"search_{objective.lower()}")(lambda objective=objective: bench_search(objective))
+
+
+@benchmark("bomb_in_range")
+def bench_bomb_in_range():
+    mapa = generate_map()
+    tiles = free_tiles(mapa) + mapa.walls
+    bombs = [Bomb(pos, mapa, 3) for pos in random.Random(SEED).sample(free_tiles(mapa), 20)]
+
+    def run():
+        for bomb in bombs:
+            for tile in tiles:
+                bomb.in_range(tile)
+
+    return measure(run, calls=len(bombs) * len(tiles))
+
+
+def start_game(level=5, lives=3, timeout=3000):
+    game = Game(level=level, lives=lives, timeout=timeout, seed=SEED)
+    game.start("benchmark")
+    return game
+
+
+@benchmark("game_explode_bomb")
+def bench_game_explode_bomb():
+    def setup():
+        game = start_game()
+        game._bombs = [
+            Bomb(pos, game.map, 3) for pos in random.Random(SEED).sample(free_tiles(game.map), 5)
+        ]
+        for bomb in game._bombs:
+            bomb._timeout = 0.5  # Everything blows up on this frame
+        return (game,)
+
+    return measure(lambda game: game.explode_bomb(), setup=setup)
+
+
+@benchmark("game_step")
+def bench_game_step():
+    """A whole frame (Game.next_frame without the sleep), pressing random keys."""
+    game = start_game(lives=10**6, timeout=10**6)
+    rng = random.Random(SEED)
+    keys = [rng.choice("wasdB") for _ in range(200)]
+
+    def run():
+        for key in keys:
+            game.step(key)
+
+    return measure(run, calls=len(keys))
+
+
+@benchmark("agent_next_move")
+def bench_agent_next_move():
+    """Bomberman.next_move along a seeded game, fed the same JSON state the server sends."""
+    game = start_game(level=1, lives=10**6, timeout=600)
+    info = game.info()
+    mapa = Map(size=info["size"], mapa=info["map"])
+    agent = Bomberman()
+    rng = random.Random(SEED)  # Same as tournament.play, so every run plays the same game
+    timings = []
+
+    def policy(_):
+        state = json.loads(game.state)
+        mapa.walls = state["walls"]
+        agent.update_state(state, mapa)
+        start = time.perf_counter()
+        key = agent.next_move()
+        timings.append(time.perf_counter() - start)
+        return key or rng.choice("wasd")
+
+    game.run_until_done(policy)
+    return timings, 1
+
+
+def game_states(count=200):
+    """Function that plays a seeded game with random keys, returning its states (parsed from JSON)."""
+    game = start_game(lives=1000, timeout=10**6)
+    rng = random.Random(SEED)
+    states = []
+    for _ in range(count):
+        game.step(rng.choice("wasdB"))
+        states.append(json.loads(game.state))
+    return states
+
+
+def bench_codec(encode, decode, decoding):
+    """Encoding or decoding a game's states, with the average size of a message (in bytes)."""
+    states = game_states()
+    messages = [encode(state) for state in states]
+    size = round(statistics.mean(len(message) for message in messages), 1)
+
+    def run():
+        if decoding:
+            for message in messages:
+                decode(message)
+        else:
+            for state in states:
+                encode(state)
+
+    return (*measure(run, calls=len(states)), {"bytes": size})
+
+
+for decoding in (False, True):
+    action = "decode" if decoding else "encode"
+    benchmark(f"state_json_{action}")(
+        lambda decoding=decoding: bench_codec(json.dumps, json.loads, decoding)
+    )
+    benchmark(f"state_binary_{action}")(
+        lambda decoding=decoding: bench_codec(BinaryEncoder().encode, decode_state, decoding)
+    )
+
+
+def summarize(timings, calls, extra=None):
+    """
+    @param extra: Other results of the benchmark, e.g sizes
+    """
+    timings = sorted(timings)
+    return {
+        **(extra or {}),
+        "runs": len(timings),
+        "calls_per_run": calls,
+        "mean_us": round(statistics.mean(timings) * 1e6, 3),
+        "median_us": round(statistics.median(timings) * 1e6, 3),
+        "p95_us": round(timings[int(0.95 * (len(timings) - 1))] * 1e6, 3),
+        "min_us": round(timings[0] * 1e6, 3),
+    }
+
+
+def run_benchmarks(names=None):
+    """
+    Function that runs the benchmarks (all of them by default) and returns their results
+    @param names: Only run benchmarks whose name contains one of these
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = None
+
+    results = {}
+    for name, function in BENCHMARKS.items():
+        if names and not any(n in name for n in names):
+            continue
+        results[name] = summarize(*function())
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "seed": SEED,
+        "size": SIZE,
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    """Function that returns how many times slower (>1) or faster (<1) each benchmark got."""
+    return {
+        name: round(result["median_us"] / baseline["results"][name]["median_us"], 3)
+        for name, result in report["results"].items()
+        if name in baseline["results"] and baseline["results"][name]["median_us"]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("names", nargs="*", help="Only run benchmarks matching these names")
+    parser.add_argument("--output", help="Save the results (JSON) to this file")
+    parser.add_argument("--compare", help="Results file (JSON) of another branch to compare to")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # The game logs every explosion
+    report = run_benchmarks(args.names)
+    if args.compare:
+        with open(args.compare) as f:
+            report["compared_to"] = f.name
+            report["ratios"] = compare(report, json.load(f))
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -1,6 +1,7 @@
 import logging
 
-from tree_search_star import SearchTree
+from telemetry import Telemetry
+from tree_search_star import DangerMap, DistanceField, IncrementalSearchTree
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -9,6 +10,8 @@ logging.basicConfig(
 logger = logging.getLogger("Bomberman")
 logger.setLevel(logging.INFO)
 
+AVOID_ENEMIES = ("KILL", "EXIT")  # Objectives whose searches go around the (other) enemies
+
 
 class Bomberman:
     """
@@ -39,15 +42,16 @@ class Bomberman:
 
         self.possible_steps = None
 
-        self.tree = SearchTree()
+        self._distances = None
+        self.tree = IncrementalSearchTree(avoid_enemies=AVOID_ENEMIES)
+        self.telemetry = Telemetry()
 
         self.right = None
         self.left = None
         self.up = None
         self.down = None
 
-        self.running = 0
-        self.running_direction = None
+        self.running = 0  # 0: not running from a bomb, 1: running, 2: safe
 
         self.kill_attempt_counter = 0
         self.kill_target = None
@@ -111,42 +115,69 @@ class Bomberman:
         self.up = (self.pos[0], self.pos[1] - 1)
         self.down = (self.pos[0], self.pos[1] + 1)
 
+        self._distances = None  # Flood fill again, from our new position, when first needed
+
         logger.debug("Updated Bomberman state successfully!")
 
+    @property
+    def distances(self):
+        """
+        Property that returns this tick's distance field: one flood fill from our position that
+        answers every "can I reach it / how far / which way" question about walls, enemies,
+        powerups and the exit
+
+        @rtype: DistanceField
+        """
+        if self._distances is None:
+            self._distances = DistanceField(self.map, self.pos, "Wallpass" in self.my_powerups)
+        return self._distances
+
     def find_nearest_wall(self):
         """
-        Method that computes the Manhattan distance between the Bomberman and all the walls on the map
+        Method that computes the walking distance between the Bomberman and all the walls on the map
+        he can stand next to (or all the walls, if he can't reach any)
 
         @rtpye: tuple
         @returns: a tuple with the coordinates of the nearest wall to the Bomberman
         """
-        x, y, distance = min(
-            [
-                (wall[0], wall[1], self.manhattan_distance(self.pos, wall))
-                for wall in self.walls
-            ],
-            key=lambda e: e[2],
-        )
-        return (x, y)
+        nearest = self.distances.find_nearest(self.walls, adjacent=True)
+        if nearest is None:
+            nearest = min(self.walls, key=lambda wall: self.walking_distance(self.pos, wall))
+        return tuple(nearest)
 
-    def find_nearest_wall_to_target(self, target, visited_walls):
+    def find_nearest_wall_to_target(self, target):
         """
-        Method that computes the Manhattan distance between the Nearest Enemy and all the walls on the map
+        Method that computes the walking distance between a target (e.g the Nearest Enemy) and all
+        the walls on the map the Bomberman can stand next to
 
+        @param target: position we want the wall to be close to
         @rtpye: tuple
-        @returns: a tuple with the coordinates of the nearest wall to the Bomberman
+        @returns: a tuple with the coordinates of the nearest reachable wall to the target,
+                  or the nearest wall to the Bomberman if he can't reach any
         """
+        reachable_walls = self.find_reachable_walls()
+        if reachable_walls == []:
+            return self.find_nearest_wall()
+
         x, y, distance = min(
-            [(wall[0], wall[1], self.manhattan_distance(target, wall)) for wall in self.walls if wall not in visited_walls
-             ],
+            [(wall[0], wall[1], self.walking_distance(target, wall)) for wall in reachable_walls],
             key=lambda e: e[2],
         )
 
         return (x, y)
 
+    def find_reachable_walls(self):
+        """
+        Method that uses this tick's distance field to find the walls the Bomberman can stand next to
+
+        @rtype: list
+        @returns: the reachable walls
+        """
+        return [wall for wall in self.walls if self.distances.get_distance_to_adjacent(wall) is not None]
+
     def find_nearest_enemy(self):
         """
-        Method that computes the Manhattan distance between the Bomberman and all the enemies on the map
+        Method that computes the walking distance between the Bomberman and all the enemies on the map
 
         @rtpye: tuple
         @eturns: a tuple with the coordinates of the nearest enemy to the Bomberman
@@ -156,7 +187,7 @@ class Bomberman:
                 (
                     enemy["pos"][0],
                     enemy["pos"][1],
-                    self.manhattan_distance(self.pos, tuple(enemy["pos"])),
+                    self.walking_distance(self.pos, tuple(enemy["pos"])),
                     enemy["id"],
                     enemy["name"],
                 )
@@ -177,6 +208,22 @@ class Bomberman:
         """
         return abs(p1[0] - p2[0]) + abs(p1[1] - p2[1])
 
+    def walking_distance(self, p1, p2):
+        """
+        Method that computes the distance we'd have to walk between two positions, going around
+        the map's stones (walls are ignored, since we can blow them up)
+
+        @param p1: first position
+        @param p2: second position
+        @rtype: int
+        @returns: walking distance between the 2 given positions, or their Manhattan distance if
+                  one can't be reached from the other
+        """
+        distance = self.map.distance(p1, p2)
+        if distance is None:
+            return self.manhattan_distance(p1, p2)
+        return distance
+
     def get_key_to_position(self, next_pos):
         """
         Method that converts an intended position to a key stroke
@@ -197,197 +244,6 @@ class Bomberman:
         else:
             return ""
 
-    def get_starting_running_direction(self):
-        # TODO: FIX THAT GODDAMNED BUG
-        """
-        Method that picks a safe starting position for the bomberman to run in.
-        Changes the self.running_direction variable to the direction bomberman should run to
-        Possibly changes the variable self.running to the 3 (indicating running state 3)
-        """
-        possible_directions = []
-
-        if self.check_if_wall_is_not_blocked_or_enemy(self.left):
-            possible_directions.append("LEFT")
-        if self.check_if_wall_is_not_blocked_or_enemy(self.right):
-            possible_directions.append("RIGHT")
-        if self.check_if_wall_is_not_blocked_or_enemy(self.up):
-            possible_directions.append("UP")
-        if self.check_if_wall_is_not_blocked_or_enemy(self.down):
-            possible_directions.append("DOWN")
-
-        logger.debug("POSSIBLE DIRECTIONS " + str(possible_directions))
-
-        # Prioritize last pos
-        last_pos_dir = None
-        if len(self.last_four_pos) > 0:
-            if self.up in self.last_four_pos:
-                last_pos_dir = "UP"
-            elif self.down in self.last_four_pos:
-                last_pos_dir = "DOWN"
-            elif self.left in self.last_four_pos:
-                last_pos_dir = "LEFT"
-            elif self.left in self.last_four_pos:
-                last_pos_dir = "RIGHT"
-        logger.debug("LAST RUNNING DIR: " + str(last_pos_dir))
-
-
-        # If we have more than one possible running path, let's check which of those have a safe spot (i.e different row and col than the bomb)
-        safe_possible_directions = []
-        if len(possible_directions) > 1:
-            logger.debug("   MULTIPLE DIRECTIONS")
-            self.running = 3
-            safe_possible_directions = self.check_if_safe_is_blocked(
-                possible_directions)
-            logger.debug("   OUT OF MULITPLE DIRECTIONS - " + str(possible_directions) + " -  PICKED: " + str(safe_possible_directions))
-
-        # Set our running direction
-        if len(possible_directions) == 1:
-            logger.debug("   DIRECTION PICKED (ONLY ONE)")
-            self.running_direction = possible_directions[0]
-
-        elif len(safe_possible_directions) != 0:
-            logger.debug("   DIRECTION PICKED WITH SAFE SPOT")
-            self.running_direction = safe_possible_directions[0]
-        
-        else:  # Used for the case where we screwed ourselves and there are no safe places to run to..just run to our last position and pray
-            logger.debug("   NO DIRECTIONS WITH SAFE POSITIONS AVAILABLE CHECKING IN WHICH DIRECTION WE CAN RUN IN")
-
-            #if last_pos_dir in possible_directions:
-            #    logger.debug("   RUNNING BACK THROUGH WHERE WE CAME FROM")
-            #    self.running_direction = last_pos_dir
-            #else:
-
-            runnable_directions = []
-            for direction in possible_directions:
-                # Just in case let's see if we can run in that direction for longer than the bomb's radius
-                no_of_moves = self.my_powerups.count("Flames") + 4
-                logger.debug("       CHECKING STRAIGHT DIRECTION - " + direction + " FOR " + str(no_of_moves) + " MOVES")
-                # And remove it if it's not
-
-                if self.check_if_path_is_clear(direction, no_of_moves):
-                    logger.debug("      DIRECTION - " + direction + " - IS SAFE TO BE RUN IN!" )
-                    runnable_directions.append(direction)
-        
-            if runnable_directions != []:
-                logger.debug("   DIRECTION PICKED STRAIGHT LINE RUNNING - " + str(runnable_directions[0]))
-                self.running_direction = runnable_directions[0]
-            else:
-                logger.debug("   DIRECTION PICKED - OMEGA F")
-                if last_pos_dir is not None:
-                    self.running_direction = last_pos_dir
-                else:
-                    self.running_direction = possible_directions[0]
-
-    def check_if_safe_is_blocked(self, possible_directions):
-        """
-        Method that checks for safe spots given a list of possible running directions
-
-        @param possible_directions: possible running directions
-        @rtype: list
-        @returns: all directions that lead to a safe spot
-        """
-        safe_positions = {  # All possibly safe positions from the bomb
-            "UP": [
-                (self.pos[0] - 1, self.pos[1] - 2),
-                (self.pos[0] + 1, self.pos[1] - 2),
-            ],
-            "DOWN": [
-                (self.pos[0] - 1, self.pos[1] + 2),
-                (self.pos[0] + 1, self.pos[1] + 2),
-            ],
-            "LEFT": [
-                (self.pos[0] - 2, self.pos[1] - 1),
-                (self.pos[0] - 2, self.pos[1] + 1),
-            ],
-            "RIGHT": [
-                (self.pos[0] + 2, self.pos[1] - 1),
-                (self.pos[0] + 2, self.pos[1] + 1),
-            ],
-        }
-
-        no_of_moves = 2
-
-        if "Detonator" not in self.my_powerups:  # TODO: TEST FOR DIFFERENT VALUES
-            no_of_moves_for_enemies = 5
-        else:
-            no_of_moves_for_enemies = 2
-
-        for starting_direction in possible_directions:
-            logger.debug(
-                "   CHECKING IF SAFE POSITION IS CLEAR - " + str(starting_direction))
-
-            # Check if safe positions are reachable
-            if self.check_if_path_is_clear(starting_direction, no_of_moves):
-                logger.debug(
-                    "       PATH TO SAFE POSITIONS IS FREE")
-
-                for safe_position in safe_positions[starting_direction]:
-                    if self.check_if_wall_is_not_blocked_or_enemy(safe_position):
-                        logger.debug(
-                                    "       SAFE POSITION IS NOT BLOCKED")
-                        if starting_direction == "UP" or starting_direction == "DOWN":
-                            if self.check_if_path_is_clear("LEFT", no_of_moves_for_enemies, safe_position) and self.check_if_path_is_clear("RIGHT", no_of_moves_for_enemies, safe_position):
-                                logger.debug(
-                                    "       NO ENEMY NEARBY, WE'RE SAFE!")
-                                return [starting_direction]
-                            logger.debug(
-                                    "       ENEMY NEARBY, TOO DANGEROUS!")
-                        if starting_direction == "LEFT" or starting_direction == "RIGHT":
-                            if self.check_if_path_is_clear("UP", no_of_moves_for_enemies, safe_position) and self.check_if_path_is_clear("DOWN", no_of_moves_for_enemies, safe_position):
-                                logger.debug(
-                                    "       NO ENEMY NEARBY, WE'RE SAFE!")
-                                return [starting_direction]
-                            logger.debug(
-                                    "       ENEMY NEARBY, TOO DANGEROUS!")
-                        return [starting_direction]
-                
-            logger.debug("   DIRECTION - " + starting_direction + " - ISN'T POSSIBLE")
-                            
-        return []
-
-    def check_if_path_is_clear(self, direction, no_of_moves, starting_position=None):
-        """
-        Method that checks if a path is safe, i.e if we can move no_of_moves in a
-        path without encountering a wall or an enemy
-
-        @param direction: the direction we want to be moving in
-        @param no_of_moves: how many moves we want to move in that direction
-        @rtype: bool
-        @returns: Whether the path is safe or not
-        """
-
-        if starting_position == None:
-            starting_position = self.pos
-
-        if direction == "UP":
-            test_pos = (starting_position[0], starting_position[1] - 1)
-            inc_type = (0, -1)
-        elif direction == "DOWN":
-            test_pos = (starting_position[0], starting_position[1] + 1)
-            inc_type = (0, 1)
-        elif direction == "LEFT":
-            test_pos = (starting_position[0] - 1, starting_position[1])
-            inc_type = (-1, 0)
-        else:
-            test_pos = (starting_position[0] + 1, starting_position[1])
-            inc_type = (1, 0)
-
-        logger.debug("           CHECKING IF PATH IS CLEAR - " +
-                     direction + " STARTING AT " + str(starting_position))
-        
-        for increment in range(no_of_moves):
-            pos_inc = tuple([increment*coord for coord in inc_type])
-            next_pos = (test_pos[0] + pos_inc[0], test_pos[1] + pos_inc[1])
-
-            logger.debug("               CHECKING POSITION - " + str(next_pos) + " : " +
-                         str(self.check_if_wall_is_not_blocked_or_enemy(next_pos)))
-            if not self.check_if_wall_is_not_blocked_or_enemy(next_pos):
-                logger.debug("                   NOT AVAILABLE RETURNING FALSE")
-                return False
-
-        logger.debug("           WE CAN RUN THIS PATH")
-        return True
-
     def check_if_wall_is_not_blocked_or_enemy(self, position, enemy_safety=True):
         """
         Method that checks if a given position is blocked by a wall or an enemy
@@ -413,102 +269,37 @@ class Bomberman:
 
     def run_from_bomb(self):
         """
-        Method that returns the key we should press to run from the bomb
+        Method that returns the key we should press to run from the bomb.
+        Follows the shortest route to a tile no blast will reach (keeping away from enemies
+        if we can), computed from this tick's danger map
 
         @returns: The key
         """
-        if self.running == 0:  # If we haven't started running yet
-            self.running = 1
-            self.get_starting_running_direction()  # Get our starting running direction
-        elif self.running == 2:  # We've reached a safe position
-            if "Detonator" in self.my_powerups:
-                return "A"
-            return ""
+        danger = DangerMap(self.map, self.bombs)
+        wallpass = "Wallpass" in self.my_powerups
+        bombpass = "Bombpass" in self.my_powerups
 
-        if (
-            self.running == 3
-        ):  # In case we have multiple run paths, make it so Erman runs one house away
-            if self.running_direction == "UP":
-                key = self.get_key_to_position(
-                    self.up
-                )
-            elif self.running_direction == "DOWN":
-                key = self.get_key_to_position(
-                    self.down
-                )
-            elif self.running_direction == "LEFT":
-                key = self.get_key_to_position(
-                    self.left
-                )
-            elif self.running_direction == "RIGHT":
-                key = self.get_key_to_position(
-                    self.right
-                )
+        path = danger.search_for_escape(
+            self.pos, [tuple(enemy["pos"]) for enemy in self.enemies], wallpass, bombpass
+        )
+        if path is None:  # Enemies are in the way, risk it rather than get blown up
+            logger.debug("NO ESCAPE AWAY FROM ENEMIES")
+            path = danger.search_for_escape(self.pos, [], wallpass, bombpass)
 
+        if path is None:
+            logger.debug("NO ESCAPE ROUTE")
             self.running = 1
+            return ""
 
-            return key
-
-        # Check if we can run to our safe scenarios
-        if self.running_direction == "UP" or self.running_direction == "DOWN":
-            # LEFT
-            if self.check_if_wall_is_not_blocked_or_enemy(
-                self.left
-            ):
-                key = self.get_key_to_position(
-                    self.left
-                )
-                self.running = 2
-
-            # RIGHT
-            elif self.check_if_wall_is_not_blocked_or_enemy(
-                self.right
-            ):
-                key = self.get_key_to_position(
-                    self.right
-                )
-                self.running = 2
-
-            else:  # In case we cant move to a safe position yet keep moving in our direction
-                if self.running_direction == "UP":
-                    key = self.get_key_to_position(
-                        self.up
-                    )
-
-                else:  # Down
-                    key = self.get_key_to_position(
-                        self.down
-                    )
-        else:
-            # UP
-            if self.check_if_wall_is_not_blocked_or_enemy(
-                self.up
-            ):
-                key = self.get_key_to_position(
-                    self.up
-                )
-                self.running = 2
-
-            # DOWN
-            elif self.check_if_wall_is_not_blocked_or_enemy(
-                self.down
-            ):
-                key = self.get_key_to_position(
-                    self.down
-                )
-                self.running = 2
-
-            else:  # In case we cant move to a safe position yet keep moving in our direction
-                if self.running_direction == "RIGHT":
-                    key = self.get_key_to_position(
-                        self.right
-                    )
+        if len(path) == 1:  # We've reached a safe position
+            self.running = 2
+            if "Detonator" in self.my_powerups:
+                return "A"
+            return ""
 
-                else:
-                    key = self.get_key_to_position(
-                        self.left
-                    )
-        return key
+        logger.debug("ESCAPING THROUGH " + str(path))
+        self.running = 1
+        return self.get_key_to_position(path[1])
 
     def get_powerup(self):
         """
@@ -517,13 +308,19 @@ class Bomberman:
         @returns: The key
         """
 
-        distance = self.manhattan_distance(self.pos, self.powerups[0][0])
+        # the nearest one we can walk to, by this tick's flood fill
+        nearest = self.distances.find_nearest(powerup[0] for powerup in self.powerups)
+        position, powerup = next(
+            (powerup for powerup in self.powerups if tuple(powerup[0]) == nearest), self.powerups[0]
+        )
+
+        distance = self.manhattan_distance(self.pos, position)
         # when distance equals to 1, it means that the next move will put the agent on the power up
         if distance == 1:
-            self.my_powerups.append(self.powerups[0][1])
+            self.my_powerups.append(powerup)
             self.caught_powerup = True
 
-        return self.go_to_target(self.powerups[0][0], "POWER_UP", explode_col_row=True)
+        return self.go_to_target(position, "POWER_UP", explode_col_row=True)
 
     def kill_balloom(self, distance_to_enemy):
         """
@@ -670,18 +467,30 @@ class Bomberman:
 
     def go_to_target(self, target, strategy, bomb=True, ignore_safety=False, explode_col_row=True):
         """
-        Method that returns the key to go to a specific target. Uses our A* Searching algorithm
+        Method that returns the key to go to a specific target. Powerups and the exit are reached
+        through this tick's flood fill (the exit with our search, around the enemies, when one is
+        in the way), the other targets with our A* Searching algorithm
 
         @returns: The key
         """
 
-        path = self.tree.search_for_path(
-            self.map,
-            self.pos,
-            tuple(target),
-            self.enemies,
-            objective=strategy,
-        )
+        if strategy in ("POWER_UP", "EXIT"):
+            path = self.distances.get_path(target)
+            enemies = {tuple(enemy["pos"]) for enemy in self.enemies}
+            if strategy == "EXIT" and path is not None and enemies.intersection(path):
+                path = self.tree.search_for_path(
+                    self.map, self.pos, tuple(target), self.enemies, objective=strategy
+                ) or path  # Kept if there's no way around them
+        else:
+            path = self.tree.search_for_path(
+                self.map,
+                self.pos,
+                tuple(target),
+                self.enemies,
+                objective=strategy,
+            )
+            if path is None:  # The search gave up, but this tick's flood fill may still know the way
+                path = self.distances.get_path(target, adjacent=strategy == "FIND_WALL")
 
         key = ""
 
@@ -713,6 +522,19 @@ class Bomberman:
         return key
 
     def next_move(self):
+        """
+        Method that decides our Bombermans's next move, recording which branch decided it, how
+        long it took and how much searching it needed in our telemetry
+
+        @rtype: string
+        @returns: string with the key stroke to the next move. If no path is find returns None
+        """
+        self.telemetry.start_tick(self.tree)
+        key = self.decide_move()
+        self.telemetry.end_tick(self.tree)
+        return key
+
+    def decide_move(self):
         """
         Method that decides our Bombermans's next move
 
@@ -722,6 +544,7 @@ class Bomberman:
         # If the exit is available and we've completed all other conditions
         if self.exit != [] and (self.caught_powerup or self.level > 10) and self.enemies == []:
             logger.debug("GOING TO EXIT")
+            self.telemetry.set_branch("exit")
             return self.go_to_target(self.exit, "EXIT", False, True)
 
         # Make it so he doesn't sit still for too long:
@@ -730,6 +553,7 @@ class Bomberman:
 
         if self.resting > 20:
             self.resting -= 5
+            self.telemetry.set_branch("resting")
             if self.bombs != []:
                 return "A"
             if self.exit != [] and len(self.my_powerups) == self.level and self.enemies == []:
@@ -746,6 +570,7 @@ class Bomberman:
         # If there is a bomb on the map
         if self.bombs != []:
             logger.debug("RUNNING FROM BOMB - STAGE: " + str(self.running))
+            self.telemetry.set_branch("run_from_bomb")
             return self.run_from_bomb()
 
         # Reset our running variables
@@ -755,6 +580,7 @@ class Bomberman:
         # if there is a powerup on the map
         if self.powerups != []:
             logger.debug("PICKING UP POWERUP")
+            self.telemetry.set_branch("powerup")
             return self.get_powerup()
 
         # If there are still walls on the map check which one's the closest
@@ -798,19 +624,21 @@ class Bomberman:
             if self.looping > 10:
                 logger.debug("WE'RE IN A LOOP")
                 if self.walls != []:
+                    self.telemetry.set_branch("loop")
                     if distance_to_nearest_wall == 1:
                         self.looping = 0
                         return "B"
                     return self.go_to_target(nearest_wall, "FIND_WALL",bomb=False)
 
             # Can I reach the enemy or should I go to a wall?
-            path_to_enemy = None
+            self.telemetry.set_branch("kill")
             if self.level == 1:
                 return self.kill_enemy(nearest_enemy_id, nearest_enemy_type, distance_to_enemy, nearest_wall, distance_to_nearest_wall)
             else:
                 # Check if we can reach enemy
                 if self.cant_reach_enemy:
                     logger.debug("CHECK IF WE CAN REACH ENEMY!")
+                    self.telemetry.set_branch("cant_reach_enemy")
 
                     # if self.kill_target != nearest_enemy_id:
                     #    logger.debug("CHANGING ENEMY SO WE GUCCI!")
@@ -820,23 +648,10 @@ class Bomberman:
                     if self.walls != []:  # Pick the wall closest to the enemy
                         logger.debug("GOING TO NEAREST WALL TO ENEMY - " +
                                     str(self.nearest_wall_to_enemy))
-                        wall_array = []
 
                         if self.nearest_wall_to_enemy is None:
-                            target = self.nearest_enemy
-                            while True:
-                                self.nearest_wall_to_enemy = self.find_nearest_wall_to_target(
-                                    target, wall_array)
-                                logger.debug("   TRYING WALL: " + str(target))
-                                path = self.go_to_target(
-                                    self.nearest_wall_to_enemy, "FIND_WALL", bomb=False)
-
-                                if path is not None:
-                                    break
-                                target = self.nearest_wall_to_enemy
-                                wall_array.append(
-                                    list(self.nearest_wall_to_enemy))
-                                logger.debug("       WALLS: " + str(wall_array))
+                            self.nearest_wall_to_enemy = self.find_nearest_wall_to_target(
+                                self.nearest_enemy)
 
                         distance_to_nearest_wall = self.manhattan_distance(
                             self.pos, self.nearest_wall_to_enemy)
@@ -854,10 +669,8 @@ class Bomberman:
                         return None
 
                 else:
-                    path_to_enemy = self.go_to_target(
-                        self.nearest_enemy, "KILL")
-
-                    if path_to_enemy == None:
+                    if self.distances.get_distance(self.nearest_enemy) is None:
+                        self.telemetry.set_branch("cant_reach_enemy")
                         self.cant_reach_enemy = 1
                         return ""
                     else:
@@ -866,6 +679,7 @@ class Bomberman:
 
         elif self.walls != []:
             logger.debug("GOING TO NEAREST WALL")
+            self.telemetry.set_branch("wall")
 
             if distance_to_nearest_wall == 1:
                 return "B"
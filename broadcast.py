@@ -0,0 +1,157 @@
+import asyncio
+import json
+import logging
+from collections import deque
+
+from websockets.exceptions import ConnectionClosed
+
+from codec import BinaryEncoder
+from delta import DeltaEncoder
+
+logger = logging.getLogger("Broadcast")
+logger.setLevel(logging.INFO)
+
+QUEUE_SIZE = 4  # Frames waiting to be sent to a viewer
+MAX_OVERFLOWS = 3  # Overflows in a row (without catching up) a viewer is allowed
+
+FORMATS = ["json", "delta", "binary"]
+
+
+class Frame:
+    """A game state, with its message in every format it was encoded in (each encoded once)."""
+
+    def __init__(self, state):
+        self.state = state
+        self.messages = {}  # Message by format
+
+
+class Subscriber:
+    def __init__(self, websocket, format):
+        self.websocket = websocket
+        self.format = format
+        self.queue = deque()  # (message, whether it's a frame) waiting to be sent
+        self.frames = 0  # How many of them are frames
+        self.ready = asyncio.Event()  # Set when the queue isn't empty
+        self.needs_keyframe = format == "delta"  # Deltas are no use until it gets a full state
+        self.overflows = 0
+        self.task = None
+
+
+class Broadcaster:
+    """
+    Sends every frame to all viewers without ever blocking the game loop: each frame is encoded
+    once per format in use, then put in every viewer's bounded queue, which a sender task per
+    viewer drains into its websocket.
+    When a slow viewer's queue is full, its stale frames are dropped in favor of the newest one
+    (a keyframe, for delta viewers, since they missed deltas). A viewer that overflows more than
+    max_overflows times without catching up is disconnected.
+    Other messages (game info, highscores) are never dropped.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE, max_overflows=MAX_OVERFLOWS):
+        self.queue_size = queue_size
+        self.max_overflows = max_overflows
+        self.subscribers = {}  # Subscriber by websocket
+        self.delta_encoder = DeltaEncoder()
+        self.binary_encoder = BinaryEncoder()
+        self.dropped = 0  # Frames dropped
+        self.disconnected = 0  # Viewers disconnected for staying behind
+
+    def subscribe(self, websocket, format="json"):
+        """
+        Method that starts sending frames to a viewer
+        @param format: One of FORMATS
+        """
+        subscriber = Subscriber(websocket, format)
+        subscriber.task = asyncio.ensure_future(self.sender(subscriber))
+        self.subscribers[websocket] = subscriber
+        return subscriber
+
+    def unsubscribe(self, websocket):
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber is not None:
+            subscriber.task.cancel()
+
+    def encode(self, frame, format):
+        """
+        Method that returns a frame's message in a format ("keyframe" being the full state for
+        delta viewers), encoding it if it wasn't yet.
+        Frames must be encoded on the tick they're published: their state changes with the game.
+        """
+        message = frame.messages.get(format)
+        if message is None:
+            if format == "binary":
+                message = self.binary_encoder.encode(frame.state)
+            elif format == "delta":
+                message = json.dumps(self.delta_encoder.encode(frame.state))
+            elif format == "keyframe":
+                message = json.dumps(dict(frame.state, keyframe=True))
+            else:
+                message = json.dumps(frame.state)
+            frame.messages[format] = message
+        return message
+
+    def publish(self, state, formats=()):
+        """
+        Method that queues a frame to every viewer
+        @param state: The state, as returned by Game.step
+        @param formats: Other formats to encode the frame in (e.g the player's)
+        @returns: The Frame
+        """
+        frame = Frame(state)
+        for format in formats:
+            self.encode(frame, format)
+
+        for subscriber in list(self.subscribers.values()):
+            if subscriber.frames >= self.queue_size:
+                subscriber.overflows += 1
+                if subscriber.overflows > self.max_overflows:
+                    self.disconnect(subscriber)
+                    continue
+                self.dropped += subscriber.frames
+                subscriber.queue = deque(item for item in subscriber.queue if not item[1])
+                subscriber.frames = 0
+                subscriber.needs_keyframe = subscriber.format == "delta"
+
+            if subscriber.needs_keyframe:
+                self.encode(frame, "delta")  # The delta encoder must see every frame
+                subscriber.queue.append((self.encode(frame, "keyframe"), True))
+                subscriber.needs_keyframe = False
+            else:
+                subscriber.queue.append((self.encode(frame, subscriber.format), True))
+            subscriber.frames += 1
+            subscriber.ready.set()
+        return frame
+
+    def send_message(self, message):
+        """Method that queues a message that isn't a frame (so never dropped) to every viewer."""
+        for subscriber in self.subscribers.values():
+            subscriber.queue.append((message, False))
+            subscriber.ready.set()
+
+    def disconnect(self, subscriber):
+        logger.info("Disconnecting a viewer that stays behind")
+        self.disconnected += 1
+        self.unsubscribe(subscriber.websocket)
+        asyncio.ensure_future(subscriber.websocket.close())
+
+    async def sender(self, subscriber):
+        try:
+            while True:
+                if not subscriber.queue:
+                    subscriber.overflows = 0  # Caught up
+                    subscriber.ready.clear()
+                    await subscriber.ready.wait()
+
+                message, is_frame = subscriber.queue.popleft()
+                subscriber.frames -= is_frame
+                await subscriber.websocket.send(message)
+        except ConnectionClosed:
+            self.subscribers.pop(subscriber.websocket, None)
+
+    def stats(self):
+        return {
+            "viewers": len(self.subscribers),
+            "dropped_frames": self.dropped,
+            "disconnected": self.disconnected,
+        }
@@ -1,12 +1,13 @@
 from consts import Powerups, Speed, Smart
 from enum import IntEnum
-import random
-import uuid
+import itertools
 import math
 
 DIR = "wasd"
 DEFAULT_LIVES = 3
 
+_enemy_ids = itertools.count(1)  # For the enemies created without an id
+
 def distance(p1, p2):
     x1,y1 = p1
     x2,y2 = p2
@@ -92,9 +93,9 @@ class Bomberman(Character):
 
 
 class Enemy(Character):
-    def __init__(self, pos, name, points, speed, smart, wallpass):
+    def __init__(self, pos, name, points, speed, smart, wallpass, id=None):
         self._name = name
-        self.id = uuid.uuid4()
+        self.id = next(_enemy_ids) if id is None else id
         self._points = points
         self._speed = speed
         self._smart = smart
@@ -157,46 +158,46 @@ class Enemy(Character):
 
 
 class Balloom(Enemy):
-    def __init__(self, pos):
+    def __init__(self, pos, id=None):
         super().__init__(
-            pos, self.__class__.__name__, 100, Speed.SLOW, Smart.LOW, False
+            pos, self.__class__.__name__, 100, Speed.SLOW, Smart.LOW, False, id
         )
 
 
 class Oneal(Enemy):
-    def __init__(self, pos):
+    def __init__(self, pos, id=None):
         super().__init__(
-            pos, self.__class__.__name__, 200, Speed.SLOWEST, Smart.NORMAL, False
+            pos, self.__class__.__name__, 200, Speed.SLOWEST, Smart.NORMAL, False, id
         )
 
 
 class Doll(Enemy):
-    def __init__(self, pos):
+    def __init__(self, pos, id=None):
         super().__init__(
-            pos, self.__class__.__name__, 400, Speed.NORMAL, Smart.LOW, False
+            pos, self.__class__.__name__, 400, Speed.NORMAL, Smart.LOW, False, id
         )
 
 
 class Minvo(Enemy):
-    def __init__(self, pos):
+    def __init__(self, pos, id=None):
         super().__init__(
-            pos, self.__class__.__name__, 800, Speed.FAST, Smart.NORMAL, False
+            pos, self.__class__.__name__, 800, Speed.FAST, Smart.NORMAL, False, id
         )
 
 class Kondoria(Enemy):
-    def __init__(self, pos):
+    def __init__(self, pos, id=None):
         super().__init__(
-            pos, self.__class__.__name__, 1000, Speed.SLOWEST, Smart.HIGH, True 
+            pos, self.__class__.__name__, 1000, Speed.SLOWEST, Smart.HIGH, True, id
         )
 
 class Ovapi(Enemy):
-    def __init__(self, pos):
+    def __init__(self, pos, id=None):
         super().__init__(
-            pos, self.__class__.__name__, 2000, Speed.SLOW, Smart.NORMAL, True 
+            pos, self.__class__.__name__, 2000, Speed.SLOW, Smart.NORMAL, True, id
         )
 
 class Pass(Enemy):
-    def __init__(self, pos):
+    def __init__(self, pos, id=None):
         super().__init__(
-            pos, self.__class__.__name__, 4000, Speed.FAST, Smart.HIGH, False
+            pos, self.__class__.__name__, 4000, Speed.FAST, Smart.HIGH, False, id
         )
@@ -0,0 +1,133 @@
+import json
+import struct
+
+from consts import Powerups
+
+MAGIC = b"BM\x01"  # Binary frame marker and format version
+
+# Enemy and powerup type codes
+ENEMY_TYPES = ["Balloom", "Oneal", "Doll", "Minvo", "Kondoria", "Ovapi", "Pass"]
+ENEMY_CODES = {name: code for code, name in enumerate(ENEMY_TYPES)}
+
+# level, step, timeout, score, lives, bomberman x and y, has exit, exit x and y, and how many
+# bombs, enemies, powerups, bonus and walls follow, then the player's name length
+HEADER = struct.Struct("<BIIIHBBBBBBBBBHB")
+BOMB = struct.Struct("<BBBB")  # x, y, timeout in half steps, radius
+ENEMY = struct.Struct("<HBBB")  # id, type code, x, y
+POWERUP = struct.Struct("<BBB")  # x, y, Powerups code
+
+
+class BinaryEncoder:
+    """
+    Encodes game states into compact binary frames: fixed width little-endian records, with
+    coordinates packed in single bytes (so maps can't be over 256 tiles wide) and enemies
+    identified by small integer ids, given out by each encoder in order of appearance.
+    Every frame is a full state.
+    """
+
+    def __init__(self):
+        self.enemy_ids = {}  # Small integer id of every enemy we've seen, by game id
+
+    def get_enemy_id(self, id):
+        small_id = self.enemy_ids.get(id)
+        if small_id is None:
+            small_id = self.enemy_ids[id] = len(self.enemy_ids) % 65536
+        return small_id
+
+    def encode(self, state):
+        """
+        Method that encodes a game state (as a dict) into a binary frame
+        @param state: The state, as returned by Game.step
+        """
+        player = state["player"].encode()[:255]
+        exit = state["exit"]
+        walls = state["walls"]
+        frame = [
+            MAGIC,
+            HEADER.pack(
+                state["level"],
+                state["step"],
+                state["timeout"],
+                state["score"],
+                state["lives"],
+                *state["bomberman"],
+                len(exit) > 0,
+                *(exit if exit else (0, 0)),
+                len(state["bombs"]),
+                len(state["enemies"]),
+                len(state["powerups"]),
+                len(state["bonus"]),
+                len(walls),
+                len(player),
+            ),
+            player,
+        ]
+        for (x, y), timeout, radius in state["bombs"]:
+            frame.append(BOMB.pack(x, y, int(2 * timeout), radius))
+        for enemy in state["enemies"]:
+            frame.append(ENEMY.pack(self.get_enemy_id(enemy["id"]), ENEMY_CODES[enemy["name"]], *enemy["pos"]))
+        for (x, y), name in state["powerups"]:
+            frame.append(POWERUP.pack(x, y, Powerups[name]))
+        frame.append(bytes([c for pos in state["bonus"] for c in pos]))
+        frame.append(bytes([c for wall in walls for c in wall]))
+        return b"".join(frame)
+
+
+def decode_state(frame):
+    """
+    Function that decodes a binary frame back into a state dict, shaped like the parsed JSON
+    state (with enemy ids as strings of their small ids). It's flagged as a keyframe, so it can
+    go through a DeltaDecoder like any other full state
+    @param frame: The binary frame
+    """
+    offset = len(MAGIC)
+    (
+        level, step, timeout, score, lives, x, y, has_exit, exit_x, exit_y,
+        bombs, enemies, powerups, bonus, walls, player_length,
+    ) = HEADER.unpack_from(frame, offset)
+    offset += HEADER.size
+    player = frame[offset:offset + player_length].decode()
+    offset += player_length
+
+    state = {
+        "level": level,
+        "step": step,
+        "timeout": timeout,
+        "player": player,
+        "score": score,
+        "lives": lives,
+        "bomberman": [x, y],
+    }
+
+    state["bombs"] = [
+        [[x, y], half_steps / 2, radius]
+        for x, y, half_steps, radius in BOMB.iter_unpack(frame[offset:offset + bombs * BOMB.size])
+    ]
+    offset += bombs * BOMB.size
+    state["enemies"] = [
+        {"name": ENEMY_TYPES[code], "id": str(id), "pos": [x, y]}
+        for id, code, x, y in ENEMY.iter_unpack(frame[offset:offset + enemies * ENEMY.size])
+    ]
+    offset += enemies * ENEMY.size
+    state["walls"] = None  # Keep the JSON state's key order
+    state["powerups"] = [
+        [[x, y], Powerups(code).name]
+        for x, y, code in POWERUP.iter_unpack(frame[offset:offset + powerups * POWERUP.size])
+    ]
+    offset += powerups * POWERUP.size
+    state["bonus"] = [list(pos) for pos in zip(frame[offset:offset + 2 * bonus:2], frame[offset + 1:offset + 2 * bonus:2])]
+    offset += 2 * bonus
+    state["walls"] = [list(wall) for wall in zip(frame[offset:offset + 2 * walls:2], frame[offset + 1:offset + 2 * walls:2])]
+    state["exit"] = [exit_x, exit_y] if has_exit else []
+    state["keyframe"] = True
+    return state
+
+
+def decode_message(message):
+    """
+    Function that parses any message from the server: binary frames are decoded, text is JSON
+    @param message: The message, as received from the websocket
+    """
+    if isinstance(message, bytes) and message.startswith(MAGIC):
+        return decode_state(message)
+    return json.loads(message)
@@ -0,0 +1,136 @@
+KEYFRAME_INTERVAL = 100  # Frames between keyframes
+
+# Small fields, sent whole whenever they change
+FIELDS = ["level", "step", "timeout", "player", "score", "lives", "bomberman", "bombs", "powerups", "bonus", "exit"]
+
+
+class DeltaEncoder:
+    """
+    Server side of the delta protocol, one per connection. The first frame, every
+    keyframe_interval-th frame and every new level or game are keyframes: the full state plus
+    "keyframe": true. Other frames only carry what changed since the previous frame
+    ("keyframe": false): the FIELDS that changed, walls_removed, and enemies_moved (by id) and
+    enemies_removed. A frame where enemies or walls appeared carries the full list instead.
+    """
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.last_state = None
+        self.frames = 0  # Frames since the last keyframe
+
+    def encode(self, state):
+        """
+        Method that encodes a game state (as a dict) into the message to send
+        @param state: The state, as returned by Game.step
+        """
+        last_state = self.last_state
+        self.last_state = state
+        self.frames += 1
+
+        if (
+            last_state is None
+            or self.frames >= self.keyframe_interval
+            or state.get("level") != last_state.get("level")
+            or state.get("player") != last_state.get("player")
+            or state.get("step", 0) <= last_state.get("step", 0)
+        ):
+            self.frames = 0
+            return dict(state, keyframe=True)
+
+        message = {"keyframe": False}
+        for field in FIELDS:
+            if state.get(field) != last_state.get(field):
+                message[field] = state.get(field)
+
+        walls, last_walls = state.get("walls", []), last_state.get("walls", [])
+        if len(walls) != len(last_walls) or walls != last_walls:
+            remaining = set(walls)
+            if remaining <= set(last_walls):
+                message["walls_removed"] = [wall for wall in last_walls if wall not in remaining]
+            else:
+                message["walls"] = walls
+
+        enemies = {enemy["id"]: enemy for enemy in state.get("enemies", [])}
+        last_enemies = {enemy["id"]: enemy for enemy in last_state.get("enemies", [])}
+        if enemies.keys() <= last_enemies.keys():
+            moved = {id: enemy["pos"] for id, enemy in enemies.items() if enemy["pos"] != last_enemies[id]["pos"]}
+            removed = [id for id in last_enemies if id not in enemies]
+            if moved:
+                message["enemies_moved"] = moved
+            if removed:
+                message["enemies_removed"] = removed
+        else:
+            message["enemies"] = state.get("enemies", [])
+
+        return message
+
+
+class DeltaDecoder:
+    """
+    Client side of the delta protocol: rebuilds the full state from keyframes and deltas, and
+    keeps a Map's walls up to date. Full states without "keyframe" (from a server that doesn't
+    send deltas) are taken as keyframes. Messages that aren't states (e.g the game info or the
+    final score) are returned as they are.
+    """
+
+    def __init__(self):
+        self.state = None
+        self.removed_walls = []  # Walls removed since the last update_map
+        self.walls_reset = False  # Whether the walls were replaced since the last update_map
+
+    def apply(self, message):
+        """
+        Method that applies a message to our state
+        @param message: The message, already parsed from JSON
+        @returns: The up to date state (always the same dict, updated in place)
+        """
+        if "keyframe" not in message and "step" not in message:  # Not a state
+            return message
+
+        if message.get("keyframe", True):
+            self.state = {key: value for key, value in message.items() if key != "keyframe"}
+            self.walls_reset = True
+            self.removed_walls = []
+            return self.state
+
+        if self.state is None:
+            raise ValueError("Got a delta before any keyframe")
+
+        for field in FIELDS:
+            if field in message:
+                self.state[field] = message[field]
+
+        if "walls" in message:
+            self.state["walls"] = message["walls"]
+            self.walls_reset = True
+            self.removed_walls = []
+        for wall in message.get("walls_removed", []):
+            self.state["walls"].remove(wall)
+            self.removed_walls.append(wall)
+
+        if "enemies" in message:
+            self.state["enemies"] = message["enemies"]
+        else:
+            removed = message.get("enemies_removed", [])
+            moved = message.get("enemies_moved", {})
+            if removed:
+                self.state["enemies"] = [enemy for enemy in self.state["enemies"] if enemy["id"] not in removed]
+            for enemy in self.state["enemies"]:
+                if enemy["id"] in moved:
+                    enemy["pos"] = moved[enemy["id"]]
+
+        return self.state
+
+    def update_map(self, mapa):
+        """
+        Method that brings a Map's walls up to date with every message applied so far, removing
+        only the walls that were destroyed (unless the walls were replaced by a keyframe)
+        @param mapa: The Map
+        """
+        if self.walls_reset:
+            mapa.walls = self.state["walls"]
+        else:
+            for wall in self.removed_walls:
+                mapa.remove_wall(tuple(wall))
+        self.walls_reset = False
+        self.removed_walls = []
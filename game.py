@@ -3,12 +3,14 @@ import json
 import logging
 import math
 import os
+import pickle
+import random
 
 import requests
 
 from characters import Balloom, Bomberman, Character, Doll, Minvo, Oneal, Kondoria, Ovapi, Pass
 from consts import Powerups
-from mapa import Map, Tiles
+from mapa import Map, Tiles, level_map
 
 logger = logging.getLogger("Game")
 logger.setLevel(logging.DEBUG)
@@ -57,6 +59,17 @@ LEVEL_POWERUPS = {
 }
 
 
+def new_seed(seed=None):
+    """
+    Function that returns a game's seed
+    @param seed: The seed asked for (when None, one is drawn from the random module, so seeding
+    it still makes games reproducible)
+    """
+    if seed is None:
+        seed = random.getrandbits(63)
+    return seed
+
+
 class Bomb:
     def __init__(self, pos, mapa, radius, detonator=False):
         self._pos = pos
@@ -88,45 +101,29 @@ class Bomb:
     def exploded(self):
         return not self._timeout > 0
 
+    @property
+    def footprint(self):
+        return self._map.blast_footprint(self._pos, self._radius)
+
     def in_range(self, character):
-        bx, by = self._pos
         if isinstance(character, Character):
-            cx, cy = character.pos
-        else:
-            cx, cy = character
-
-        if by == cy:
-            for r in range(self._radius + 1):
-                if self._map.is_stone((bx + r, by)):
-                    break  # protected by stone to the right
-                if (cx, cy) == (bx + r, by):
-                    return True
-            for r in range(self._radius + 1):
-                if self._map.is_stone((bx - r, by)):
-                    break  # protected by stone to the left 
-                if (cx, cy) == (bx - r, by):
-                    return True
-        if bx == cx:
-            for r in range(self._radius + 1):
-                if self._map.is_stone((bx, by + r)):
-                    break  # protected by stone in the bottom
-                if (cx, cy) == (bx, by + r):
-                    return True
-            for r in range(self._radius + 1):
-                if self._map.is_stone((bx, by - r)):
-                    break  # protected by stone in the top
-                if (cx, cy) == (bx, by - r):
-                    return True
-
-        return False
+            return tuple(character.pos) in self.footprint
+        return tuple(character) in self.footprint
 
     def __repr__(self):
         return self._pos
 
 
 class Game:
-    def __init__(self, level=1, lives=LIVES, timeout=TIMEOUT, size=MAP_SIZE):
+    def __init__(self, level=1, lives=LIVES, timeout=TIMEOUT, size=MAP_SIZE, seed=None, maps=None):
+        """
+        @param seed: Seed of the game's maps (each level's map has its own random generator,
+        see mapa.map_rng), so games running side by side don't change each other's
+        @param maps: map_pack.MapPack to load the maps from, when it has them
+        """
         logger.info(f"Game(level={level}, lives={lives})")
+        self._seed = new_seed(seed)
+        self._maps = maps
         self.initial_level = level
         self._running = False
         self._timeout = timeout
@@ -134,9 +131,11 @@ class Game:
         self._step = 0
         self._total_steps = 0
         self._state = {}
+        self._state_walls = None  # Walls list of the states, built again when walls change
         self._initial_lives = lives
         self.map = Map(size=size, empty=True)
         self._enemies = []
+        self._enemy_count = 0  # Enemies created so far, each one's id is the next number
 
     def info(self):
         return {
@@ -175,7 +174,8 @@ class Game:
 
     def stop(self):
         logger.info("GAME OVER")
-        self._total_steps += self._step
+        if self._running:  # A game can be lost on its last step, count it once
+            self._total_steps += self._step
         self._running = False
 
     def next_level(self, level):
@@ -185,7 +185,7 @@ class Game:
             return
 
         logger.info("NEXT LEVEL")
-        self.map = Map(level=level, size=self.map.size, enemies=len(LEVEL_ENEMIES[level]))
+        self.map = level_map(self._seed, level, self.map.size, len(LEVEL_ENEMIES[level]), self._maps)
         self._bomberman.respawn()
         self._total_steps += self._step
         self._step = 0
@@ -193,10 +193,13 @@ class Game:
         self._powerups = []
         self._bonus = []
         self._exit = []
+        self._state_walls = None
         self._lastkeypress = ""
         self._enemies = [
-            t(p) for t, p in zip(LEVEL_ENEMIES[level], self.map.enemies_spawn)
+            t(p, self._enemy_count + i + 1)
+            for i, (t, p) in enumerate(zip(LEVEL_ENEMIES[level], self.map.enemies_spawn))
         ]
+        self._enemy_count += len(self._enemies)
         logger.debug("Enemies: %s", [(e._name, e.pos) for e in self._enemies])
         logger.debug("Walls: %s", self.map.walls)
 
@@ -276,19 +279,20 @@ class Game:
                 if bomb.in_range(self._bomberman) and not self._bomberman.flamepass:
                     self.kill_bomberman()
 
-                for wall in self.map.walls[:]:
-                    if bomb.in_range(wall):
-                        logger.debug(f"Destroying wall @{wall}")
-                        self.map.remove_wall(wall)
-                        if self.map.exit_door == wall:
-                            self._exit = wall
-                        if self.map.powerup == wall:
-                            self._powerups.append(
-                                (wall, LEVEL_POWERUPS[self.map.level])
-                            )
+                footprint = bomb.footprint
+                for wall in [wall for wall in footprint if self.map.wall_mask[wall]]:
+                    logger.debug(f"Destroying wall @{wall}")
+                    self.map.remove_wall(wall)
+                    self._state_walls = None
+                    if self.map.exit_door == wall:
+                        self._exit = wall
+                    if self.map.powerup == wall:
+                        self._powerups.append(
+                            (wall, LEVEL_POWERUPS[self.map.level])
+                        )
 
                 for enemy in self._enemies[:]:
-                    if bomb.in_range(enemy):
+                    if enemy.pos in footprint:
                         logger.debug(f"killed enemy @{enemy}")
                         self._score += enemy.points()
                         self._enemies.remove(enemy)
@@ -298,10 +302,20 @@ class Game:
 
     async def next_frame(self):
         await asyncio.sleep(1.0 / GAME_SPEED)
+        self.step()
+
+    def step(self, key=None):
+        """
+        Method that advances the game exactly one tick, with no event loop and no sleeping
+        @param key: Key pressed for this tick (optional, same as calling keypress first)
+        @returns: The new state, as a dict
+        """
+        if key is not None:
+            self.keypress(key)
 
         if not self._running:
             logger.info("Waiting for player 1")
-            return
+            return self._state
 
         self._step += 1
         if self._step == self._timeout:
@@ -324,7 +338,10 @@ class Game:
             self.collision()
 
         #sanity check
-        assert all([ep not in self.map.walls for ep in [e.pos for e in self._enemies if not e._wallpass]])
+        assert not any(self.map.wall_mask[e.pos] for e in self._enemies if not e._wallpass)
+
+        if self._state_walls is None:  # Not built every step, the map only keeps the wall plane
+            self._state_walls = self.map.walls
 
         self._state = {
             "level": self.map.level,
@@ -336,12 +353,40 @@ class Game:
             "bomberman": self._bomberman.pos,
             "bombs": [(b.pos, b.timeout, b.radius) for b in self._bombs],
             "enemies": [{"name": str(e), "id": str(e.id), "pos": e.pos} for e in self._enemies],
-            "walls": self.map.walls,
+            "walls": self._state_walls,
             "powerups": [(p, Powerups(n).name) for p, n in self._powerups],
             "bonus": self._bonus,
             "exit": self._exit,
         }
 
+        return self._state
+
+    def run_until_done(self, policy):
+        """
+        Method that plays the game as fast as possible until it's over
+        @param policy: Function that gets each new state (as a dict) and returns the next key
+        @returns: The final score
+        """
+        state = self.step()
+        while self._running:
+            state = self.step(policy(state))
+        return self._score
+
+    def snapshot(self):
+        """
+        Method that saves everything needed to carry on the game from this tick (its seed included:
+        the maps of the next levels are generated from it, see mapa.map_rng)
+        @returns: The snapshot, as bytes
+        """
+        return pickle.dumps(self.__dict__)
+
+    def restore(self, snapshot):
+        """
+        Method that brings the game back to a snapshot
+        @param snapshot: The snapshot, as returned by snapshot
+        """
+        self.__dict__.update(pickle.loads(snapshot))
+
     @property
     def state(self):
         # logger.debug(self._state)
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+import os
+
+import requests
+
+logger = logging.getLogger("Grading")
+logger.setLevel(logging.INFO)
+
+SPOOL_FILE = "grading_spool.jsonl"
+BATCH_SIZE = 20  # Records sent in a row before the spool is rewritten
+FLUSH_DELAY = 1.0  # Seconds to wait for more records before sending a batch
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+TIMEOUT = 10.0  # Seconds to wait for the grading server
+
+
+class GradingClient:
+    """
+    Submits game records to the grading server without ever blocking the event loop: records
+    are appended to a spool file (one JSON record per line), then sent in the background, in
+    batches, from a thread. The spool only keeps the records that weren't sent yet, so whatever
+    is left in it when the server stops is sent on the next start.
+    Batches go in a single request to bulk_url, if the grading server has one (otherwise, or
+    when it rejects a batch, one by one to url).
+    When the grading server can't be reached (or fails), we wait before trying again, twice
+    as long each time. Records it rejects (4xx) are dropped.
+    """
+
+    def __init__(
+        self, url, spool=SPOOL_FILE, batch_size=BATCH_SIZE, flush_delay=FLUSH_DELAY,
+        min_backoff=MIN_BACKOFF, max_backoff=MAX_BACKOFF, bulk_url=None,
+    ):
+        self.url = url
+        self.bulk_url = bulk_url
+        self.spool = spool
+        self.batch_size = batch_size
+        self.flush_delay = flush_delay
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()  # Keeps the connection to the server alive
+        self.pending = []  # Records not sent yet, oldest first
+        self.wakeup = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+        if os.path.isfile(spool):
+            with open(spool) as f:
+                self.pending = [json.loads(line) for line in f if line.strip()]
+            if self.pending:
+                logger.info("Replaying %s records from %s", len(self.pending), spool)
+
+    def submit(self, record):
+        """
+        Method that spools a record, to be sent in the background
+        @param record: The game record (a JSON serializable dict)
+        """
+        with open(self.spool, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self.pending.append(record)
+        self.wakeup.set()
+
+    def post(self, record):
+        """Method that sends a record (in a thread), raising if it should be sent again."""
+        response = self.session.post(self.url, json=record, timeout=TIMEOUT)
+        if 400 <= response.status_code < 500:
+            logger.warning("Grading server rejected %s: %s", record, response.status_code)
+            self.dropped += 1
+            return
+        response.raise_for_status()
+        self.sent += 1
+
+    def send_batch(self, batch):
+        """
+        Method that sends a batch of records, in a thread, stopping at the first failure
+        @returns: How many records we're done with (sent, or rejected for good)
+        """
+        done = 0
+        try:
+            if self.bulk_url:
+                response = self.session.post(self.bulk_url, json=batch, timeout=TIMEOUT)
+                if response.status_code in (404, 405):
+                    logger.info("No bulk endpoint at %s, sending records one by one", self.bulk_url)
+                    self.bulk_url = None
+                elif not 400 <= response.status_code < 500:  # Otherwise, find the bad records
+                    response.raise_for_status()
+                    self.sent += len(batch)
+                    return len(batch)
+
+            for record in batch:
+                self.post(record)
+                done += 1
+        except requests.RequestException as e:
+            logger.warning("Could not save score to server: %s", e)
+        return done
+
+    def save_spool(self):
+        """Method that rewrites the spool with the records not sent yet."""
+        temp = self.spool + ".tmp"
+        with open(temp, "w") as f:
+            f.writelines(json.dumps(record) + "\n" for record in self.pending)
+        os.replace(temp, self.spool)
+
+    async def run(self):
+        """Method that sends the spooled records, forever."""
+        loop = asyncio.get_running_loop()
+        backoff = self.min_backoff
+        while True:
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            if len(self.pending) < self.batch_size:
+                await asyncio.sleep(self.flush_delay)  # Let a few more records in
+
+            batch = self.pending[: self.batch_size]
+            done = await loop.run_in_executor(None, self.send_batch, batch)
+            del self.pending[:done]
+            if done:
+                self.save_spool()  # Here, so no record gets submitted while it's rewritten
+
+            if done < len(batch):
+                await asyncio.sleep(backoff)
+                backoff = min(2 * backoff, self.max_backoff)
+            else:
+                backoff = self.min_backoff
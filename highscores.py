@@ -0,0 +1,165 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:  # No file locks (Windows): only one server process can share the files
+    fcntl = None
+
+logger = logging.getLogger("Highscores")
+logger.setLevel(logging.INFO)
+
+MAX_HIGHSCORES = 10
+HIGHSCORE_FILE = "highscores.json"  # Snapshot of the best scores overall, as the viewer shows them
+HIGHSCORE_LOG = "highscores.log"  # Results (JSON lines): the tops at the last compaction, and newer ones
+COMPACT_INTERVAL = 60.0  # Seconds
+
+
+class Leaderboard:
+    """
+    Best scores overall (mode None) and by mode (e.g the level games started on), each kept in
+    a min-heap of at most size records, so adding a result is O(log size). With equal scores,
+    the oldest result ranks first.
+    """
+
+    def __init__(self, size=MAX_HIGHSCORES):
+        self.size = size
+        self.heaps = {}  # Heap of (score, -order, record) by mode
+        self.tops = {}  # Sorted [player, score] by mode, until the mode's heap changes
+        self.order = 0
+
+    def add(self, record):
+        """
+        Method that adds a result
+        @param record: Dict with the player, score and mode
+        """
+        self.order += 1
+        item = (record["score"], -self.order, record)
+        for mode in {None, record.get("mode")}:
+            heap = self.heaps.setdefault(mode, [])
+            if len(heap) < self.size:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+            else:
+                continue
+            self.tops.pop(mode, None)
+
+    def top(self, mode=None):
+        """Method that returns the best [player, score] of a mode (overall by default), best first."""
+        top = self.tops.get(mode)
+        if top is None:
+            top = self.tops[mode] = [
+                [record["player"], score] for score, _, record in sorted(self.heaps.get(mode, []), reverse=True)
+            ]
+        return top
+
+    def records(self):
+        """Method that returns the records in any mode's top, in the order they were added."""
+        records = {-order: record for heap in self.heaps.values() for _, order, record in heap}
+        return [records[order] for order in sorted(records)]
+
+
+class Highscores:
+    """
+    Highscores of a server, read from memory: every result goes into a Leaderboard and into a
+    list of results to append (from a thread, by run) to a log shared by all the server's
+    processes. Every compact_interval seconds the log is compacted (under a file lock) into the
+    results that are still in some top, and the overall top is written to the JSON snapshot.
+    """
+
+    def __init__(
+        self, snapshot=HIGHSCORE_FILE, log=HIGHSCORE_LOG, size=MAX_HIGHSCORES,
+        compact_interval=COMPACT_INTERVAL,
+    ):
+        self.snapshot = snapshot
+        self.log = log
+        self.size = size
+        self.compact_interval = compact_interval
+        self.pending = []  # Results not in the log yet
+        self.wakeup = asyncio.Event()
+
+        self.leaderboard = Leaderboard(size)
+        if os.path.isfile(log):
+            for record in self.read_log():
+                self.leaderboard.add(record)
+        elif os.path.isfile(snapshot):  # Only the overall top, from before there was a log
+            with open(snapshot) as f:
+                self.pending = [
+                    {"player": player, "score": score, "mode": None} for player, score in json.load(f)
+                ]
+            for record in self.pending:
+                self.leaderboard.add(record)
+
+    def add(self, player, score, mode=None):
+        """
+        Method that records a result
+        @param mode: Leaderboard it also competes in, besides the overall one
+        """
+        record = {"player": player, "score": score, "mode": mode}
+        self.leaderboard.add(record)
+        self.pending.append(record)
+        self.wakeup.set()
+
+    def top(self, mode=None):
+        return self.leaderboard.top(mode)
+
+    def read_log(self):
+        with open(self.log) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def append(self, records):
+        """Method that appends results to the log (in a thread)."""
+        with open(self.log, "a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.writelines(json.dumps(record) + "\n" for record in records)
+
+    def compact(self):
+        """
+        Method that compacts the log, with every process' results, and writes the snapshot (in
+        a thread)
+        @returns: The Leaderboard of the whole log
+        """
+        with open(self.log, "a+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            leaderboard = Leaderboard(self.size)
+            for line in f:
+                if line.strip():
+                    leaderboard.add(json.loads(line))
+            f.seek(0)
+            f.truncate()
+            f.writelines(json.dumps(record) + "\n" for record in leaderboard.records())
+
+            temp = self.snapshot + ".tmp"
+            with open(temp, "w") as snapshot:
+                json.dump(leaderboard.top(), snapshot)
+            os.replace(temp, self.snapshot)
+        return leaderboard
+
+    async def run(self):
+        """Method that writes the results to the log and compacts it, forever."""
+        loop = asyncio.get_running_loop()
+        last_compaction = loop.time()
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.compact_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+            records, self.pending = self.pending, []
+            if records:
+                await loop.run_in_executor(None, self.append, records)
+
+            if loop.time() - last_compaction >= self.compact_interval:
+                leaderboard = await loop.run_in_executor(None, self.compact)
+                for record in self.pending:  # Added while we were compacting
+                    leaderboard.add(record)
+                self.leaderboard = leaderboard
+                last_compaction = loop.time()
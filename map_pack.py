@@ -0,0 +1,128 @@
+import argparse
+import functools
+import logging
+import struct
+import time
+
+import numpy as np
+
+from batch_game import MAX_ENEMIES
+from game import LEVEL_ENEMIES, MAP_SIZE
+from mapa import Map, generate, map_rng
+
+MAGIC = b"BMMP\x01"
+HEADER = struct.Struct("<HHI")  # Map size (hor_tiles, ver_tiles) and number of maps
+
+
+def record_dtype(size):
+    """Function that returns the numpy dtype of a pack's maps, for a map size."""
+    return np.dtype(
+        [
+            ("seed", "<u8"),
+            ("level", "<i2"),
+            ("enemies", "u1"),
+            ("spawns", "u1", (MAX_ENEMIES, 2)),
+            ("exit_door", "u1", (2,)),
+            ("powerup", "u1", (2,)),
+            ("tiles", "u1", tuple(size)),  # Indexed [x, y], like Map.tiles
+        ]
+    )
+
+
+def write_pack(path, seeds, levels, size=MAP_SIZE):
+    """
+    Function that generates the map of every (seed, level) pair, exactly as a game with that
+    seed gets it on that level, into a pack file: a header, then fixed size records
+    @returns: How many maps were written
+    """
+    records = np.zeros(len(seeds) * len(levels), dtype=record_dtype(size))
+    pairs = [(seed, level) for seed in seeds for level in levels]
+    for record, (seed, level) in zip(records, pairs):
+        enemies = len(LEVEL_ENEMIES[level])
+        tiles, spawns, exit_door, powerup = generate(level, size, enemies, map_rng(seed, level))
+        record["seed"] = seed
+        record["level"] = level
+        record["enemies"] = enemies
+        record["spawns"][:enemies] = spawns
+        record["exit_door"] = exit_door
+        record["powerup"] = powerup
+        record["tiles"] = tiles
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(*size, len(records)))
+        f.write(records.tobytes())
+    return len(records)
+
+
+class MapPack:
+    """
+    A pack file, memory mapped: loading a map doesn't read or parse the file, the Map is built
+    on a (read only) view of its tiles, only copied when one of its walls is blown up.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(len(MAGIC) + HEADER.size)
+        if not header.startswith(MAGIC):
+            raise ValueError(f"{path} is not a map pack")
+        hor_tiles, ver_tiles, count = HEADER.unpack_from(header, len(MAGIC))
+        self.size = (hor_tiles, ver_tiles)
+        self.records = np.memmap(path, record_dtype(self.size), "r", len(header), (count,))
+        self.index = {
+            pair: i
+            for i, pair in enumerate(zip(self.records["seed"].tolist(), self.records["level"].tolist()))
+        }
+
+    def __getstate__(self):  # Games are pickled (Game.snapshot, process pools) with their pack
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, seed, level, size):
+        """
+        Method that loads a map
+        @returns: The Map, or None if the pack doesn't have it (or has maps of another size)
+        """
+        i = self.index.get((seed, level))
+        if i is None or tuple(size) != self.size:
+            return None
+
+        records = self.records
+        mapa = Map(
+            level=level,
+            size=self.size,
+            mapa=records["tiles"][i],
+            enemies_spawn=[tuple(spawn) for spawn in records["spawns"][i, : records["enemies"][i]].tolist()],
+        )
+        mapa.exit_door = tuple(records["exit_door"][i].tolist())
+        mapa.powerup = tuple(records["powerup"][i].tolist())
+        return mapa
+
+
+@functools.lru_cache(maxsize=None)
+def load_pack(path):
+    """Function that opens a pack once per process."""
+    return MapPack(path)
+
+
+if __name__ == "__main__":
+    from tournament import parse_numbers
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pack", help="Pack file to write")
+    parser.add_argument("--seeds", help="Seeds of the maps, e.g 1-1000 or 1,5,9", default="1-100")
+    parser.add_argument("--levels", help="Levels of the maps, e.g 1 or 1-15", default="1-15")
+    parser.add_argument("--size", help="Map size", default="x".join(map(str, MAP_SIZE)))
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # Map logs every enemy it places
+    start = time.perf_counter()
+    size = tuple(int(n) for n in args.size.split("x"))
+    count = write_pack(args.pack, parse_numbers(args.seeds), parse_numbers(args.levels), size)
+    print(f"{count} maps written to {args.pack} in {time.perf_counter() - start:.1f}s")
@@ -1,8 +1,11 @@
 import os
 import logging
 import random
+from collections import OrderedDict
 from enum import IntEnum
 
+import numpy as np
+
 logger = logging.getLogger("Map")
 logger.setLevel(logging.DEBUG)
 
@@ -14,10 +17,78 @@ class Tiles(IntEnum):
 
 
 VITAL_SPACE = 3
+STONE_DISTANCES_CACHE = 64  # BFS fields kept per map, least recently used ones are dropped
+
+
+def map_rng(seed, level):
+    """
+    Function that returns the random generator of a level's map: the same (seed, level) pair
+    always gives the same map, whatever was generated before it and in whatever process
+    """
+    return np.random.default_rng([seed % 2**64, level % 2**32])  # Only non-negative numbers
+
+
+def generate(level, size, enemies, rng, empty=False):
+    """
+    Function that generates a map's tiles, with whole grid operations: stones on the border and
+    on every other row and column, walls on some of the other tiles (a tile has a wall when a
+    number drawn from 0 to 100 is above 70 + 25 / level) out of the bomberman's vital space,
+    and enemies on passages, with the walls around them removed
+    @param rng: numpy Generator the map is drawn with
+    @returns: The tiles (array indexed [x, y]), enemies' spawns, exit door and powerup
+    """
+    hor_tiles, ver_tiles = size
+    x, y = np.indices(size)
+    tiles = np.full(size, Tiles.PASSAGE, dtype=np.uint8)
+    stones = (x == 0) | (x == hor_tiles - 1) | (y == 0) | (y == ver_tiles - 1) | ((x % 2 == 0) & (y % 2 == 0))
+    tiles[stones] = Tiles.STONE
+    if not empty:  # give bomberman some room
+        candidates = ~stones & (x >= VITAL_SPACE) & (y >= VITAL_SPACE)
+        tiles[candidates & (rng.integers(0, 101, size) > 70 + 25 / level)] = Tiles.WALL
+
+    spawns = []
+    for _ in range(enemies):
+        # A uniform pick among the free tiles, like drawing tiles until one is free
+        free = np.flatnonzero(tiles[VITAL_SPACE:, VITAL_SPACE:] == Tiles.PASSAGE)
+        ex, ey = np.unravel_index(free[rng.integers(len(free))], (hor_tiles - VITAL_SPACE, ver_tiles - VITAL_SPACE))
+        ex, ey = int(ex) + VITAL_SPACE, int(ey) + VITAL_SPACE
+        spawns.append((ex, ey))
+        logger.debug(f"Spawn enemy at ({ex}, {ey})")
+        # create a vital space for enemies:
+        around = tiles[ex - 1 : ex + 2, ey - 1 : ey + 2]
+        around[around == Tiles.WALL] = Tiles.PASSAGE
+
+    exit_door = powerup = None
+    if not empty:
+        walls = np.argwhere(tiles == Tiles.WALL)
+        exit_index = rng.integers(len(walls))
+        powerup_index = rng.integers(len(walls) - 1)  # hide powerups behind walls only
+        if powerup_index >= exit_index:
+            powerup_index += 1
+        exit_door, powerup = tuple(walls[exit_index].tolist()), tuple(walls[powerup_index].tolist())
+    return tiles, spawns, exit_door, powerup
+
+
+def level_map(seed, level, size, enemies, maps=None):
+    """
+    Function that returns a game's map for a level, from a pack of pre-generated maps if it has
+    that (seed, level) pair, generated otherwise
+    @param maps: map_pack.MapPack, if any
+    """
+    if maps is not None:
+        mapa = maps.get(seed, level, size)
+        if mapa is not None:
+            return mapa
+    return Map(level=level, size=size, enemies=enemies, rng=map_rng(seed, level))
 
 
 class Map:
-    def __init__(self, level=1, enemies=0, size=(VITAL_SPACE+10, VITAL_SPACE+10), mapa=None, enemies_spawn=None, empty=False):
+    def __init__(self, level=1, enemies=0, size=(VITAL_SPACE+10, VITAL_SPACE+10), mapa=None, enemies_spawn=None, empty=False, rng=None):
+        """
+        @param mapa: Tiles of a map to load (lists or array indexed [x, y]), instead of generating one
+        @param rng: numpy Generator the map is generated with (seeded from the random module by
+        default)
+        """
 
         assert size[0] > VITAL_SPACE+9
         assert size[1] > VITAL_SPACE+9
@@ -26,81 +97,90 @@ class Map:
         self._size = size
         self.hor_tiles = size[0]
         self.ver_tiles = size[1]
-        self._walls = []
+        self._stone_distances = OrderedDict()  # BFS fields over the stone grid, by source position (LRU)
+        self._stone_neighbours = None  # Non stone neighbours of every tile, by flat index
+        self._blast_footprints = {}  # Tiles reached by a blast, by (position, radius)
         if enemies_spawn:
             self._enemies_spawn = enemies_spawn
         else:
             self._enemies_spawn = []
 
-        if not mapa:
+        if mapa is None:
             logger.info("Generating a MAP")
-            self.map = [[Tiles.PASSAGE] * self.ver_tiles for i in range(self.hor_tiles)]
-            for x in range(self.hor_tiles):
-                for y in range(self.ver_tiles):
-                    if x in [0, self.hor_tiles - 1] or y in [0, self.ver_tiles - 1]:
-                        self.map[x][y] = Tiles.STONE
-                    elif x % 2 == 0 and y % 2 == 0:
-                        self.map[x][y] = Tiles.STONE
-                    elif (
-                        x >= VITAL_SPACE and y >= VITAL_SPACE and not empty
-                    ):  # give bomberman some room
-                        if random.randint(0, 100) > 70 + 25 / level:
-                            self.map[x][y] = Tiles.WALL
-                            self._walls.append((x, y))
-
-            for _ in range(enemies):
-                x, y = 0, 0
-                while self.map[x][y] in [
-                    Tiles.STONE,
-                    Tiles.WALL,
-                ]:  # find empty spots to place enemies
-                    x, y = (
-                        random.randrange(VITAL_SPACE, self.hor_tiles),
-                        random.randrange(VITAL_SPACE, self.ver_tiles),
-                    )
-                self._enemies_spawn.append((x, y))
-                logger.debug(f"Spawn enemy at ({x}, {y})")
-                # create a vital space for enemies:
-                for rx, ry in [(x, y) for x in [-1, 0, 1] for y in [-1, 0, 1]]:
-                    if self.map[x + rx][y + ry] in [Tiles.WALL]:
-                        self.map[x + rx][y + ry] = Tiles.PASSAGE
-                        self._walls.remove((x + rx, y + ry))
-
+            if rng is None:
+                rng = np.random.default_rng(random.getrandbits(64))
+            tiles, spawns, exit_door, powerup = generate(level, size, enemies, rng, empty)
+            self._enemies_spawn += spawns
             if not empty:
-                self.exit_door = random.choice(self._walls)
-                self.powerup = random.choice(
-                    [w for w in self._walls if w != self.exit_door]
-                )  # hide powerups behind walls only
-
+                self.exit_door = exit_door
+                self.powerup = powerup
         else:
             logger.info("Loading MAP")
-            self.map = mapa
-            for x in range(self.hor_tiles):
-                for y in range(self.ver_tiles):
-                    if self.map[x][y] == Tiles.WALL and (x, y) != (1, 1):
-                        self._walls.append((x, y))
+            tiles = np.asarray(mapa, dtype=np.uint8)  # Not copied, when it's a pack's (read only) array
+            if tiles is mapa and tiles.flags.writeable:  # Not ours to change
+                tiles = tiles.copy()
         self._bomberman_spawn = (1, 1)  # Always true
 
+        # The map is only kept as numpy planes, indexed [x, y], so single tiles can be queried in
+        # O(1) and whole grid operations can be vectorized (the map and walls lists are derived
+        # from them). Stones never change during a level, walls (and the tiles plane) are kept in
+        # sync by remove_wall and the walls setter. The tiles plane can be a read only view of a
+        # map pack: it's only copied when a wall is first removed
+        self.tiles = tiles
+        self.stone_mask = tiles == Tiles.STONE
+        self.wall_mask = tiles == Tiles.WALL
+        self.passable_mask = ~(self.stone_mask | self.wall_mask)
+        if self.wall_mask[self._bomberman_spawn]:
+            self.remove_wall(self._bomberman_spawn)
+
     def __getstate__(self):
-        return self.map
+        # Everything but the caches, which are filled again as they're needed
+        return dict(self.__dict__, _stone_distances=OrderedDict(), _stone_neighbours=None, _blast_footprints={})
 
     def __setstate__(self, state):
-        self.map = state
+        self.__dict__.update(state)
 
     @property
     def size(self):
         return self._size
 
+    @property
+    def map(self):
+        """Tiles of the map as lists (indexed [x][y]), built from the tiles plane on every call"""
+        return self.tiles.tolist()
+
     @property
     def walls(self):
-        return self._walls
+        """Walls left, column by column, built from the wall plane on every call"""
+        return list(zip(*(axis.tolist() for axis in np.nonzero(self.wall_mask))))
 
     @walls.setter
     def walls(self, walls):
-        self._walls = [ (x, y) for x, y in walls ] 
+        self.wall_mask[:] = False
+        walls = [(x, y) for x, y in walls]
+        if walls:
+            xs, ys = zip(*walls)
+            self.wall_mask[xs, ys] = True
+        self._update_masks()
 
     def remove_wall(self, wall):
-        self._walls.remove(wall)
+        self._own_tiles()
+        self.wall_mask[wall] = False
+        self.passable_mask[wall] = not self.stone_mask[wall]
+        self.tiles[wall] = Tiles.STONE if self.stone_mask[wall] else Tiles.PASSAGE
+
+    def _own_tiles(self):
+        """Method that copies the tiles plane before it's first changed, if it's a map pack's view"""
+        if not self.tiles.flags.writeable:
+            self.tiles = np.array(self.tiles)
+
+    def _update_masks(self):
+        """Method that rebuilds the passable mask and the tiles plane from the wall mask"""
+        np.logical_not(self.stone_mask | self.wall_mask, out=self.passable_mask)
+        self._own_tiles()
+        self.tiles[:] = Tiles.PASSAGE
+        self.tiles[self.wall_mask] = Tiles.WALL
+        self.tiles[self.stone_mask] = Tiles.STONE
 
     @property
     def level(self):
@@ -120,21 +200,115 @@ class Map:
 
     def get_tile(self, pos):
         x, y = pos
-        return self.map[x][y]
+        return int(self.tiles[x, y])
 
     def is_blocked(self, pos, wallpass=False):
         x, y = pos
-        if x not in range(self.hor_tiles) or y not in range(self.ver_tiles):
-            return True
-        if self.map[x][y] in [Tiles.STONE] or (not wallpass and (x, y) in self._walls):
+        if not (0 <= x < self.hor_tiles and 0 <= y < self.ver_tiles):
             return True
-        return False
+        if wallpass:
+            return bool(self.stone_mask[x, y])
+        return not self.passable_mask[x, y]
 
     def is_stone(self, pos):
         x, y = pos
-        if x >= self.hor_tiles or y >= self.ver_tiles: #everything outside of map is stone
+        if not (0 <= x < self.hor_tiles and 0 <= y < self.ver_tiles): #everything outside of map is stone
             return True
-        return self.map[x][y] in [Tiles.STONE]
+        return bool(self.stone_mask[x, y])
+
+    def stone_neighbours(self):
+        """
+        Method that computes, once per map, the non stone neighbours of every tile
+        @returns: A list of neighbour lists, both as flat indexes (x * ver_tiles + y)
+        """
+        if self._stone_neighbours is None:
+            self._stone_neighbours = [
+                [
+                    nx * self.ver_tiles + ny
+                    for nx, ny in [(x, y - 1), (x - 1, y), (x, y + 1), (x + 1, y)]
+                    if 0 <= nx < self.hor_tiles
+                    and 0 <= ny < self.ver_tiles
+                    and not self.stone_mask[nx, ny]
+                ]
+                for x in range(self.hor_tiles)
+                for y in range(self.ver_tiles)
+            ]
+        return self._stone_neighbours
+
+    def stone_distances(self, source):
+        """
+        Method that computes (BFS) the walking distances from a position to every tile, ignoring
+        walls. Stones never change during a level, so the last STONE_DISTANCES_CACHE fields are kept
+        @param source: Position to walk from
+        @returns: A flat list indexed by x * ver_tiles + y, with None for tiles that can't be reached
+        """
+        field = self._stone_distances.get(source)
+        if field is not None:
+            self._stone_distances.move_to_end(source)
+            return field
+
+        neighbours = self.stone_neighbours()
+        field = [None] * (self.hor_tiles * self.ver_tiles)
+        x, y = source
+        if 0 <= x < self.hor_tiles and 0 <= y < self.ver_tiles:
+            idx = x * self.ver_tiles + y
+            field[idx] = 0
+            frontier = [idx]
+            distance = 0
+            while frontier:
+                distance += 1
+                next_frontier = []
+                for idx in frontier:
+                    for neighbour in neighbours[idx]:
+                        if field[neighbour] is None:
+                            field[neighbour] = distance
+                            next_frontier.append(neighbour)
+                frontier = next_frontier
+
+        self._stone_distances[source] = field
+        if len(self._stone_distances) > STONE_DISTANCES_CACHE:
+            self._stone_distances.popitem(last=False)
+        return field
+
+    def distance(self, pos_one, pos_two):
+        """
+        Method that computes the exact walking distance between two positions, ignoring walls
+        @returns: The distance, or None if one can't be reached from the other
+        """
+        pos_one, pos_two = tuple(pos_one), tuple(pos_two)
+        if pos_two in self._stone_distances:
+            field, (x, y) = self.stone_distances(pos_two), pos_one
+        else:
+            field, (x, y) = self.stone_distances(pos_one), pos_two
+        if not (0 <= x < self.hor_tiles and 0 <= y < self.ver_tiles):
+            return None
+        return field[x * self.ver_tiles + y]
+
+    def blast_footprint(self, pos, radius):
+        """
+        Method that computes the tiles hit by a bomb: radius tiles in every direction, stopping at
+        stones. Walls don't stop a blast and stones never change during a level, so it's cached
+        @param pos: Position of the bomb
+        @param radius: Blast radius of the bomb
+        @returns: A frozenset of (x, y) tuples
+        """
+        key = (tuple(pos), radius)
+        footprint = self._blast_footprints.get(key)
+        if footprint is not None:
+            return footprint
+
+        bx, by = key[0]
+        tiles = [] if self.is_stone((bx, by)) else [(bx, by)]
+        if tiles:
+            for dx, dy in [(0, -1), (-1, 0), (0, 1), (1, 0)]:
+                for r in range(1, radius + 1):
+                    tile = (bx + dx * r, by + dy * r)
+                    if self.is_stone(tile):
+                        break
+                    tiles.append(tile)
+
+        footprint = self._blast_footprints[key] = frozenset(tiles)
+        return footprint
 
     def calc_pos(self, cur, direction, wallpass=False):
         assert direction in "wasd" or direction == ""
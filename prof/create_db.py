@@ -1,3 +1,6 @@
-from grading import db
+from grading import Game, backfill_best, db
 
 db.create_all()
+for index in Game.__table__.indexes:  # Tables created before they were indexed
+    index.create(db.engine, checkfirst=True)
+backfill_best()
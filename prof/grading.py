@@ -1,22 +1,41 @@
 from flask import Flask, request, jsonify, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
+import atexit
 import os
-from sqlalchemy import and_, func
+import queue
+import sqlite3
+import threading
+from sqlalchemy import and_, event
+from sqlalchemy.engine import Engine
 
 app = Flask(__name__, static_url_path='')
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'grades.sqlite')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'GRADING_DATABASE', 'sqlite:///' + os.path.join(basedir, 'grades.sqlite')
+)
 db = SQLAlchemy(app)
 ma = Marshmallow(app)
 
+BATCH_SIZE = 500  # Most games inserted in one transaction by the writer
+
+
+@event.listens_for(Engine, "connect")
+def set_wal_mode(dbapi_connection, connection_record):
+    """Readers don't wait for the writer (nor the writer for them) in WAL mode."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 
 class Game(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, server_default=db.func.now())
-    player = db.Column(db.String(25))
+    player = db.Column(db.String(25), index=True)
     level = db.Column(db.Integer)
-    score = db.Column(db.Integer)
+    score = db.Column(db.Integer, index=True)
     total_steps = db.Column(db.Integer)
 
     def __init__(self, player, level, score, total_steps):
@@ -25,6 +44,132 @@ class Game(db.Model):
         self.score = score
         self.total_steps = total_steps
 
+class Best(db.Model):
+    """Best game of every player (a copy of its row), kept up to date as games are added"""
+    player = db.Column(db.String(25), primary_key=True)
+    id = db.Column(db.Integer, db.ForeignKey('game.id'))
+    timestamp = db.Column(db.DateTime)
+    level = db.Column(db.Integer)
+    score = db.Column(db.Integer)
+    total_steps = db.Column(db.Integer)
+
+    __table_args__ = (db.Index('ix_best_rank', 'score', 'timestamp'),)
+
+
+# JSON of every leaderboard page read since the leaderboard last changed
+leaderboard_pages = {}
+leaderboard_generation = 0  # Changes of the leaderboard, so pages read before one aren't cached
+cache_lock = threading.Lock()
+
+
+def update_best(game):
+    """
+    Function that makes a game its player's best game, if it is
+    @returns: Whether it was
+    """
+    best = Best.query.get(game.player)
+    if best is None:
+        best = Best(player=game.player)
+        db.session.add(best)
+    elif best.score >= game.score:
+        return False
+
+    best.id = game.id
+    best.timestamp = game.timestamp
+    best.level = game.level
+    best.score = game.score
+    best.total_steps = game.total_steps
+    return True
+
+
+def backfill_best():
+    """Function that fills the Best table from the games, when it's empty (e.g a new table)."""
+    if Best.query.first() is not None:
+        return
+
+    best = {}  # Best game of every player, the first one among equal scores
+    columns = (Game.id, Game.timestamp, Game.player, Game.level, Game.score, Game.total_steps)
+    for game in db.session.query(*columns).order_by(Game.id).yield_per(1000):
+        if game.player not in best or game.score > best[game.player].score:
+            best[game.player] = game
+    db.session.add_all(Best(**game._asdict()) for game in best.values())
+    db.session.commit()
+
+
+def game_record(json):
+    """Function that reads a game record from a request's JSON (KeyError if it's incomplete)."""
+    return {
+        'player': json['player'],
+        'level': json['level'],
+        'score': json['score'],
+        'total_steps': json.get('total_steps', -1),
+    }
+
+
+write_lock = threading.Lock()
+
+
+def insert_games(records):
+    """
+    Function that inserts games (and updates the best ones) in one transaction
+    @returns: The new games
+    """
+    with write_lock:  # Two transactions could both add a new player's best game
+        games = [Game(**record) for record in records]
+        db.session.add_all(games)
+        db.session.flush()  # Gets their ids and timestamps
+        changed = [update_best(game) for game in games]
+        db.session.commit()
+    if any(changed):
+        global leaderboard_generation
+        with cache_lock:
+            leaderboard_generation += 1
+            leaderboard_pages.clear()
+    return games
+
+
+def save_games(records):
+    """
+    Function that inserts games that were already accepted: in one transaction, or if that
+    fails, one by one, so only the games that can't be inserted on their own are lost
+    @returns: How many games were inserted
+    """
+    try:
+        insert_games(records)
+        return len(records)
+    except Exception:
+        db.session.rollback()
+        if len(records) == 1:
+            app.logger.exception("Dropped game %s", records[0])
+            return 0
+        app.logger.exception("Could not insert %s games, inserting them one by one", len(records))
+    return sum(save_games([record]) for record in records)
+
+
+# Records POSTed in bulk (to /games), waiting for the writer
+write_queue = queue.Queue()
+
+
+def writer():
+    """Function that inserts the queued records, in batches of whatever is waiting, forever."""
+    while True:
+        records = [write_queue.get()]
+        while len(records) < BATCH_SIZE:
+            try:
+                records.append(write_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        with app.app_context():
+            save_games(records)
+        for _ in records:
+            write_queue.task_done()
+
+
+threading.Thread(target=writer, daemon=True).start()
+atexit.register(write_queue.join)  # Don't lose the queued games
+
+
 class GameSchema(ma.Schema):
     class Meta:
         # Fields to expose
@@ -38,19 +183,29 @@ games_schema = GameSchema(many=True)
 # endpoint to create new game
 @app.route("/game", methods=["POST"])
 def add_game():
-    player = request.json['player']
-    level = request.json['level']
-    score = request.json['score']
-    total_steps= request.json.get('total_steps', -1)
+    try:
+        record = game_record(request.json)
+    except KeyError as e:
+        return jsonify({'error': f'missing {e}'}), 400
 
-    print(player, score)
-    new_game = Game(player, level, score, total_steps)
-
-    db.session.add(new_game)
-    db.session.commit()
+    print(record['player'], record['score'])
+    new_game, = insert_games([record])
 
     return game_schema.jsonify(new_game)
 
+# endpoint to create many games at once
+@app.route("/games", methods=["POST"])
+def add_games():
+    try:
+        records = [game_record(json) for json in request.json]
+    except KeyError as e:
+        return jsonify({'error': f'missing {e}'}), 400
+
+    for record in records:
+        write_queue.put(record)  # Inserted (with others) by the writer
+
+    return jsonify(records), 202
+
 @app.route("/static/<path:path>")
 def send_static(path):
     return send_from_directory('static', path)
@@ -60,11 +215,15 @@ def send_static(path):
 def get_game():
     page = request.args.get('page', 1, type=int)
 
-    q = db.session.query(Game.id, Game.timestamp, Game.player, Game.level, func.max(Game.score).label('score'), Game.total_steps).group_by(Game.player).order_by(Game.score.desc(), Game.timestamp.desc())
-#    print(q.statement)
-
-    all_games = q.paginate(page, 20, False)
-    result = games_schema.dump(all_games.items)
+    result = leaderboard_pages.get(page)
+    if result is None:
+        generation = leaderboard_generation
+        q = Best.query.order_by(Best.score.desc(), Best.timestamp.desc())
+        all_games = q.paginate(page, 20, False)
+        result = games_schema.dump(all_games.items)
+        with cache_lock:
+            if generation == leaderboard_generation:  # Not read before a change was committed
+                leaderboard_pages[page] = result
     return jsonify(result)
 
 
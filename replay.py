@@ -0,0 +1,194 @@
+import argparse
+import bisect
+import json
+import logging
+import struct
+import zlib
+
+from game import Game
+
+MAGIC = b"BMRP\x01"
+RECORD = struct.Struct("<BI")  # Type and length of the payload
+HEADER, KEYS, KEYFRAME = range(3)
+TICK = struct.Struct("<I")  # Tick of a keyframe, before its (compressed) snapshot
+
+KEYFRAME_INTERVAL = 300  # Ticks between keyframes
+NO_KEY = "."  # No key pressed on that tick
+INVALID_KEY = "?"  # Any key the game ignores (they all do nothing)
+VALID_KEYS = "wasdAB"
+
+
+def encode_key(key):
+    if key == "":
+        return NO_KEY
+    return key if len(key) == 1 and key in VALID_KEYS else INVALID_KEY
+
+
+def decode_key(key):
+    return "" if key == NO_KEY else key
+
+
+def new_game(header):
+    """
+    Function that starts a game the way the server does for a replay's session
+    @param header: The replay's header
+    """
+    game = Game(header["level"], header["lives"], header["timeout"], tuple(header["size"]), header["seed"])
+    game.start(header["player"])
+    return game
+
+
+class ReplayRecorder:
+    """
+    Writes a game's replay as it's played: a header (seed, start level, lives, timeout...), the
+    key of every tick (a byte each), and every keyframe_interval ticks a keyframe (a compressed
+    Game.snapshot), so a ReplayEngine can seek without simulating the game from its start.
+    Each one is a record (type, length, payload) appended to the file.
+    """
+
+    def __init__(
+        self, path, seed, level, lives, timeout, player, size, keyframe_interval=KEYFRAME_INTERVAL
+    ):
+        self.keyframe_interval = keyframe_interval
+        self.keys = []  # Keys since the last keyframe
+        self.ticks = 0
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        header = {
+            "seed": seed,
+            "level": level,
+            "lives": lives,
+            "timeout": timeout,
+            "player": player,
+            "size": list(size),
+            "keyframe_interval": keyframe_interval,
+        }
+        self.write(HEADER, json.dumps(header).encode())
+
+    def write(self, type, payload):
+        self.file.write(RECORD.pack(type, len(payload)))
+        self.file.write(payload)
+
+    def record(self, key, game):
+        """
+        Method that records a tick
+        @param key: Key the game was stepped with
+        @param game: The game, after the step
+        """
+        self.keys.append(encode_key(key))
+        self.ticks += 1
+        if self.ticks % self.keyframe_interval == 0:
+            self.write(KEYS, "".join(self.keys).encode())
+            self.keys = []
+            self.write(KEYFRAME, TICK.pack(self.ticks) + zlib.compress(game.snapshot(), 1))
+            self.file.flush()
+
+    def close(self):
+        if self.keys:
+            self.write(KEYS, "".join(self.keys).encode())
+        self.file.close()
+
+
+class Replay:
+    """A replay, as loaded from its file."""
+
+    def __init__(self, header, keys, keyframes):
+        self.header = header
+        self.keys = keys  # One character per tick
+        self.keyframes = keyframes  # Compressed snapshot by tick
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{path} is not a replay")
+
+        header, keys, keyframes = None, [], {}
+        offset = len(MAGIC)
+        while offset + RECORD.size <= len(data):
+            type, length = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            payload = data[offset : offset + length]
+            if len(payload) < length:  # The server stopped while writing it
+                break
+            offset += length
+
+            if type == HEADER:
+                header = json.loads(payload)
+            elif type == KEYS:
+                keys.append(payload.decode())
+            elif type == KEYFRAME:
+                keyframes[TICK.unpack_from(payload)[0]] = payload[TICK.size :]
+        return cls(header, "".join(keys), keyframes)
+
+    @property
+    def ticks(self):
+        return len(self.keys)
+
+
+class ReplayEngine:
+    """
+    Re-simulates a replay through Game, as fast as possible, from its start or from the closest
+    keyframe before the tick we're seeking.
+    """
+
+    def __init__(self, replay):
+        self.replay = replay
+        self.keyframe_ticks = sorted(replay.keyframes)
+
+    def seek(self, tick):
+        """
+        Method that returns the game as it was after a number of ticks
+        @param tick: The tick, from 0 (the game just started) to the replay's ticks
+        """
+        if not 0 <= tick <= self.replay.ticks:
+            raise ValueError(f"The replay has ticks 0 to {self.replay.ticks}")
+
+        game = new_game(self.replay.header)
+        index = bisect.bisect_right(self.keyframe_ticks, tick)
+        start = 0
+        if index > 0:
+            start = self.keyframe_ticks[index - 1]
+            game.restore(zlib.decompress(self.replay.keyframes[start]))
+
+        for key in self.replay.keys[start:tick]:
+            game.step(decode_key(key))
+        return game
+
+    def run(self, on_step=None):
+        """
+        Method that plays the whole replay
+        @param on_step: Function called with the tick and the new state after every step
+        @returns: The game, over
+        """
+        game = new_game(self.replay.header)
+        for tick, key in enumerate(self.replay.keys, 1):
+            state = game.step(decode_key(key))
+            if on_step:
+                on_step(tick, state)
+        return game
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("replay", help="Replay file")
+    parser.add_argument("--tick", type=int, help="Print the game's state after this tick")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # The game logs every explosion
+    replay = Replay.load(args.replay)
+    engine = ReplayEngine(replay)
+    if args.tick is not None:
+        print(engine.seek(args.tick).state)
+    else:
+        deaths = []
+        lives = [replay.header["lives"]]
+
+        def find_deaths(tick, state):
+            if state["lives"] < lives[0]:
+                deaths.append(tick)
+            lives[0] = state["lives"]
+
+        game = engine.run(find_deaths)
+        print(json.dumps(dict(replay.header, ticks=replay.ticks, score=game.score, deaths=deaths)))
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import threading
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+logger = logging.getLogger("Router")
+logger.setLevel(logging.INFO)
+
+TICK_STATS = ["ticks", "late", "skipped"]  # Tick stats that add up (max_lateness_ms doesn't)
+START_TIMEOUT = 30.0  # Seconds a worker has to get ready
+RESTART_DELAY = 1.0  # Seconds before a dead worker is started again
+
+
+class Worker:
+    def __init__(self, index, port):
+        self.index = index
+        self.port = port
+        self.players = 0  # Players connected to it (playing or waiting for a free slot), as it reported
+        self.redirected = 0  # Players we sent to it since it last reported its players
+        self.sessions = {}  # Info of its running sessions, by id
+        self.ready = False
+        self.restarts = 0
+        self.stats = {"games": 0, "ticks": 0, "late": 0, "skipped": 0, "max_lateness_ms": 0}
+
+    @property
+    def load(self):
+        return self.players + self.redirected
+
+    def to_dict(self):
+        return dict(
+            self.stats, worker=self.index, players=self.players, sessions=len(self.sessions),
+            ready=self.ready, restarts=self.restarts,
+        )
+
+
+class Router:
+    """
+    Front door of a multi process server: the /player and /viewer websocket handshakes are
+    redirected (HTTP 302, which websocket clients follow) to a worker process running a
+    Game_server, and the connection then goes straight to the worker. No game frame goes through
+    the router, so games tick on as many cores as there are workers.
+    Players go to the worker with the fewest players, viewers to the worker running the session
+    they asked for (/viewer?session=N) or the newest one. Workers report their players and their
+    sessions' starts and ends, with their tick stats, which are gathered here and served with
+    {"cmd": "metrics"} on any other path. Workers that died aren't picked until they're ready again.
+    """
+
+    def __init__(self, ports):
+        self.workers = [Worker(index, port) for index, port in enumerate(ports)]
+        self.newest_session = None
+
+    def pick_worker(self, path, session=None):
+        """
+        Method that chooses the worker a connection goes to
+        @param path: The connection's path (/player or /viewer)
+        @param session: Session a viewer asked for
+        @returns: The worker, or None if none is ready
+        """
+        workers = [worker for worker in self.workers if worker.ready]
+        if not workers:
+            return None
+        if path == "/player":
+            return min(workers, key=lambda worker: worker.load)
+
+        if session is None:
+            session = self.newest_session
+        for worker in workers:
+            if session in worker.sessions:
+                return worker
+        return min(workers, key=lambda worker: len(worker.sessions))
+
+    def handle_event(self, event):
+        """Method that applies an event reported by a worker (or by run_router, when one dies)."""
+        worker = self.workers[event["worker"]]
+        if event["event"] == "ready":
+            worker.ready = True
+        elif event["event"] == "players":
+            worker.players = event["players"]
+            worker.redirected = 0
+        elif event["event"] == "start":
+            worker.sessions[event["session"]] = {
+                key: value for key, value in event.items() if key not in ("event", "worker")
+            }
+            self.newest_session = event["session"]
+        elif event["event"] == "end":
+            worker.sessions.pop(event["session"], None)
+            worker.stats["games"] += 1
+            for stat in TICK_STATS:
+                worker.stats[stat] += event["ticks"][stat]
+            worker.stats["max_lateness_ms"] = max(
+                worker.stats["max_lateness_ms"], event["ticks"]["max_lateness_ms"]
+            )
+            logger.info("Metrics: %s", json.dumps(self.metrics()["total"]))
+        elif event["event"] == "exit":  # Its sessions and players are gone with it
+            worker.ready = False
+            worker.sessions.clear()
+            worker.players = worker.redirected = 0
+            worker.restarts += 1
+
+    def metrics(self):
+        workers = [worker.to_dict() for worker in self.workers]
+        total = {
+            stat: sum(worker[stat] for worker in workers)
+            for stat in ["games", "players", "sessions", "restarts"] + TICK_STATS
+        }
+        total["max_lateness_ms"] = max(worker["max_lateness_ms"] for worker in workers)
+        return {"workers": workers, "total": total}
+
+    def sessions(self):
+        return [
+            dict(info, worker=worker.index)
+            for worker in self.workers
+            for info in worker.sessions.values()
+        ]
+
+    def process_request(self, connection, request):
+        """
+        Method that redirects the /player and /viewer handshakes to a worker, on the host the
+        client connected to (the other paths are served by handler)
+        """
+        url = urlsplit(request.path)
+        if url.path not in ("/player", "/viewer"):
+            return None
+
+        session = parse_qs(url.query).get("session")
+        worker = self.pick_worker(url.path, int(session[0]) if session else None)
+        if worker is None:
+            return connection.respond(HTTPStatus.SERVICE_UNAVAILABLE, "No worker is ready\n")
+        if url.path == "/player":
+            worker.redirected += 1
+
+        host = urlsplit("//" + request.headers.get("Host", "127.0.0.1")).hostname
+        if ":" in host:  # IPv6
+            host = f"[{host}]"
+        response = connection.respond(HTTPStatus.FOUND, "")
+        response.headers["Location"] = f"ws://{host}:{worker.port}{request.path}"
+        return response
+
+    async def handler(self, websocket, path=None):
+        try:
+            async for message in websocket:
+                data = json.loads(message)
+                if data["cmd"] == "sessions":
+                    await websocket.send(json.dumps({"sessions": self.sessions()}))
+                if data["cmd"] == "metrics":
+                    await websocket.send(json.dumps(self.metrics()))
+        except ConnectionClosed as c:
+            logger.info(f"Client disconnected: {c}")
+
+    async def wait_ready(self):
+        while not all(worker.ready for worker in self.workers):
+            await asyncio.sleep(0.1)
+
+
+def receive_events(loop, events, router):
+    """Function that hands the workers' events to the router, from a thread."""
+    while True:
+        loop.call_soon_threadsafe(router.handle_event, events.get())
+
+
+async def supervise(router, processes, start):
+    """
+    Function that starts the worker processes that die again, forever
+    @param processes: Process of every worker
+    @param start: Function that starts a worker's process, given the Worker
+    """
+    while True:
+        await asyncio.sleep(RESTART_DELAY)
+        for worker, process in zip(router.workers, list(processes)):
+            if not process.is_alive():
+                logger.warning("Worker %s died (exit code %s), restarting it", worker.index, process.exitcode)
+                router.handle_event({"event": "exit", "worker": worker.index})
+                processes[worker.index] = start(worker)
+
+
+async def run_router(args, run_worker):
+    """
+    Function that starts args.workers worker processes, on the ports after args.port, and serves
+    the router on args.port
+    @param run_worker: Function running a worker, given args, its index, port and event queue
+    """
+    context = multiprocessing.get_context("spawn")
+    events = context.Queue()
+    router = Router([args.port + 1 + index for index in range(args.workers)])
+
+    def start(worker):
+        process = context.Process(target=run_worker, args=(args, worker.index, worker.port, events), daemon=True)
+        process.start()
+        return process
+
+    processes = [start(worker) for worker in router.workers]
+    loop = asyncio.get_running_loop()
+    threading.Thread(target=receive_events, args=(loop, events, router), daemon=True).start()
+    try:
+        await asyncio.wait_for(router.wait_ready(), START_TIMEOUT)
+    except asyncio.TimeoutError:
+        for process in processes:
+            process.terminate()
+        late = [worker.index for worker in router.workers if not worker.ready]
+        raise RuntimeError(f"Workers {late} weren't ready after {START_TIMEOUT}s")
+
+    logger.info(f"Routing @ {args.bind}:{args.port} to {args.workers} workers")
+    async with websockets.serve(router.handler, args.bind, args.port, process_request=router.process_request):
+        await supervise(router, processes, start)
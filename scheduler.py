@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+
+class TickScheduler:
+    """
+    Fixed rate scheduler that waits for absolute tick deadlines (start + n * period) instead of
+    sleeping a whole period after each tick, so the time spent computing and sending a frame
+    doesn't add up into drift.
+    A tick that starts after its deadline is late. When we fall more than a whole period
+    behind, the deadlines we missed are skipped (rather than running a burst of ticks to
+    catch up), so the game never runs faster than its advertised fps.
+    """
+
+    def __init__(self, fps, clock=time.monotonic, sleep=asyncio.sleep):
+        """
+        @param fps: Ticks per second
+        @param clock: Monotonic clock, in seconds
+        @param sleep: Coroutine function sleeping for a number of seconds
+        """
+        self.period = 1.0 / fps
+        self.clock = clock
+        self.sleep = sleep
+        self.reset()
+
+    def reset(self):
+        """Method that starts over: the next tick is one period from the next wait."""
+        self.deadline = None
+        self.ticks = 0
+        self.late = 0
+        self.skipped = 0
+        self.max_lateness = 0
+
+    async def wait(self):
+        """
+        Method that waits for the next tick's deadline
+        """
+        now = self.clock()
+        if self.deadline is None:
+            self.deadline = now + self.period
+
+        delay = self.deadline - now
+        if delay > 0:
+            await self.sleep(delay)
+        else:
+            self.late += 1
+            self.max_lateness = max(self.max_lateness, -delay)
+            missed = int(-delay // self.period)
+            self.skipped += missed
+            self.deadline += missed * self.period
+
+        self.ticks += 1
+        self.deadline += self.period
+
+    def stats(self):
+        return {
+            "ticks": self.ticks,
+            "late": self.late,
+            "skipped": self.skipped,
+            "max_lateness_ms": round(self.max_lateness * 1000, 3),
+        }
@@ -1,14 +1,23 @@
-import requests
 import argparse
 import asyncio
 import json
 import logging
+import os
+import time
 import websockets
+import websockets.exceptions
 import pickle
-import os.path
 import random
 from collections import namedtuple
-from game import Game
+from urllib.parse import parse_qs, urlsplit
+from websockets.protocol import State
+from broadcast import Broadcaster
+from router import run_router
+from game import GAME_SPEED, Game
+from grading_client import SPOOL_FILE, GradingClient
+from highscores import Highscores
+from replay import ReplayRecorder
+from scheduler import TickScheduler
 
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -21,122 +30,310 @@ logger.setLevel(logging.INFO)
 
 Player = namedtuple("Player", ["name", "ws"])
 
-MAX_HIGHSCORES = 10
-HIGHSCORE_FILE = "highscores.json"
+MAX_SESSIONS = 8
+
+
+class Session:
+    """
+    One player's game, with its own Game, seed, tick scheduler and viewers. Sessions run
+    concurrently, each in its own task.
+    """
+
+    def __init__(self, id, player, format, level, lives, timeout, seed, replays=None):
+        """
+        @param replays: Directory where the session writes its replay, if any
+        """
+        self.id = id
+        self.player = player
+        self.format = format  # Format of the player's states
+        self.seed = seed
+        self.lives = lives
+        self.timeout = timeout
+        self.replays = replays
+        self.key = ""  # Key for the next tick
+        self.game = Game(level, lives, timeout, seed=seed)
+        self.broadcaster = Broadcaster()  # Sends frames to the viewers
+        self.scheduler = TickScheduler(GAME_SPEED)
+
+    def info(self):
+        return {
+            "session": self.id,
+            "player": self.player.name,
+            "seed": self.seed,
+            "level": self.game.map.level if self.game.running else self.game.initial_level,
+            "score": self.game.score,
+        }
+
+    def record(self):
+        """Method that returns the session's grading record."""
+        return {
+            "player": self.player.name,
+            "score": self.game.score,
+            "total_steps": self.game.total_steps,
+            "level": self.game.map.level,
+            "session": self.id,
+            "seed": self.seed,
+        }
+
+    def keypress(self, key):
+        self.key = key
+
+    def replay_recorder(self):
+        """Method that starts writing the session's replay, named after its start and id."""
+        path = os.path.join(self.replays, time.strftime("%Y%m%d-%H%M%S") + f"-{self.id}.replay")
+        return ReplayRecorder(
+            path,
+            self.seed,
+            self.game.initial_level,
+            self.lives,
+            self.timeout,
+            self.player.name,
+            self.game.map.size,
+        )
+
+    async def run(self, highscores):
+        """
+        Method that plays the game until it's over
+        @param highscores: Highscores to send with the game info
+        """
+        logger.info(f"Starting game {self.id} for <{self.player.name}> (seed {self.seed})")
+        self.game.start(self.player.name)
+
+        #Send game info to viewer and player
+        game_info = self.game.info()
+        game_info["highscores"] = highscores
+        game_info["session"] = self.id
+        self.broadcaster.send_message(json.dumps(game_info))
+        await self.player.ws.send(json.dumps(game_info))
+
+        recorder = self.replay_recorder() if self.replays else None
+        try:
+            self.scheduler.reset()
+            while self.game.running:
+                await self.scheduler.wait()
+                key, self.key = self.key, ""
+                state = self.game.step(key)
+                if recorder:
+                    recorder.record(key, self.game)
+                frame = self.broadcaster.publish(state, [self.format])
+                await self.player.ws.send(frame.messages[self.format])
+        finally:
+            if recorder:
+                recorder.close()
+        logger.info("Ticks of game %s: %s", self.id, self.scheduler.stats())
+        logger.info("Viewers of game %s: %s", self.id, self.broadcaster.stats())
+
+        await self.player.ws.send(json.dumps({"score": self.game.score}))
 
 
 class Game_server:
-    def __init__(self, level, lives, timeout, grading):
-        self.game = Game(level, lives, timeout)
+    def __init__(
+        self, level, lives, timeout, grading, seed=0, max_sessions=MAX_SESSIONS,
+        first_session=1, session_step=1, report=None, grading_spool=SPOOL_FILE, replays=None,
+        highscores=None,
+    ):
+        """
+        @param grading: URL of the grading server, if any
+        @param grading_spool: File where the records wait to be sent to it
+        @param replays: Directory where every session writes its replay, if any
+        @param first_session, session_step: Ids of our sessions (first_session, then every
+        session_step-th one), so they're unique among the workers of a router
+        @param report: Function called with an event dict whenever a session starts or ends, and
+        whenever a player connects or leaves
+        @param highscores: Highscores to keep the results in (the default files, if not given)
+        """
+        self.level = level
+        self.lives = lives
+        self.timeout = timeout
+        self.seed = seed
+        self.replays = replays
+        if replays:
+            os.makedirs(replays, exist_ok=True)
         self.players = asyncio.Queue()
-        self.viewers = set()
-        self.current_player = None
-        self.grading = grading
+        self.slots = asyncio.Semaphore(max_sessions)  # Sessions that can still start
+        self.sessions = {}  # Running Session by id
+        self.session_count = 0
+        self.first_session = first_session
+        self.session_step = session_step
+        self.report = report
+        self.player_sessions = {}  # Session of every connected player
+        self.connected_players = 0  # Playing or waiting for a free slot
+        self.viewers = {}  # Session id every viewer chose, or None for the newest session
+        self.formats = {}  # Format of the states each connection asked for ("json" by default)
+        self.grading = None
+        if grading:
+            bulk_url = grading + "s" if grading.endswith("/game") else None  # /games takes batches
+            self.grading = GradingClient(grading, grading_spool, bulk_url=bulk_url)
 
-        self._highscores = []
-        if os.path.isfile(HIGHSCORE_FILE):
-            with open(HIGHSCORE_FILE, "r") as infile:
-                self._highscores = json.load(infile)
+        self.highscores = highscores or Highscores()  # By the level games start on
 
-    def save_highscores(self):
-        # update highscores
-        logger.debug("Save highscores")
-        logger.info("FINAL SCORE <%s>: %s with %s steps", self.current_player.name, self.game.score, self.game.total_steps)
+    def save_highscores(self, session):
+        logger.info("FINAL SCORE <%s>: %s with %s steps (game %s)", session.player.name, session.game.score, session.game.total_steps, session.id)
+        self.highscores.add(session.player.name, session.game.score, session.game.initial_level)
 
-        self._highscores.append((self.current_player.name, self.game.score))
-        self._highscores = sorted(self._highscores, key=lambda s: -1 * s[1])[
-            :MAX_HIGHSCORES
-        ]
+    def subscribe_viewer(self, websocket, session):
+        for other in self.sessions.values():
+            other.broadcaster.unsubscribe(websocket)
+        session.broadcaster.subscribe(websocket, self.formats.get(websocket, "json"))
 
-        with open(HIGHSCORE_FILE, "w") as outfile:
-            json.dump(self._highscores, outfile)
+    def report_players(self, change):
+        self.connected_players += change
+        if self.report:
+            self.report({"event": "players", "players": self.connected_players})
 
-    async def incomming_handler(self, websocket, path):
+    async def incomming_handler(self, websocket, path=None):
+        if path is None:  # Newer websockets don't pass the path
+            path = websocket.request.path
+        url = urlsplit(path)  # A router's redirects keep the session a viewer asked for
+        path = url.path
+        asked_session = parse_qs(url.query).get("session")
+        player = False
         try:
             async for message in websocket:
                 data = json.loads(message)
                 if data["cmd"] == "join":
+                    if data.get("format") == "binary":
+                        self.formats[websocket] = "binary"
+                    elif data.get("delta"):
+                        self.formats[websocket] = "delta"
+
                     if path == "/player":
                         logger.info("<%s> has joined", data["name"])
+                        player = True
+                        self.report_players(1)
                         await self.players.put(Player(data["name"], websocket))
 
                     if path == "/viewer":
                         logger.info("Viewer connected")
-                        self.viewers.add(websocket)
-                        if self.game.running:
-                            game_info = self.game.info()
-                            game_info["highscores"] = self._highscores
+                        session = self.sessions.get(data.get("session", asked_session and int(asked_session[0])))
+                        self.viewers[websocket] = session.id if session else None
+                        if session is None and self.sessions:
+                            session = self.sessions[max(self.sessions)]
+                        if session is not None:
+                            game_info = session.game.info()
+                            game_info["highscores"] = self.highscores.top()
+                            game_info["session"] = session.id
                             await websocket.send(json.dumps(game_info))
+                            self.subscribe_viewer(websocket, session)
+
+                if data["cmd"] == "sessions":
+                    await websocket.send(json.dumps({"sessions": [session.info() for session in self.sessions.values()]}))
 
-                if data["cmd"] == "key" and self.current_player.ws == websocket:
-                    logger.debug((self.current_player.name, data))
+                if data["cmd"] == "key" and websocket in self.player_sessions:
+                    session = self.player_sessions[websocket]
+                    logger.debug((session.player.name, data))
                     if len(data["key"]):
-                        self.game.keypress(data["key"][0])
+                        session.keypress(data["key"][0])
                     else:
-                        self.game.keypress("")
+                        session.keypress("")
 
         except websockets.exceptions.ConnectionClosed as c:
             logger.info(f"Client disconnected: {c}")
-            if websocket in self.viewers:
-                self.viewers.remove(websocket)
+        finally:
+            for session in self.sessions.values():
+                session.broadcaster.unsubscribe(websocket)
+            self.viewers.pop(websocket, None)
+            self.formats.pop(websocket, None)
+            if player:
+                self.report_players(-1)
+
+    async def run_session(self, session):
+        self.sessions[session.id] = session
+        self.player_sessions[session.player.ws] = session
+        for viewer, session_id in self.viewers.items():
+            if session_id is None:  # Following the newest session
+                self.subscribe_viewer(viewer, session)
+        if self.report:
+            self.report(dict(session.info(), event="start"))
+
+        try:
+            await session.run(self.highscores.top())
+            self.save_highscores(session)
+            logger.info(f"Disconnecting <{session.player.name}>")
+        except websockets.exceptions.ConnectionClosed:
+            logger.info(f"<{session.player.name}> disconnected from game {session.id}")
+        finally:
+            if self.report:
+                self.report({"event": "end", "session": session.id, "ticks": session.scheduler.stats()})
+            self.slots.release()
+            del self.sessions[session.id]
+            self.player_sessions.pop(session.player.ws, None)
+            for viewer, session_id in list(self.viewers.items()):
+                if session_id == session.id:  # Their game is over
+                    await viewer.close()
+
+            if self.grading:
+                self.grading.submit(session.record())
+
+            await session.player.ws.close()
 
     async def mainloop(self):
+        tasks = set()  # Keep a reference to the running sessions
+        tasks.add(asyncio.ensure_future(self.highscores.run()))
+        if self.grading:
+            tasks.add(asyncio.ensure_future(self.grading.run()))
         while True:
             logger.info("Waiting for players")
-            self.current_player = await self.players.get()
+            player = await self.players.get()
+            await self.slots.acquire()
 
-            if self.current_player.ws.closed:
-                logger.error(f"<{self.current_player.name}> disconnect while waiting")
+            if player.ws.state is State.CLOSED:
+                logger.error(f"<{player.name}> disconnect while waiting")
+                self.slots.release()
                 continue
 
-            try:
-                logger.info(f"Starting game for <{self.current_player.name}>")
-                self.game.start(self.current_player.name)
-                
-                #Send game info to viewer and player
-                game_info = self.game.info()
-                game_info["highscores"] = self._highscores
-                if self.viewers:
-                    await asyncio.wait(
-                        [
-                            client.send(json.dumps(game_info))
-                            for client in self.viewers
-                        ]
-                    )
-                await self.current_player.ws.send(json.dumps(game_info))
-
-
-                if self.grading:
-                    game_rec = dict()
-                    game_rec["player"] = self.current_player.name
-
-                while self.game.running:
-                    await self.game.next_frame()
-                    await self.current_player.ws.send(self.game.state)
-                    if self.viewers:
-                        await asyncio.wait(
-                            [client.send(self.game.state) for client in self.viewers]
-                        )
-                self.save_highscores()
-                await self.current_player.ws.send(
-                    json.dumps({"score": self.game.score})
-                )
-
-                logger.info(f"Disconnecting <{self.current_player.name}>")
-            except websockets.exceptions.ConnectionClosed:
-                self.current_player = None
-            finally:
-                try:
-                    if self.grading:
-                        game_rec["score"] = self.game.score
-                        game_rec["total_steps"] = self.game.total_steps
-                        game_rec["level"] = self.game.map.level
-                        requests.post(self.grading, json=game_rec)
-                except:
-                    logger.warning("Could not save score to server")
-
-                if self.current_player:
-                    await self.current_player.ws.close()
+            id = self.first_session + self.session_step * self.session_count
+            self.session_count += 1
+            if self.seed > 0:
+                seed = self.seed + id - 1
+            else:
+                seed = random.randrange(1, 2**31)
+            session = Session(
+                id,
+                player,
+                self.formats.get(player.ws, "json"),
+                self.level,
+                self.lives,
+                self.timeout,
+                seed,
+                self.replays,
+            )
+            task = asyncio.ensure_future(self.run_session(session))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+
+async def main(args, bind, port, **options):
+    g = Game_server(
+        args.level, args.lives, args.timeout, args.grading_server, args.seed, args.max_sessions,
+        replays=args.replays, **options,
+    )
+
+    logger.info(f"Listenning @ {bind}:{port}")
+    async with websockets.serve(g.incomming_handler, bind, port):
+        if g.report:
+            g.report({"event": "ready"})
+        await g.mainloop()
+
+
+def run_worker(args, index, port, events):
+    """
+    Function that runs a router's worker process: a Game_server on its own port (the router
+    redirects clients to it), reporting its players and sessions to the router
+    @param index: Index of the worker, from 0
+    @param events: multiprocessing Queue of the router's events
+    """
+    asyncio.run(
+        main(
+            args,
+            args.bind,
+            port,
+            first_session=index + 1,
+            session_step=args.workers,
+            report=lambda event: events.put(dict(event, worker=index)),
+            grading_spool=f"worker{index}-{SPOOL_FILE}",
+        )
+    )
 
 
 if __name__ == "__main__":
@@ -145,7 +342,7 @@ if __name__ == "__main__":
     parser.add_argument("--port", help="TCP port", type=int, default=8000)
     parser.add_argument("--level", help="start on level", type=int, default=1)
     parser.add_argument("--lives", help="Number of lives", type=int, default=3)
-    parser.add_argument("--seed", help="Seed number", type=int, default=0)
+    parser.add_argument("--seed", help="Seed number (of the first game, the next ones get the next numbers)", type=int, default=0)
     parser.add_argument(
         "--timeout", help="Timeout after this amount of steps", type=int, default=3000
     )
@@ -154,18 +351,26 @@ if __name__ == "__main__":
         help="url of grading server",
         default="http://bomberman-aulas.ws.atnog.av.it.pt/game",
     )
+    parser.add_argument(
+        "--max-sessions",
+        help="Number of games that can run at the same time",
+        type=int,
+        default=MAX_SESSIONS,
+    )
+    parser.add_argument(
+        "--replays",
+        help="Directory where every game's replay is written (none are recorded by default)",
+        default="",
+    )
+    parser.add_argument(
+        "--workers",
+        help="Run the games in this many worker processes, behind a router",
+        type=int,
+        default=0,
+    )
     args = parser.parse_args()
 
-    if args.seed > 0:
-        random.seed(args.seed)
-
-    g = Game_server(args.level, args.lives, args.timeout, args.grading_server)
-
-    game_loop_task = asyncio.ensure_future(g.mainloop())
-
-    logger.info(f"Listenning @ {args.bind}:{args.port}")
-    websocket_server = websockets.serve(g.incomming_handler, args.bind, args.port)
-
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(asyncio.gather(websocket_server, game_loop_task))
-    loop.close()
+    if args.workers > 0:
+        asyncio.run(run_router(args, run_worker))
+    else:
+        asyncio.run(main(args, args.bind, args.port))
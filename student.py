@@ -7,6 +7,8 @@ import os
 import logging
 import random
 
+from codec import decode_message
+from delta import DeltaDecoder
 from mapa import Map
 
 from bomberman import Bomberman
@@ -18,12 +20,14 @@ logging.basicConfig(
 logger = logging.getLogger("Student")
 logger.setLevel(logging.INFO)
 
+FORMAT = os.environ.get("FORMAT", "delta")  # "binary" asks for binary frames (JSON deltas if the server can't)
+
 
 async def agent_loop(server_address="localhost:8000", agent_name="student"):
     async with websockets.connect(f"ws://{server_address}/player") as websocket:
 
         # receive information about static game properties
-        await websocket.send(json.dumps({"cmd": "join", "name": agent_name}))
+        await websocket.send(json.dumps({"cmd": "join", "name": agent_name, "delta": True, "format": FORMAT}))
         msg = await websocket.recv()
         game_properties = json.loads(msg)
 
@@ -33,24 +37,28 @@ async def agent_loop(server_address="localhost:8000", agent_name="student"):
         # init bomberman agent properties
         bomberman = Bomberman()
 
+        # states come as deltas from the previous one (or binary frames), every message must go through the decoder
+        decoder = DeltaDecoder()
+
         logger.debug("STARTING GAME")
 
         while True:
             try:
                 while websocket.messages:
-                    await websocket.recv()
+                    decoder.apply(decode_message(await websocket.recv()))
 
                 logger.debug(f"Websocket messages: {websocket.messages}")
 
-                state = json.loads(
+                state = decoder.apply(decode_message(
                     await websocket.recv()
-                )  # receive game state, this must be called timely or your game will get out of sync with the server
+                ))  # receive game state, this must be called timely or your game will get out of sync with the server
 
                 if "lives" not in state or not state["lives"]:
                     logger.debug("GAME OVER!")
+                    logger.info("Telemetry: %s", json.dumps(bomberman.telemetry.summary()))
                     return
 
-                mapa.walls = state["walls"]
+                decoder.update_map(mapa)
 
                 # update our bomberman state
                 bomberman.update_state(state, mapa)
@@ -0,0 +1,98 @@
+import bisect
+import time
+
+TIME_BOUNDS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100]  # Milliseconds
+SEARCHES_BOUNDS = [0, 1, 2, 3, 5, 10]
+NODES_BOUNDS = [0, 10, 50, 100, 250, 500, 1000, 1500, 3000]
+
+
+class Histogram:
+    """
+    Counts of values falling in fixed buckets: a value goes in the first bucket whose upper
+    bound it doesn't exceed, or in the last (unbounded) one
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def to_dict(self):
+        buckets = {f"<={bound}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets[f">{self.bounds[-1]}"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.max,
+            "buckets": buckets,
+        }
+
+
+class BranchStats:
+    def __init__(self):
+        self.time = Histogram(TIME_BOUNDS)
+        self.searches = Histogram(SEARCHES_BOUNDS)
+        self.nodes = Histogram(NODES_BOUNDS)
+        self.limit_hits = 0  # Ticks where at least one search gave up because of its limit
+
+    def to_dict(self):
+        return {
+            "time_ms": self.time.to_dict(),
+            "searches": self.searches.to_dict(),
+            "nodes": self.nodes.to_dict(),
+            "limit_hits": self.limit_hits,
+        }
+
+
+class Telemetry:
+    """
+    Per tick instrumentation of the agent's decisions: which branch of next_move decided the key,
+    how long it took, and how many searches (expanded nodes, limit hits) it ran. Everything is
+    aggregated into histograms by branch, so it can be dumped at game over.
+    The search tree must count its calls, expanded_nodes and limit_hits.
+    """
+
+    def __init__(self):
+        self.branches = {}  # BranchStats by branch name
+        self.branch = None
+        self.ticks = 0
+        self.start = None
+        self.search_counters = None
+
+    def start_tick(self, tree):
+        self.branch = None
+        self.search_counters = (tree.calls, tree.expanded_nodes, tree.limit_hits)
+        self.start = time.perf_counter()
+
+    def set_branch(self, branch):
+        """Method that records the branch deciding this tick's key (the last one set wins)."""
+        self.branch = branch
+
+    def end_tick(self, tree):
+        elapsed = time.perf_counter() - self.start
+        calls, expanded_nodes, limit_hits = self.search_counters
+
+        stats = self.branches.get(self.branch or "none")
+        if stats is None:
+            stats = self.branches[self.branch or "none"] = BranchStats()
+        stats.time.add(elapsed * 1000)
+        stats.searches.add(tree.calls - calls)
+        stats.nodes.add(tree.expanded_nodes - expanded_nodes)
+        if tree.limit_hits > limit_hits:
+            stats.limit_hits += 1
+        self.ticks += 1
+
+    def summary(self):
+        return {
+            "ticks": self.ticks,
+            "branches": {branch: stats.to_dict() for branch, stats in self.branches.items()},
+        }
@@ -0,0 +1,99 @@
+import random
+
+import numpy as np
+
+from batch_game import *
+from game import Game
+
+
+def snapshot(game):
+    return (
+        game.running,
+        game.score,
+        game._bomberman.lives,
+        tuple(game._bomberman.pos),
+        sorted(game.map.walls),
+        [(tuple(b.pos), round(2 * b.timeout), b.radius) for b in game._bombs],
+        [tuple(e.pos) for e in game._enemies],
+    )
+
+
+def batch_snapshot(batch, i):
+    return (
+        bool(batch.running[i]),
+        int(batch.score[i]),
+        int(batch.lives[i]),
+        tuple(batch.pos[i].tolist()),
+        sorted(map(tuple, np.argwhere(batch.walls[i]).tolist())),
+        [
+            (tuple(batch.bomb_pos[i, j].tolist()), int(batch.bomb_timer[i, j]), int(batch.bomb_radius[i, j]))
+            for j in range(batch.bomb_count[i])
+        ],
+        [tuple(pos) for pos in batch.enemy_pos[i][batch.enemy_alive[i]].tolist()],
+    )
+
+
+def test_same_rules_as_game():
+    random.seed(5)
+    games = []
+    for level in [1, 2, 4, 7, 10, 14, 15]:
+        game = Game(level=level, lives=50, timeout=600)
+        game.start("John Doe")
+        games.append(game)
+    lost = Game(level=1, lives=1, timeout=1)  # Times out and loses its last life on the same step
+    lost.start("Jane Doe")
+    lost._enemies[0].pos = lost._bomberman.pos
+    games.append(lost)
+    finishing = Game(level=3, lives=50, timeout=600)  # Goes on to level 4 on its first step
+    finishing.start("Jane Doe")
+    finishing.map.walls = []
+    finishing._exit = finishing._bomberman.pos = finishing.map.exit_door
+    finishing._enemies = []
+    games.append(finishing)
+    batch = BatchGame.from_games(games)
+
+    rng = random.Random(4)
+    for _ in range(600):
+        keys = [rng.choice("wasd" * 3 + "AB") for _ in games]
+        scores = batch.score.copy()
+        rewards, dones, state = batch.step(keys)
+        for i, (game, key) in enumerate(zip(games, keys)):
+            game.step(key)
+            assert snapshot(game) == batch_snapshot(batch, i)
+            assert rewards[i] == game.score - scores[i]
+            assert dones[i] == (not game.running)
+            assert batch.total_steps[i] == game.total_steps
+    assert sum(game.score for game in games) > 0  # Some enemies were blown up
+    assert finishing.map.level == 4  # Compared on its next level's map too
+
+
+def test_exit_without_walls():
+    random.seed(2)
+    game = Game(level=1, lives=3, timeout=100)
+    game.start("John Doe")
+    game.map.walls = []  # All blown up, the exit was revealed
+    game._exit = game.map.exit_door
+    game._enemies = []
+    game._bomberman.pos = game.map.exit_door
+    batch = BatchGame.from_games([game])
+    assert batch.exit_door[0].tolist() == list(game.map.exit_door) and batch.exit_visible[0]
+
+    game.step("")
+    batch.step([""])
+    assert game.map.level == batch.level[0] == 2
+
+
+def test_batch_game():
+    random.seed(1)
+    batch = BatchGame(32, level=3, timeout=50)
+    assert batch.lives.tolist() == [3] * 32
+    assert (batch.extra_bombs == 1).all() and (batch.flames == 1).all()
+    assert batch.enemy_alive.sum(axis=1).tolist() == [6] * 32
+
+    rng = np.random.default_rng(1)
+    steps = 0
+    while batch.running.any():
+        rewards, dones, state = batch.step(rng.integers(0, len(KEYS), 32))
+        steps += 1
+    assert steps == 50
+    assert (batch.total_steps <= 50).all()
@@ -0,0 +1,10 @@
+from benchmark import *
+
+
+def test_run_benchmarks():
+    report = run_benchmarks(["map_is_blocked", "search_exit"])
+
+    assert list(report["results"]) == ["map_is_blocked", "search_exit"]
+    assert report["results"]["map_is_blocked"]["calls_per_run"] == 51 * 31
+    assert report["results"]["search_exit"]["median_us"] > 0
+    assert compare(report, report) == {"map_is_blocked": 1.0, "search_exit": 1.0}
@@ -99,3 +99,18 @@ def test_bomb():
         game.explode_bomb()
 
     assert len(game._enemies) == 0
+
+def test_step():
+    game = Game(level=1, lives=1, timeout=30)
+    assert game.step("d") == {}  # not started yet
+
+    game.start("John Doe")
+    state = game.step("d")
+    assert state["step"] == 1
+    assert state["bomberman"] == (2, 1)
+
+    keys = []
+    score = game.run_until_done(lambda state: keys.append(state["step"]) or "s")
+    assert not game.running
+    assert score == game.score
+    assert keys == list(range(2, 30)) or game._bomberman.lives == 0
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import random
+
+from broadcast import *
+from delta import DeltaDecoder
+from game import Game
+
+
+class FakeWebsocket:
+    def __init__(self, blocked=False):
+        self.messages = []
+        self.unblocked = asyncio.Event()
+        if not blocked:
+            self.unblocked.set()
+        self.closed = False
+
+    async def send(self, message):
+        await self.unblocked.wait()
+        self.messages.append(message)
+
+    async def close(self):
+        self.closed = True
+
+
+def test_broadcast():
+    random.seed(1)
+    game = Game(level=1, lives=50, timeout=100)
+    game.start("John Doe")
+    rng = random.Random(1)
+
+    async def run():
+        broadcaster = Broadcaster(queue_size=4, max_overflows=2)
+        fast, slow, stuck = FakeWebsocket(), FakeWebsocket(blocked=True), FakeWebsocket(blocked=True)
+        broadcaster.subscribe(fast, "json")
+        broadcaster.subscribe(slow, "delta")
+        broadcaster.subscribe(stuck, "binary")
+        broadcaster.send_message("info")
+
+        states = []
+        for tick in range(30):
+            state = game.step(rng.choice("wasdB"))
+            states.append(json.loads(game.state))
+            frame = broadcaster.publish(state, ["json"])
+            assert frame.messages["json"] == game.state
+            if tick % 6 == 0:  # The slow viewer catches up every now and then
+                slow.unblocked.set()
+                await asyncio.sleep(0)
+                await asyncio.sleep(0)
+                slow.unblocked.clear()
+            await asyncio.sleep(0)
+        slow.unblocked.set()
+        await asyncio.sleep(0)
+        return broadcaster, fast, slow, stuck, states
+
+    broadcaster, fast, slow, stuck, states = asyncio.run(run())
+
+    assert fast.messages == ["info"] + [json.dumps(state) for state in states]
+
+    decoder = DeltaDecoder()
+    keyframes = 0
+    for message in slow.messages[1:]:
+        keyframes += json.loads(message)["keyframe"]
+        state = decoder.apply(json.loads(message))
+    assert slow.messages[0] == "info" and state == states[-1]
+    assert keyframes > 1 and len(slow.messages) < len(fast.messages)  # Resynced after drops
+    assert slow in broadcaster.subscribers
+
+    assert stuck.closed and stuck not in broadcaster.subscribers
+    assert broadcaster.stats()["disconnected"] == 1
+    assert broadcaster.stats()["dropped_frames"] > 0
@@ -0,0 +1,27 @@
+import json
+import random
+
+from codec import *
+from game import Game
+
+
+def test_binary_round_trip():
+    random.seed(4)
+    rng = random.Random(4)
+    for level in [1, 7, 15]:
+        game = Game(level=level, lives=50, timeout=200)
+        game.start("Zé Doe")
+        encoder = BinaryEncoder()
+        while game.running:
+            state = game.step(rng.choice("wasdB"))
+            frame = encoder.encode(state)
+
+            expected = json.loads(game.state)
+            for enemy in expected["enemies"]:
+                enemy["id"] = str(encoder.enemy_ids[enemy["id"]])
+            assert decode_message(frame) == dict(expected, keyframe=True)
+            assert len(frame) < len(game.state) / 3
+
+
+def test_decode_json():
+    assert decode_message(json.dumps({"score": 100})) == {"score": 100}
@@ -0,0 +1,60 @@
+import json
+import random
+
+from delta import *
+from game import Game
+from mapa import Map
+
+
+def test_delta_stream():
+    random.seed(2)
+    game = Game(level=1, lives=50, timeout=400)
+    game.start("John Doe")
+    info = game.info()
+    mapa = Map(size=info["size"], mapa=info["map"])
+
+    encoder = DeltaEncoder(keyframe_interval=50)
+    decoder = DeltaDecoder()
+    full_size = delta_size = keyframes = 0
+    rng = random.Random(3)
+    while game.running:
+        state = game.step(rng.choice("wasdB"))
+        message = json.dumps(encoder.encode(state))
+        keyframes += json.loads(message)["keyframe"]
+
+        decoded = decoder.apply(json.loads(message))
+        assert decoded == json.loads(game.state)
+
+        if rng.random() < 0.5:  # Maps only get updated every other frame or so
+            decoder.update_map(mapa)
+            assert sorted(mapa.walls) == sorted(game.map.walls)
+            assert (mapa.wall_mask == game.map.wall_mask).all()
+
+        full_size += len(game.state)
+        delta_size += len(message)
+
+    assert keyframes == 8
+    assert delta_size < full_size / 5
+
+
+def test_not_a_state():
+    decoder = DeltaDecoder()
+    assert decoder.apply({"score": 100}) == {"score": 100}
+
+
+def test_plain_states():
+    random.seed(2)
+    game = Game(level=1, lives=50, timeout=200)
+    game.start("John Doe")
+    info = game.info()
+    mapa = Map(size=info["size"], mapa=info["map"])
+
+    walls = len(mapa.walls)
+    decoder = DeltaDecoder()
+    rng = random.Random(4)
+    while game.running:
+        game.step(rng.choice("wasdB"))
+        assert decoder.apply(json.loads(game.state)) == json.loads(game.state)  # No delta support
+        decoder.update_map(mapa)
+        assert sorted(mapa.walls) == sorted(game.map.walls)
+    assert len(mapa.walls) < walls  # Some walls were blown up
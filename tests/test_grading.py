@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("flask_marshmallow")
+
+
+@pytest.fixture(scope="module")
+def grading(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        database = tmp_path_factory.mktemp("grading") / "grades.sqlite"
+        monkeypatch.setenv("GRADING_DATABASE", f"sqlite:///{database}")
+        from prof import grading
+
+    with grading.app.app_context():
+        grading.db.create_all()
+    return grading
+
+
+def leaderboard(client):
+    return [(game["player"], game["score"]) for game in client.get("/highscores").get_json()]
+
+
+def test_games(grading):
+    client = grading.app.test_client()
+    response = client.post("/game", json={"player": "John Doe", "level": 2, "score": 100, "total_steps": 500})
+    assert response.status_code == 200  # Inserted right away, like it always was
+    assert response.get_json()["id"] and response.get_json()["score"] == 100
+    assert client.post("/game", json={"player": "John Doe", "score": 100}).status_code == 400
+    assert leaderboard(client) == [("John Doe", 100)]
+
+    records = [
+        {"player": "Jane Doe", "level": 3, "score": 300},
+        {"player": "John Doe", "level": 1, "score": 50},
+        {"player": "John Doe", "level": 4, "score": 400},
+    ]
+    response = client.post("/games", json=records)
+    assert response.status_code == 202
+    assert [game["score"] for game in response.get_json()] == [300, 50, 400]
+    assert client.post("/games", json=records + [{"player": "Jane Doe"}]).status_code == 400
+    grading.write_queue.join()
+    assert leaderboard(client) == [("John Doe", 400), ("Jane Doe", 300)]  # Not the cached page
+
+    with grading.app.app_context():
+        assert grading.db.session.execute("PRAGMA journal_mode").scalar() == "wal"
+
+
+def test_failed_batch(grading):
+    records = [
+        {"player": "Batch 1", "level": 1, "score": 10, "total_steps": 1},
+        {"player": {"not": "a name"}, "level": 1, "score": 20, "total_steps": 1},
+        {"player": "Batch 2", "level": 1, "score": 30, "total_steps": 1},
+    ]
+    with grading.app.app_context():
+        assert grading.save_games(records) == 2
+        players = {game.player for game in grading.Game.query.filter(grading.Game.player.like("Batch%"))}
+    assert players == {"Batch 1", "Batch 2"}
+
+
+def test_stale_page(grading, monkeypatch):
+    client = grading.app.test_client()
+    paginate = grading.Best.query_class.paginate
+
+    def write_while_reading(*args):
+        page = paginate(*args)  # Read before the game below is committed
+        grading.insert_games([{"player": "Late Doe", "level": 1, "score": 10**6, "total_steps": 1}])
+        return page
+
+    monkeypatch.setattr(grading.Best.query_class, "paginate", write_while_reading)
+    assert ("Late Doe", 10**6) not in leaderboard(client)
+    monkeypatch.undo()
+    assert leaderboard(client)[0] == ("Late Doe", 10**6)
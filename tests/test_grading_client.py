@@ -0,0 +1,91 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from grading_client import *
+
+
+class GradingServer(ThreadingHTTPServer):
+    """Stand-in for the grading server, failing its first requests."""
+
+    def __init__(self, failures=0):
+        super().__init__(("127.0.0.1", 0), GradingHandler)
+        self.failures = failures
+        self.records = []
+        self.requests = 0
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/game"
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class GradingHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.server.requests += 1
+        records = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/game":
+            records = [records]
+        if self.server.failures > 0:
+            self.server.failures -= 1
+            self.send_response(503)
+        elif not all("player" in record for record in records):
+            self.send_response(400)
+        else:
+            self.server.records += records
+            self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def run_client(client, until):
+    async def run():
+        task = asyncio.ensure_future(client.run())
+        while not until():
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(run(), 10))
+
+
+def test_retry_and_batches(tmp_path):
+    server = GradingServer(failures=2)
+    spool = tmp_path / "spool.jsonl"
+    client = GradingClient(server.url, str(spool), batch_size=3, flush_delay=0.01, min_backoff=0.05)
+    records = [{"player": f"player{i}", "score": i} for i in range(7)] + [{"score": 0}]
+    for record in records:
+        client.submit(record)
+    assert [json.loads(line) for line in spool.read_text().splitlines()] == records
+
+    run_client(client, lambda: not client.pending)
+    assert server.records == records[:-1]
+    assert (client.sent, client.dropped) == (7, 1)
+    assert spool.read_text() == ""
+    server.shutdown()
+
+
+def test_replay_spool(tmp_path):
+    server = GradingServer()
+    spool = tmp_path / "spool.jsonl"
+    records = [{"player": "John Doe", "score": 100}, {"player": "Jane Doe", "score": 200}]
+    spool.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+    client = GradingClient(server.url, str(spool), flush_delay=0.01)
+    run_client(client, lambda: len(server.records) == 2)
+    assert server.records == records
+    server.shutdown()
+
+
+def test_bulk(tmp_path):
+    server = GradingServer()
+    client = GradingClient(
+        server.url, str(tmp_path / "spool.jsonl"), batch_size=5, flush_delay=0.01, bulk_url=server.url + "s"
+    )
+    records = [{"player": f"player{i}", "score": i} for i in range(10)]
+    for record in records[:5] + [{"score": 0}] + records[5:]:
+        client.submit(record)
+
+    run_client(client, lambda: not client.pending)
+    assert server.records == records
+    assert server.requests == 1 + (1 + 5) + 1  # The batch with a bad record goes one by one
+    server.shutdown()
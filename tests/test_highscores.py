@@ -0,0 +1,42 @@
+import asyncio
+import json
+
+from highscores import *
+
+
+def test_leaderboard():
+    leaderboard = Leaderboard(size=3)
+    for i, score in enumerate([10, 50, 30, 50, 20, 40]):
+        leaderboard.add({"player": f"player{i}", "score": score, "mode": i % 2})
+    assert leaderboard.top() == [["player1", 50], ["player3", 50], ["player5", 40]]
+    assert leaderboard.top(0) == [["player2", 30], ["player4", 20], ["player0", 10]]
+    assert [record["player"] for record in leaderboard.records()] == [
+        "player0", "player1", "player2", "player3", "player4", "player5"
+    ]
+
+
+def test_log_and_compaction(tmp_path):
+    snapshot, log = str(tmp_path / "highscores.json"), str(tmp_path / "highscores.log")
+    with open(snapshot, "w") as f:
+        json.dump([["John Doe", 950]], f)
+
+    async def run():
+        highscores = Highscores(snapshot, log, size=2, compact_interval=0.05)
+        assert highscores.top() == [["John Doe", 950]]  # From the old snapshot
+        task = asyncio.ensure_future(highscores.run())
+        for score in range(100, 1100, 100):
+            highscores.add("Jane Doe", score, mode=score % 300)
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        task.cancel()
+        return highscores
+
+    highscores = asyncio.run(run())
+    assert highscores.top() == [["Jane Doe", 1000], ["John Doe", 950]]
+    with open(snapshot) as f:
+        assert json.load(f) == highscores.top()
+    with open(log) as f:
+        assert len(f.readlines()) == 7  # Overall top, and each mode's
+
+    restarted = Highscores(snapshot, log, size=2)
+    assert all(restarted.top(mode) == highscores.top(mode) for mode in (None, 0, 100, 200))
@@ -0,0 +1,56 @@
+
+import numpy as np
+
+from game import Game
+from map_pack import *
+from mapa import Tiles, level_map
+
+
+def test_generate():
+    size = (51, 31)
+    tiles, spawns, exit_door, powerup = generate(1, size, 6, map_rng(1, 1))
+    x, y = np.indices(size)
+    assert (tiles[(x % 2 == 0) & (y % 2 == 0)] == Tiles.STONE).all()
+    assert (tiles[:3, :3] != Tiles.WALL).all()  # bomberman's vital space
+    assert len(spawns) == 6
+    for sx, sy in spawns:
+        assert (tiles[sx - 1 : sx + 2, sy - 1 : sy + 2] != Tiles.WALL).all()
+    assert tiles[exit_door] == tiles[powerup] == Tiles.WALL and exit_door != powerup
+
+    # walls on 5 in 101 of the free tiles out of the vital space on level 1 (randint(0, 100) > 95)
+    walls = [(generate(1, size, 0, map_rng(seed, 1))[0] == Tiles.WALL).sum() for seed in range(20)]
+    free = ((x >= 3) & (y >= 3) & (tiles != Tiles.STONE)).sum()
+    assert abs(np.mean(walls) / free - 5 / 101) < 0.01
+
+
+def test_pack(tmp_path):
+    path = str(tmp_path / "maps.pack")
+    assert write_pack(path, [1, 2], [1, 2, 3]) == 6
+    pack = MapPack(path)
+    assert len(pack) == 6 and pack.get(3, 1, MAP_SIZE) is None
+
+    for seed, level in [(1, 1), (2, 3)]:
+        loaded = pack.get(seed, level, MAP_SIZE)
+        generated = level_map(seed, level, MAP_SIZE, len(LEVEL_ENEMIES[level]))
+        assert loaded.map == generated.map and loaded.walls == generated.walls
+        assert (loaded.tiles == generated.tiles).all()
+        assert loaded.enemies_spawn == generated.enemies_spawn
+        assert (loaded.exit_door, loaded.powerup) == (generated.exit_door, generated.powerup)
+
+    # Loaded without copying the tiles, which are only copied when a wall is removed
+    loaded, again = pack.get(1, 1, MAP_SIZE), pack.get(1, 1, MAP_SIZE)
+    assert np.shares_memory(loaded.tiles, pack.records) and np.shares_memory(again.tiles, pack.records)
+    wall = loaded.walls[0]
+    loaded.remove_wall(wall)
+    assert not np.shares_memory(loaded.tiles, pack.records)
+    assert wall in again.walls and again.tiles[wall] == pack.get(1, 1, MAP_SIZE).tiles[wall]
+
+    games = [Game(level=2, seed=2, maps=pack), Game(level=2, seed=2)]
+    for game in games:
+        game.start("player")
+        for key in "ddssAddss" * 10:
+            game.step(key)
+    assert games[0].state == games[1].state
+    restored = Game()
+    restored.restore(games[0].snapshot())
+    assert restored._maps.path == path
@@ -0,0 +1,77 @@
+import random
+
+from mapa import *
+from tests.test_bomb import mapa13x13
+
+
+def test_stone_distances():
+    random.seed(1)
+    mapa = Map(level=1, enemies=0, size=(51, 31))
+
+    assert mapa.distance((1, 1), (1, 1)) == 0
+    assert mapa.distance((1, 1), (5, 1)) == 4
+    # same even column: need to walk around the pillars
+    assert mapa.distance((2, 1), (2, 3)) == 4
+    assert mapa.distance((1, 2), (3, 2)) == 4
+    assert mapa.distance((1, 1), (49, 29)) == 48 + 28
+    # walls don't count
+    assert (3, 3) in mapa.walls or mapa.distance((1, 1), (3, 3)) == 4
+    assert mapa.distance((1, 1), (3, 3)) == 4
+    # stones and tiles out of the map can't be reached
+    assert mapa.distance((1, 1), (2, 2)) is None
+    assert mapa.distance((1, 1), (60, 1)) is None
+    # symmetric, whatever field was cached first
+    assert mapa.distance((3, 1), (2, 5)) == mapa.distance((2, 5), (3, 1)) == 5
+
+
+def test_stone_distances_loaded_map():
+    mapa = Map(size=(13, 13), mapa=mapa13x13)
+
+    # no pillars in this map
+    assert mapa.distance((1, 1), (11, 11)) == 20
+    assert mapa.distance([2, 1], [2, 3]) == 2
+
+
+def test_stone_distances_bounded():
+    random.seed(1)
+    mapa = Map(level=1, enemies=0, size=(51, 31))
+
+    sources = [(x, y) for x in range(1, 50, 2) for y in range(1, 30, 2)]
+    for source in sources:
+        mapa.stone_distances(source)
+    assert len(sources) > STONE_DISTANCES_CACHE
+    assert len(mapa._stone_distances) == STONE_DISTANCES_CACHE
+    assert mapa.distance((1, 1), (49, 29)) == 48 + 28  # Dropped, computed again
+
+
+def test_masks_follow_walls():
+    random.seed(1)
+    mapa = Map(level=1, enemies=0, size=(51, 31))
+
+    assert mapa.tiles.shape == mapa.wall_mask.shape == (51, 31)
+    assert mapa.wall_mask.sum() == len(mapa.walls)
+    assert not (mapa.passable_mask & (mapa.stone_mask | mapa.wall_mask)).any()
+
+    wall = mapa.walls[0]
+    assert mapa.is_blocked(wall) and not mapa.is_blocked(wall, wallpass=True)
+    mapa.remove_wall(wall)
+    assert not mapa.is_blocked(wall)
+    assert mapa.tiles[wall] == Tiles.PASSAGE
+    assert wall not in mapa.walls and mapa.map[wall[0]][wall[1]] == Tiles.PASSAGE  # Derived from the planes
+
+    mapa.walls = [[1, 2]]
+    assert mapa.wall_mask.sum() == 1 and mapa.tiles[1, 2] == Tiles.WALL
+    assert mapa.is_blocked((1, 2)) and not mapa.is_blocked(wall)
+    assert mapa.is_stone((0, 0)) and mapa.is_stone((-1, 5)) and mapa.is_blocked((51, 1))
+
+
+def test_blast_footprint():
+    random.seed(1)
+    mapa = Map(level=1, enemies=0, size=(51, 31))
+
+    # stops at the border and at the pillars
+    assert mapa.blast_footprint((1, 1), 3) == {(1, 1), (2, 1), (3, 1), (4, 1), (1, 2), (1, 3), (1, 4)}
+    # cached by position and radius, whatever the position type
+    footprint = mapa.blast_footprint((3, 1), 2)
+    assert footprint == {(1, 1), (2, 1), (3, 1), (4, 1), (5, 1), (3, 2), (3, 3)}
+    assert mapa.blast_footprint([3, 1], 2) is footprint
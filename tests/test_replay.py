@@ -0,0 +1,58 @@
+import random
+
+from replay import *
+
+
+def record_game(path, keys, keyframe_interval):
+    header = {"seed": 7, "level": 1, "lives": 100, "timeout": 200, "player": "player", "size": [51, 31]}
+    game = new_game(header)
+    recorder = ReplayRecorder(path, keyframe_interval=keyframe_interval, **header)
+    states = [game.state]
+    for key in keys:
+        game.step(key)
+        states.append(game.state)
+        recorder.record(key, game)
+        if not game.running:
+            break
+    recorder.close()
+    return game, states  # As JSON
+
+
+def test_seek(tmp_path):
+    path = str(tmp_path / "game.replay")
+    keys = random.Random(1).choices(["", "w", "a", "s", "d", "A", "B", "x"], k=199)
+    game, states = record_game(path, keys, keyframe_interval=50)
+
+    replay = Replay.load(path)
+    assert replay.ticks == len(states) - 1
+    assert sorted(replay.keyframes) == [50, 100, 150]
+    engine = ReplayEngine(replay)
+    for tick in (0, 1, 49, 50, 51, 120, replay.ticks):
+        assert engine.seek(tick).state == states[tick]
+    assert engine.run().score == game.score
+
+
+def test_truncated(tmp_path):
+    path = tmp_path / "game.replay"
+    _, states = record_game(str(path), ["d"] * 120, keyframe_interval=50)
+    path.write_bytes(path.read_bytes()[:-10])  # The server stopped while writing the last keys
+
+    replay = Replay.load(str(path))
+    assert replay.ticks == 100
+    assert ReplayEngine(replay).seek(100).state == states[100]
+
+
+def test_interleaved_games():
+    header = {"seed": 3, "level": 1, "lives": 100, "timeout": 100, "player": "player", "size": [51, 31]}
+    alone = new_game(header)
+    levels = []
+    for level in range(2, 6):
+        alone.next_level(level)
+        levels.append(alone.state)
+
+    games = [new_game(header), new_game(dict(header, seed=4))]  # Side by side, like the server's sessions
+    for level, state in zip(range(2, 6), levels):
+        for game in games:
+            random.random()  # Nor does anyone else using the random module
+            game.next_level(level)
+        assert games[0].state == state
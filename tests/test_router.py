@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from router import *
+
+
+def test_routing():
+    router = Router([8001, 8002])
+    assert router.pick_worker("/player") is None  # None is ready
+    for worker in router.workers:
+        router.handle_event({"event": "ready", "worker": worker.index})
+    router.handle_event({"event": "players", "worker": 0, "players": 2})
+    assert router.pick_worker("/player") is router.workers[1]
+
+    router.handle_event({"event": "start", "worker": 1, "session": 2, "player": "John Doe"})
+    router.handle_event({"event": "start", "worker": 0, "session": 3, "player": "Jane Doe"})
+    assert router.sessions() == [
+        {"session": 3, "player": "Jane Doe", "worker": 0},
+        {"session": 2, "player": "John Doe", "worker": 1},
+    ]
+    assert router.pick_worker("/viewer", 2) is router.workers[1]
+    assert router.pick_worker("/viewer") is router.workers[0]  # The newest
+
+    ticks = {"ticks": 100, "late": 2, "skipped": 1, "max_lateness_ms": 150.0}
+    router.handle_event({"event": "end", "worker": 1, "session": 2, "ticks": ticks})
+    router.handle_event({"event": "end", "worker": 0, "session": 3, "ticks": dict(ticks, max_lateness_ms=20.0)})
+    metrics = router.metrics()
+    assert metrics["workers"][1]["games"] == 1 and metrics["workers"][1]["sessions"] == 0
+    assert metrics["total"] == {
+        "games": 2, "players": 2, "sessions": 0, "restarts": 0,
+        "ticks": 200, "late": 4, "skipped": 2, "max_lateness_ms": 150.0,
+    }
+
+    router.handle_event({"event": "exit", "worker": 0})  # Died
+    assert not router.workers[0].ready and router.workers[0].players == 0
+    assert router.pick_worker("/player") is router.pick_worker("/viewer") is router.workers[1]
+
+
+def test_redirects():
+    async def worker(websocket):
+        await websocket.send(json.dumps({"worker": websocket.local_address[1], "path": websocket.request.path}))
+
+    async def run():
+        workers = [await websockets.serve(worker, "127.0.0.1", 0) for _ in range(2)]
+        ports = [server.sockets[0].getsockname()[1] for server in workers]
+        router = Router(ports)
+        for index in range(2):
+            router.handle_event({"event": "ready", "worker": index})
+        router.handle_event({"event": "start", "worker": 1, "session": 7})
+
+        replies = []
+        async with websockets.serve(router.handler, "127.0.0.1", 0, process_request=router.process_request) as server:
+            url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            for path in ["/player", "/player", "/viewer?session=7"]:
+                async with websockets.connect(url + path) as websocket:
+                    replies.append(json.loads(await websocket.recv()))
+            async with websockets.connect(url + "/") as websocket:
+                await websocket.send(json.dumps({"cmd": "metrics"}))
+                metrics = json.loads(await websocket.recv())
+        for server in workers:
+            server.close()
+        return ports, replies, metrics
+
+    ports, replies, metrics = asyncio.run(asyncio.wait_for(run(), 10))
+    # Each player goes where fewer players were sent, the viewer where its session is
+    assert replies == [
+        {"worker": ports[0], "path": "/player"},
+        {"worker": ports[1], "path": "/player"},
+        {"worker": ports[1], "path": "/viewer?session=7"},
+    ]
+    assert metrics["total"]["sessions"] == 1
@@ -0,0 +1,46 @@
+import asyncio
+
+from scheduler import TickScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_no_drift():
+    clock = FakeClock()
+    scheduler = TickScheduler(10, clock=clock, sleep=clock.sleep)
+
+    async def run():
+        for _ in range(100):
+            await scheduler.wait()
+            clock.now += 0.03  # Frame work and sends
+
+    asyncio.run(run())
+    assert abs(clock.now - (10.0 + 0.03)) < 1e-6
+    assert scheduler.stats() == {"ticks": 100, "late": 0, "skipped": 0, "max_lateness_ms": 0}
+
+
+def test_late_and_skipped_ticks():
+    clock = FakeClock()
+    scheduler = TickScheduler(10, clock=clock, sleep=clock.sleep)
+
+    async def run():
+        await scheduler.wait()  # t = 0.1
+        clock.now += 0.15  # Slow frame: late for the tick at 0.2
+        await scheduler.wait()
+        clock.now += 0.33  # Way too slow: runs the tick at 0.5 late, skipping 0.3 and 0.4
+        await scheduler.wait()
+        await scheduler.wait()
+
+    asyncio.run(run())
+    assert scheduler.late == 2
+    assert scheduler.skipped == 2
+    assert abs(clock.now - 0.6) < 1e-6  # Back on the original grid
@@ -0,0 +1,53 @@
+import asyncio
+import json
+import os
+
+from scheduler import TickScheduler
+from server import *
+
+
+class FakeWebsocket:
+    def __init__(self):
+        self.messages = []
+        self.state = State.OPEN
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    async def close(self):
+        self.state = State.CLOSED
+
+
+def test_concurrent_sessions(tmp_path):
+    highscores = Highscores(str(tmp_path / "highscores.json"), str(tmp_path / "highscores.log"))
+    replays = str(tmp_path / "replays")
+    server = Game_server(
+        level=1, lives=3, timeout=30, grading=None, max_sessions=2, highscores=highscores, replays=replays,
+    )
+
+    async def run():
+        sessions = [
+            Session(id, Player(f"player{id}", FakeWebsocket()), "json", 1, 3, 30, seed=id, replays=replays)
+            for id in (1, 2)
+        ]
+        for session in sessions:
+            session.scheduler = TickScheduler(1000)
+            await server.slots.acquire()
+        await asyncio.gather(*[server.run_session(session) for session in sessions])
+        return sessions
+
+    sessions = asyncio.run(run())
+    assert not server.sessions and not server.player_sessions
+
+    maps = []
+    for session in sessions:
+        messages = [json.loads(message) for message in session.player.ws.messages]
+        assert messages[0]["session"] == session.id
+        assert [message["step"] for message in messages[1:-1]] == list(range(1, 31))
+        assert messages[-1] == {"score": session.game.score}
+        assert session.player.ws.state is State.CLOSED
+        assert session.record()["seed"] == session.id
+        maps.append(messages[1]["walls"])
+    assert maps[0] != maps[1]
+    assert sorted(server.highscores.top(1)) == sorted([f"player{session.id}", session.game.score] for session in sessions)
+    assert len(os.listdir(replays)) == 2  # One per session
@@ -0,0 +1,45 @@
+import json
+import random
+
+from bomberman import Bomberman
+from game import Game
+from mapa import Map
+from telemetry import *
+
+
+def test_histogram():
+    histogram = Histogram([1, 10])
+    for value in [0, 1, 5, 10, 11, 100]:
+        histogram.add(value)
+
+    assert histogram.to_dict() == {
+        "count": 6,
+        "mean": 127 / 6,
+        "max": 100,
+        "buckets": {"<=1": 2, "<=10": 2, ">10": 2},
+    }
+
+
+def test_agent_telemetry():
+    random.seed(1)
+    game = Game(level=2, timeout=300)
+    game.start("John Doe")
+    info = game.info()
+    mapa = Map(size=info["size"], mapa=info["map"])
+    agent = Bomberman()
+
+    def policy(_):
+        state = json.loads(game.state)
+        mapa.walls = state["walls"]
+        agent.update_state(state, mapa)
+        return agent.next_move() or ""
+
+    game.run_until_done(policy)
+    summary = agent.telemetry.summary()
+
+    assert summary["ticks"] == game.total_steps - 1
+    assert "run_from_bomb" in summary["branches"]
+    assert sum(b["time_ms"]["count"] for b in summary["branches"].values()) == summary["ticks"]
+    searches = sum(b["searches"]["mean"] * b["searches"]["count"] for b in summary["branches"].values())
+    assert round(searches) == agent.tree.calls > 0
+    json.dumps(summary)
@@ -0,0 +1,30 @@
+import io
+import json
+
+from tournament import *
+
+
+def test_parse_numbers():
+    assert parse_numbers("1-3,7") == [1, 2, 3, 7]
+    assert parse_numbers("5") == [5]
+
+
+def test_tournament():
+    first, second = play(3, timeout=100), play(3, timeout=100)
+    assert first.pop("time") >= 0 and second.pop("time") >= 0
+    assert first == second  # Seeded games are reproducible
+
+    output = io.StringIO()
+    report = run_tournament([1, 2], [1, 2], timeout=100, workers=2, output=output)
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sorted((r["seed"], r["start_level"]) for r in results) == [(1, 1), (1, 2), (2, 1), (2, 2)]
+    assert report["games"] == 4
+    assert report["by_start_level"][2]["games"] == 2
+    assert report["mean_score"] == sum(r["score"] for r in results) / 4
+
+    result = next(r for r in results if (r["seed"], r["start_level"]) == (2, 1))
+    result.pop("time")
+    in_process = play(2, timeout=100)
+    in_process.pop("time")
+    assert result == in_process  # Same game in a worker process
@@ -0,0 +1,233 @@
+import random
+from collections import deque
+
+import pytest
+from mapa import *
+from tree_search_star import *
+
+
+def bfs_length(mapa, start, goals):
+    """Reference shortest path length (in positions) over non blocked tiles."""
+    visited = {start: 1}
+    queue = deque([start])
+    while queue:
+        pos = queue.popleft()
+        if pos in goals:
+            return visited[pos]
+        for direction in "wasd":
+            next_pos = mapa.calc_pos(pos, direction)
+            if next_pos not in visited:
+                visited[next_pos] = visited[pos] + 1
+                queue.append(next_pos)
+    return None
+
+
+@pytest.fixture
+def mapa():
+    random.seed(1)
+    return Map(level=1, enemies=0, size=(51, 31))
+
+
+def test_search_kill(mapa):
+    tree = SearchTree()
+    tree.limit = 5000
+
+    free = [(x, y) for x in range(51) for y in range(31) if not mapa.is_blocked((x, y))]
+    random.seed(2)
+    for target in random.sample(free, 40):
+        path = tree.search_for_path(mapa, (1, 1), target, [], objective="KILL")
+        expected = bfs_length(mapa, (1, 1), {target})
+        if expected is None:
+            assert path is None
+        else:
+            assert len(path) == expected
+            assert path[0] == (1, 1) and path[-1] == target
+            for a, b in zip(path, path[1:]):
+                assert abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1
+                assert not mapa.is_blocked(b)
+
+
+def test_search_find_wall(mapa):
+    tree = SearchTree()
+    tree.limit = 5000
+
+    for wall in mapa.walls[:40]:
+        goals = {(wall[0] - 1, wall[1]), (wall[0] + 1, wall[1]), (wall[0], wall[1] - 1), (wall[0], wall[1] + 1)}
+        path = tree.search_for_path(mapa, (1, 1), wall, [], objective="FIND_WALL")
+        expected = bfs_length(mapa, (1, 1), goals)
+        if expected is None:
+            assert path is None
+        else:
+            assert len(path) == expected
+            assert path[-1] in goals
+
+
+def test_search_exit_through_wall(mapa):
+    tree = SearchTree()
+    tree.limit = 5000
+
+    mapa.walls = [(3, 1)]
+    path = tree.search_for_path(mapa, (1, 1), (3, 1), [], objective="EXIT")
+    assert path == [(1, 1), (2, 1), (3, 1)]
+
+    assert tree.search_for_path(mapa, (1, 1), (3, 1), [], objective="KILL") is None
+
+
+def test_search_limit(mapa):
+    tree = SearchTree()
+    tree.limit = 10
+    mapa.walls = []
+
+    assert tree.search_for_path(mapa, (1, 1), (49, 29), [], objective="KILL") is None
+
+
+def test_search_uses_fewer_nodes_with_stone_distances(mapa):
+    tree = SearchTree()
+    tree.limit = 5000
+    mapa.walls = []
+
+    path = tree.search_for_path(mapa, (1, 1), (49, 29), [], objective="KILL")
+    assert len(path) == 49 + 29 - 1
+    # with an exact heuristic only tiles on shortest paths get expanded
+    assert len(tree.closed_nodes) < 2 * len(path)
+
+
+def test_incremental_search_matches_search_tree(mapa):
+    tree = SearchTree()
+    tree.limit = 5000
+    incremental_tree = IncrementalSearchTree()
+    incremental_tree.limit = 5000
+
+    random.seed(3)
+    target = (49, 29)
+    pos = (1, 1)
+    for objective in ["FIND_WALL", "KILL"]:
+        for _ in range(30):
+            path = tree.search_for_path(mapa, pos, target, [], objective=objective)
+            incremental_path = incremental_tree.search_for_path(mapa, pos, target, [], objective=objective)
+            if path is None:
+                assert incremental_path is None
+            else:
+                assert len(incremental_path) == len(path)
+                assert incremental_path[0] == pos
+                for a, b in zip(incremental_path, incremental_path[1:]):
+                    assert abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1
+                    assert not mapa.is_blocked(b) or b == target
+                pos = path[min(2, len(path) - 1)]
+
+            for wall in random.sample(mapa.walls, min(3, len(mapa.walls))):  # blow up some walls
+                mapa.remove_wall(wall)
+
+
+def test_incremental_search_repairs_locally(mapa):
+    incremental_tree = IncrementalSearchTree()
+    incremental_tree.limit = 5000
+    mapa.walls = []
+
+    incremental_tree.search_for_path(mapa, (1, 1), (49, 29), [], objective="KILL")
+    search = incremental_tree.searches[((49, 29), "KILL")]
+    first_expansions = search.expanded_nodes
+
+    path = incremental_tree.search_for_path(mapa, (2, 1), (49, 29), [], objective="KILL")
+    assert len(path) == 48 + 28
+    assert search.expanded_nodes - first_expansions < first_expansions / 4
+
+
+def test_incremental_search_avoids_enemies(mapa):
+    incremental_tree = IncrementalSearchTree(avoid_enemies=True)
+    mapa.walls = []
+
+    enemies = [{"pos": [3, 1]}]
+    path = incremental_tree.search_for_path(mapa, (1, 1), (5, 1), enemies, objective="KILL")
+    assert (3, 1) not in path and len(path) == 9
+
+    enemies = [{"pos": [3, 3]}]
+    path = incremental_tree.search_for_path(mapa, (1, 1), (5, 1), enemies, objective="KILL")
+    assert len(path) == 5
+
+    incremental_tree = IncrementalSearchTree(avoid_enemies=("KILL", "EXIT"))  # Like the agent's
+    enemies = [{"pos": [3, 1]}]
+    path = incremental_tree.search_for_path(mapa, (1, 1), (5, 1), enemies, objective="KILL")
+    assert (3, 1) not in path and len(path) == 9
+    path = incremental_tree.search_for_path(mapa, (1, 1), (5, 1), enemies, objective="FIND_WALL")
+    assert (3, 1) in path
+
+
+def test_distance_field(mapa):
+    mapa.walls = [(3, 1), (1, 5)]
+    field = DistanceField(mapa, (1, 1))
+
+    assert field.get_distance((1, 1)) == 0
+    assert field.get_direction((1, 1)) == ""
+    assert field.get_distance((2, 1)) == 1
+    assert field.get_direction([2, 1]) == "d"
+    assert field.get_distance((3, 1)) is None  # a wall
+    assert field.get_distance((4, 1)) == 9  # around the walls
+    assert field.get_distance((1, 3)) == 2
+    assert field.get_direction((1, 3)) == "s"
+
+    assert field.get_distance_to_adjacent((3, 1)) == 1
+    assert field.get_path((3, 1), adjacent=True) == [(1, 1), (2, 1)]
+    assert field.find_nearest([(1, 5), (3, 1)], adjacent=True) == (3, 1)
+    assert field.find_nearest([(2, 2), (60, 1)]) is None
+
+    field = DistanceField(mapa, (1, 1), wallpass=True)
+    assert field.get_distance((4, 1)) == 3
+    assert field.get_path((4, 1)) == [(1, 1), (2, 1), (3, 1), (4, 1)]
+
+
+def test_distance_field_matches_search_tree(mapa):
+    tree = SearchTree()
+    tree.limit = 5000
+    field = DistanceField(mapa, (1, 1))
+
+    for wall in mapa.walls[:20]:
+        path = tree.search_for_path(mapa, (1, 1), wall, [], objective="FIND_WALL")
+        if path is None:
+            assert field.get_distance_to_adjacent(wall) is None
+        else:
+            assert field.get_distance_to_adjacent(wall) == len(path) - 1
+
+
+def test_danger_map(mapa):
+    mapa.walls = []
+    danger = DangerMap(mapa, [[[5, 1], 4, 3]])
+
+    # 2 * 4 frames until it blows up, so 7 more moves
+    assert danger.blast_times[(5, 1)] == [7]
+    assert danger.blast_times[(8, 1)] == [7]
+    assert danger.blast_times[(5, 4)] == [7]
+    assert (9, 1) not in danger.blast_times
+    assert (6, 2) not in danger.blast_times  # diagonal
+    assert (4, 2) not in danger.blast_times  # blast stops at stones
+    assert not danger.is_safe((5, 1)) and danger.is_safe((5, 1), 8)
+    assert danger.is_dangerous((6, 1), 6) and not danger.is_dangerous((6, 1), 5)
+
+
+def test_search_for_escape(mapa):
+    mapa.walls = []
+    danger = DangerMap(mapa, [[[5, 1], 4, 3]])
+
+    path = danger.search_for_escape((5, 1))
+    assert len(path) == 4 and path[-1] in [(3, 2), (7, 2)]
+
+    # Blocked on the left and below, run right
+    mapa.walls = [(4, 1), (5, 2)]
+    assert danger.search_for_escape((5, 1)) == [(5, 1), (6, 1), (7, 1), (7, 2)]
+    # An enemy close to (7, 2), keep running
+    path = danger.search_for_escape((5, 1), enemies=[(7, 3)])
+    assert path == [(5, 1), (6, 1), (7, 1), (8, 1), (9, 1)]
+
+    # No time left
+    assert DangerMap(mapa, [[[5, 1], 1, 3]]).search_for_escape((5, 1)) is None
+
+
+def test_search_for_escape_crossing_blasts(mapa):
+    mapa.walls = []
+    # the bomb on (3, 1) blows up in 2 moves, then the tile is safe: wait for it
+    danger = DangerMap(mapa, [[[1, 1], 4, 3], [[3, 3], 1.5, 3]])
+
+    path = danger.search_for_escape((1, 1))
+    for moves, pos in enumerate(path):
+        assert not danger.is_dangerous(pos, moves)
+    assert danger.is_safe(path[-1], len(path) - 1)
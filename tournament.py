@@ -0,0 +1,140 @@
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bomberman import Bomberman
+from game import LIVES, TIMEOUT, Game
+from map_pack import load_pack
+from mapa import Map
+
+
+def play(seed, level=1, lives=LIVES, timeout=TIMEOUT, maps=None):
+    """
+    Function that plays one game of our agent in-process, as fast as possible
+    @param seed: Seed for the game (maps and enemies) and for the agent's random keys
+    @param level: Level to start at
+    @param maps: Map pack file to load the game's maps from (see map_pack.py), if any
+    @returns: The game's result, as a dict
+    """
+    rng = random.Random(seed)
+    game = Game(level=level, lives=lives, timeout=timeout, seed=seed, maps=load_pack(maps) if maps else None)
+    game.start("tournament")
+
+    # Same as student.py, without the websocket
+    info = game.info()
+    mapa = Map(size=info["size"], mapa=info["map"])
+    agent = Bomberman()
+
+    def policy(_):
+        state = json.loads(game.state)  # The agent expects the state as it comes over the wire
+        mapa.walls = state["walls"]
+        agent.update_state(state, mapa)
+        key = agent.next_move()
+        if key is None:
+            key = rng.choice(["w", "a", "s", "d"])
+        return key
+
+    start = time.perf_counter()
+    game.run_until_done(policy)
+    return {
+        "seed": seed,
+        "start_level": level,
+        "score": game.score,
+        "total_steps": game.total_steps,
+        "level": game.map.level,
+        "deaths": lives - game._bomberman.lives,
+        "time": round(time.perf_counter() - start, 3),
+    }
+
+
+def aggregate(results):
+    """
+    Function that sums up a tournament's results, overall and by start level
+    @param results: Results as returned by play
+    """
+
+    def summary(results):
+        return {
+            "games": len(results),
+            "mean_score": statistics.mean([r["score"] for r in results]),
+            "median_score": statistics.median([r["score"] for r in results]),
+            "mean_level": statistics.mean([r["level"] for r in results]),
+            "max_level": max([r["level"] for r in results]),
+            "mean_steps": statistics.mean([r["total_steps"] for r in results]),
+            "deaths": sum([r["deaths"] for r in results]),
+            "time": round(sum([r["time"] for r in results]), 3),
+        }
+
+    if not results:
+        return {"games": 0}
+    report = summary(results)
+    report["by_start_level"] = {
+        level: summary([r for r in results if r["start_level"] == level])
+        for level in sorted({r["start_level"] for r in results})
+    }
+    return report
+
+
+def parse_numbers(numbers):
+    """Function that parses lists like "1-24" or "1,3,5" (or both, "1-3,7")."""
+    parsed = []
+    for part in numbers.split(","):
+        first, _, last = part.partition("-")
+        parsed.extend(range(int(first), int(last or first) + 1))
+    return parsed
+
+
+def run_tournament(seeds, levels, lives=LIVES, timeout=TIMEOUT, workers=None, output=sys.stdout, maps=None):
+    """
+    Function that plays every (seed, start level) game over a pool of processes, writing each
+    result as a JSON line as soon as it's done
+    @param workers: How many processes to use (all cores by default)
+    @param maps: Map pack file the games load their maps from, if any
+    @returns: The aggregated report
+    """
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        initializer=logging.disable,  # The game logs every explosion
+        initargs=(logging.INFO,),
+    ) as executor:
+        jobs = [
+            executor.submit(play, seed, level, lives, timeout, maps)
+            for level in levels
+            for seed in seeds
+        ]
+        for job in as_completed(jobs):
+            result = job.result()
+            results.append(result)
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    return aggregate(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeds", help="Seeds to play, e.g 1-24 or 1,5,9", default="1-8")
+    parser.add_argument("--levels", help="Levels to start at, e.g 1 or 1-15", default="1")
+    parser.add_argument("--lives", help="Number of lives", type=int, default=LIVES)
+    parser.add_argument(
+        "--timeout", help="Timeout after this amount of steps", type=int, default=TIMEOUT
+    )
+    parser.add_argument("--workers", help="Number of processes (default: all cores)", type=int)
+    parser.add_argument("--report", help="Also save the aggregated report to this file")
+    parser.add_argument("--maps", help="Map pack to load the maps from (see map_pack.py)")
+    args = parser.parse_args()
+
+    report = run_tournament(
+        parse_numbers(args.seeds), parse_numbers(args.levels), args.lives, args.timeout, args.workers,
+        maps=args.maps,
+    )
+    print(json.dumps(report, indent=2), file=sys.stderr)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
@@ -1,3 +1,7 @@
+import heapq
+import math
+
+
 class SearchNode:
     def __init__(self, pos, parent=None, cost_to_origin=0, cost_to_target=0):
         self.pos = pos  # Might have to change to tuple
@@ -28,11 +32,17 @@ class SearchTree:
         self.mapa = None
         self.objective = None
 
-        self.open_nodes = []
-        self.closed_nodes = []
-        self.newly_created_nodes = []
+        self.open_nodes = []  # Heap of (total cost, cost to target, insertion order, node)
+        self.open_positions = set()
+        self.closed_nodes = set()
+        self.created_nodes = {}  # Every node created in the current search, by position
         self.limit = 1500   #TODO: TEST WITH DIFFERENT VALUES
 
+        # Counters over every search, for telemetry
+        self.calls = 0
+        self.expanded_nodes = 0
+        self.limit_hits = 0
+
     def search_for_path(
         self,
         mapa,
@@ -51,23 +61,29 @@ class SearchTree:
         """
         self.mapa = mapa
         self.objective = objective
+        self.calls += 1
 
         self.root = SearchNode(current_pos)
         self.target_pos = target_pos
 
-        self.open_nodes = [self.root]
-        self.closed_nodes = []
+        self.open_nodes = [(self.root.get_total_cost(), 0, 0, self.root)]
+        self.open_positions = {current_pos}
+        self.closed_nodes = set()
 
-        self.newly_created_nodes = []
+        self.created_nodes = {current_pos: self.root}
 
         open_nodes_number = 0
+        pushed_nodes_number = 1  # Breaks remaining cost ties in insertion order
 
-        while self.open_nodes != []:
+        while self.open_nodes:
             # Get the currently open, lowest cost node
-            current_node = min(self.open_nodes, key=lambda node: node.get_total_cost())
-            
-            self.open_nodes.remove(current_node)
-            self.closed_nodes.append(current_node)
+            *_, current_node = heapq.heappop(self.open_nodes)
+            if current_node.pos in self.closed_nodes:
+                continue  # Stale heap entry left behind by a cheaper path
+
+            self.open_positions.discard(current_node.pos)
+            self.closed_nodes.add(current_node.pos)
+            self.expanded_nodes += 1
 
             # Check if that node is the goal
             if self.check_if_goal_reached(current_node.pos, target_pos, objective):
@@ -81,22 +97,32 @@ class SearchTree:
                 )
 
             for neighbour_node in current_node.neighbours:
-                if neighbour_node in self.closed_nodes:
+                if neighbour_node.pos in self.closed_nodes:
                     continue
 
                 new_cost_to_neighbour = current_node.cost_to_origin + 1
-                if (
-                    neighbour_node not in self.open_nodes
-                    or new_cost_to_neighbour < neighbour_node.cost_to_origin
-                ):
+                is_open = neighbour_node.pos in self.open_positions
+                if not is_open or new_cost_to_neighbour < neighbour_node.cost_to_origin:
                     neighbour_node.cost_to_origin = new_cost_to_neighbour
                     neighbour_node.parent = current_node
 
-                    if neighbour_node not in self.open_nodes:
-                        self.open_nodes.append(neighbour_node)
+                    heapq.heappush(
+                        self.open_nodes,
+                        (
+                            neighbour_node.get_total_cost(),
+                            neighbour_node.cost_to_target,
+                            pushed_nodes_number,
+                            neighbour_node,
+                        ),
+                    )
+                    pushed_nodes_number += 1
+
+                    if not is_open:
+                        self.open_positions.add(neighbour_node.pos)
                         open_nodes_number += 1
 
             if open_nodes_number > self.limit:
+                self.limit_hits += 1
                 return None
 
         return None
@@ -107,7 +133,20 @@ class SearchTree:
         @param pos_one: Starting position
         @param pos_one: Target position
         """
-        return abs(pos_two[0] - pos_one[0] + pos_two[1] - pos_one[1])
+        return abs(pos_two[0] - pos_one[0]) + abs(pos_two[1] - pos_one[1])
+
+    def compute_heuristic(self, pos):
+        """
+        Function that estimates the cost from a position to our goal, using the map's
+        walking distances around stones (Manhattan distance if the map can't tell)
+        @param pos: Position to estimate from
+        """
+        distance = self.mapa.distance(self.target_pos, pos)
+        if distance is None:
+            distance = self.compute_distance(pos, self.target_pos)
+        if self.objective == "FIND_WALL":  # Any tile next to the wall is a goal
+            distance = max(distance - 1, 0)
+        return distance
 
     def compute_node_neighbours(self, node, enemies, time_to_explode, dangerous_tiles):
         """
@@ -126,53 +165,24 @@ class SearchTree:
                 if i == "d":
                     next_pos = cx + 1, cy
 
-                if not self.mapa.is_blocked(next_pos) or next_pos == self.target_pos:
-                    # If we still haven't created that node, create it
-                    if not any(
-                        created_node.pos == next_pos
-                        for created_node in self.newly_created_nodes
-                    ):
-                        neighbour = SearchNode(
-                            next_pos,
-                            node,
-                            node.cost_to_origin + 1,
-                            self.compute_distance(next_pos, self.target_pos),
-                        )
-                        node.neighbours.append(neighbour)
-                        self.newly_created_nodes.append(neighbour)
-                    else:
-                        node.neighbours.append(
-                            [
-                                created_node
-                                for created_node in self.newly_created_nodes
-                                if created_node.pos == next_pos
-                            ][0]
-                        )
-
+                if self.mapa.is_blocked(next_pos) and next_pos != self.target_pos:
+                    continue
             else:
                 next_pos = self.mapa.calc_pos(node.pos, i)
-                if next_pos != node.pos:
-                    # If we still haven't created that node, create it
-                    if not any(
-                        created_node.pos == next_pos
-                        for created_node in self.newly_created_nodes
-                    ):
-                        neighbour = SearchNode(
-                            next_pos,
-                            node,
-                            node.cost_to_origin + 1,
-                            self.compute_distance(next_pos, self.target_pos),
-                        )
-                        node.neighbours.append(neighbour)
-                        self.newly_created_nodes.append(neighbour)
-                    else:
-                        node.neighbours.append(
-                            [
-                                created_node
-                                for created_node in self.newly_created_nodes
-                                if created_node.pos == next_pos
-                            ][0]
-                        )
+                if next_pos == node.pos:
+                    continue
+
+            # If we still haven't created that node, create it
+            neighbour = self.created_nodes.get(next_pos)
+            if neighbour is None:
+                neighbour = SearchNode(
+                    next_pos,
+                    node,
+                    node.cost_to_origin + 1,
+                    self.compute_heuristic(next_pos),
+                )
+                self.created_nodes[next_pos] = neighbour
+            node.neighbours.append(neighbour)
 
     def check_if_goal_reached(self, test_pos, target_pos, objective):
         """
@@ -193,9 +203,494 @@ class SearchTree:
         Function used to backtrack and return our path
         @param node: The node we want to know the path to
         """
-        if node.parent == None:
-            return [node.pos]
-        path = self.get_path(node.parent)
-        path += [node.pos]
+        path = []
+        while node is not None:
+            path.append(node.pos)
+            node = node.parent
+        path.reverse()
+        return path
+
+
+class DistanceField:
+    """
+    Breadth first flood fill from one position. One pass gives the true walking distance, the
+    path and the first step towards every reachable tile, so any number of targets (walls,
+    enemies, powerups, the exit) can be ranked and reached without searching for each one
+    """
+
+    def __init__(self, mapa, origin, wallpass=False):
+        self.mapa = mapa
+        self.origin = origin
+        self.wallpass = wallpass
+
+        # Flat lists indexed by x * ver_tiles + y, holding None for tiles we can't reach
+        size = mapa.hor_tiles * mapa.ver_tiles
+        self.distances = [None] * size
+        self.parents = [None] * size
+        self.first_steps = [None] * size
+        self.wall_parents = {}  # Closest reachable tile next to every wall we bumped into, by index
+
+        ver_tiles = mapa.ver_tiles
+        neighbours = mapa.stone_neighbours()
+        walls = [False] * size if wallpass else mapa.wall_mask.ravel().tolist()
+
+        origin_idx = origin[0] * ver_tiles + origin[1]
+        self.distances[origin_idx] = 0
+        self.first_steps[origin_idx] = origin_idx
+        frontier = []
+        for idx in neighbours[origin_idx]:  # Our first steps are their own first steps
+            if walls[idx]:
+                self.wall_parents[idx] = origin_idx
+            else:
+                self.distances[idx] = 1
+                self.parents[idx] = origin_idx
+                self.first_steps[idx] = idx
+                frontier.append(idx)
+
+        distance = 1
+        while frontier:
+            distance += 1
+            next_frontier = []
+            for idx in frontier:
+                first_step = self.first_steps[idx]
+                for neighbour in neighbours[idx]:
+                    if self.distances[neighbour] is not None:
+                        continue
+                    if walls[neighbour]:
+                        if neighbour not in self.wall_parents:
+                            self.wall_parents[neighbour] = idx
+                        continue
+                    self.distances[neighbour] = distance
+                    self.parents[neighbour] = idx
+                    self.first_steps[neighbour] = first_step
+                    next_frontier.append(neighbour)
+            frontier = next_frontier
+
+    def get_index(self, pos):
+        x, y = pos
+        if 0 <= x < self.mapa.hor_tiles and 0 <= y < self.mapa.ver_tiles:
+            return x * self.mapa.ver_tiles + y
+        return None
+
+    def get_distance(self, pos):
+        """
+        Function that returns how many moves it takes to reach a tile (None if unreachable)
+        @param pos: The tile we want to reach
+        """
+        idx = self.get_index(pos)
+        return None if idx is None else self.distances[idx]
+
+    def get_nearest_adjacent(self, pos):
+        """
+        Function that returns the closest reachable tile next to a given tile (e.g a wall), or None
+        @param pos: The tile we want to stand next to
+        """
+        x, y = pos
+        idx = self.get_index(pos)
+        if idx in self.wall_parents:  # Found while flooding, no need to look around
+            parent = self.wall_parents[idx]
+            return (parent // self.mapa.ver_tiles, parent % self.mapa.ver_tiles)
+
+        nearest, nearest_distance = None, None
+        for neighbour in [(x, y - 1), (x - 1, y), (x, y + 1), (x + 1, y)]:
+            distance = self.get_distance(neighbour)
+            if distance is not None and (nearest_distance is None or distance < nearest_distance):
+                nearest, nearest_distance = neighbour, distance
+        return nearest
+
+    def get_distance_to_adjacent(self, pos):
+        """
+        Function that returns how many moves it takes to stand next to a tile (None if we can't)
+        @param pos: The tile we want to stand next to
+        """
+        neighbour = self.get_nearest_adjacent(pos)
+        if neighbour is None:
+            return None
+        return self.get_distance(neighbour)
+
+    def find_nearest(self, targets, adjacent=False):
+        """
+        Function that picks the reachable target that's closest to walk to
+        @param targets: Candidate positions
+        @param adjacent: Whether we only need to stand next to the target (e.g walls)
+        @returns: The nearest target as a tuple, or None if none can be reached
+        """
+        get_distance = self.get_distance_to_adjacent if adjacent else self.get_distance
+        nearest, nearest_distance = None, None
+        for target in targets:
+            distance = get_distance(target)
+            if distance is not None and (nearest_distance is None or distance < nearest_distance):
+                nearest, nearest_distance = tuple(target), distance
+        return nearest
+
+    def get_path(self, pos, adjacent=False):
+        """
+        Function used to backtrack and return the path from our origin to a tile (None if unreachable)
+        @param pos: The tile we want to reach
+        @param adjacent: Whether we only need to stand next to the tile (e.g walls)
+        """
+        if adjacent:
+            pos = self.get_nearest_adjacent(pos)
+            if pos is None:
+                return None
+        idx = self.get_index(pos)
+        if idx is None or self.distances[idx] is None:
+            return None
+
+        ver_tiles = self.mapa.ver_tiles
+        path = []
+        while idx is not None:
+            path.append((idx // ver_tiles, idx % ver_tiles))
+            idx = self.parents[idx]
+        path.reverse()
+        return path
+
+    def get_direction(self, pos):
+        """
+        Function that returns the key of the first move towards a tile ("" if we're on it, None if unreachable)
+        @param pos: The tile we want to reach
+        """
+        idx = self.get_index(pos)
+        if idx is None or self.first_steps[idx] is None:
+            return None
+        first_step = self.first_steps[idx]
+        fx, fy = first_step // self.mapa.ver_tiles, first_step % self.mapa.ver_tiles
+        ox, oy = self.origin
+        return {(0, -1): "w", (-1, 0): "a", (0, 1): "s", (1, 0): "d", (0, 0): ""}[(fx - ox, fy - oy)]
+
+
+class DangerMap:
+    """
+    Per tick map of when each tile will be inside a bomb's blast, plus a breadth first search
+    over (tile, time) for the shortest route to a tile no blast will ever reach
+    """
+
+    def __init__(self, mapa, bombs):
+        """
+        @param mapa: Our current map
+        @param bombs: The bombs on the map, as the game sends them: (pos, timeout, radius)
+        """
+        self.mapa = mapa
+        self.bombs = {tuple(pos) for pos, _, _ in bombs}
+
+        # A bomb's timeout drops by 1/2 every frame and it blows up, before we get to move, in the
+        # frame it reaches 0. So we get ceil(2 * timeout) - 1 more moves before it hits us.
+        self.blast_times = {}  # Moves we can still make before each tile is hit, by tile
+        for pos, timeout, radius in bombs:
+            blast_time = math.ceil(2 * timeout) - 1
+            for tile in mapa.blast_footprint(pos, radius):
+                self.blast_times.setdefault(tile, []).append(blast_time)
+
+        self.horizon = max([max(times) for times in self.blast_times.values()], default=0)
+
+    def is_dangerous(self, pos, moves):
+        """
+        Function that checks if a tile gets hit right after a given number of moves. We keep one
+        move of slack before every blast, in case our key arrives a frame late
+        @param pos: The tile
+        @param moves: How many moves from now we'd be standing there
+        """
+        return any(
+            blast_time - 1 <= moves <= blast_time for blast_time in self.blast_times.get(pos, [])
+        )
+
+    def is_safe(self, pos, moves=0):
+        """
+        Function that checks if no blast will reach a tile anymore after a given number of moves
+        @param pos: The tile
+        @param moves: How many moves from now we'd be standing there
+        """
+        return all(blast_time < moves for blast_time in self.blast_times.get(pos, []))
+
+    def search_for_escape(self, origin, enemies=[], wallpass=False, bombpass=False):
+        """
+        Function used to search for the shortest route to a safe tile that never crosses a
+        blast, waiting in place whenever that helps
+        @param origin: Our position
+        @param enemies: Tiles we won't step into or next to (enemy positions)
+        @param wallpass: Whether we can walk through walls
+        @param bombpass: Whether we can walk over bombs
+        @returns: The route (starting at origin), or None if we can't escape
+        """
+        unsafe = set()
+        for ex, ey in enemies:
+            unsafe.update([(ex, ey), (ex, ey - 1), (ex - 1, ey), (ex, ey + 1), (ex + 1, ey)])
+
+        parents = {(origin, 0): None}
+        frontier = [origin]
+        for moves in range(self.horizon + 2):
+            for pos in frontier:
+                if self.is_safe(pos, moves) and (pos == origin or pos not in unsafe):
+                    return self.get_path(parents, (pos, moves))
+
+            next_frontier = []
+            for pos in frontier:
+                cx, cy = pos
+                for next_pos in [pos, (cx, cy - 1), (cx - 1, cy), (cx, cy + 1), (cx + 1, cy)]:
+                    if (next_pos, moves + 1) in parents:
+                        continue
+                    if next_pos != pos and (
+                        self.mapa.is_blocked(next_pos, wallpass)
+                        or (next_pos in self.bombs and not bombpass)
+                        or next_pos in unsafe
+                    ):
+                        continue
+                    if self.is_dangerous(next_pos, moves + 1):
+                        continue
+                    parents[(next_pos, moves + 1)] = (pos, moves)
+                    next_frontier.append(next_pos)
+            frontier = next_frontier
+
+        return None
+
+    def get_path(self, parents, state):
+        path = []
+        while state is not None:
+            path.append(state[0])
+            state = parents[state]
+        path.reverse()
+        return path
+
+
+INFINITY = float("inf")
+
+
+class IncrementalSearch:
+    """
+    D* Lite search towards one target. It searches backwards, from the goal to the start,
+    and keeps its g/rhs values between calls so that, when the start moves or some tiles get
+    blocked/unblocked, only the affected part of the search is repaired
+    """
+
+    def __init__(self, mapa, target_pos, objective, blocked):
+        self.mapa = mapa
+        self.target_pos = target_pos
+        self.objective = objective
+        self.blocked = blocked  # Tiles (besides stones) we can't walk into
+
+        if objective == "FIND_WALL":  # Any tile next to the wall is a goal
+            self.goals = set(self.get_neighbours(target_pos))
+        else:
+            self.goals = {target_pos}
+
+        self.start = None
+        self.start_distances = None
+        self.km = 0  # Key modifier, accumulates how far the start has moved
+
+        self.g = {}
+        self.rhs = {goal: 0 for goal in self.goals}
+
+        self.open_nodes = []  # Heap of (key, insertion order, pos), with stale entries
+        self.open_keys = {}  # Current key of every open position
+        self.pushed_nodes_number = 0
+
+        self.expanded_nodes = 0
+        self.limit_hit = False  # Whether the last call gave up because of its limit
+
+    def search_for_path(self, current_pos, blocked, limit):
+        """
+        Function used to (re)plan the best path between a given position and our target
+        @param current_pos: The position we're at
+        @param blocked: Tiles we currently can't walk into, besides stones
+        @param limit: How many nodes we're allowed to expand in this call
+        """
+        if self.start is None:
+            self.move_start(current_pos)
+            for goal in self.goals:
+                self.push(goal)
+        elif current_pos != self.start:
+            last_start = self.start
+            self.move_start(current_pos)
+            self.km += self.compute_heuristic(last_start)
+
+        changed_tiles = self.blocked ^ blocked
+        self.blocked = blocked
+        for tile in changed_tiles:  # Moving into those tiles costs something else now
+            for neighbour in self.get_neighbours(tile):
+                self.update_node(neighbour)
+
+        self.limit_hit = not self.compute_shortest_path(limit)
+        if self.limit_hit:
+            return None
+        return self.get_path()
+
+    def move_start(self, pos):
+        self.start = pos
+        self.start_distances = self.mapa.stone_distances(pos)
+
+    def get_neighbours(self, pos):
+        x, y = pos
+        return [
+            (nx, ny)
+            for nx, ny in [(x, y - 1), (x - 1, y), (x, y + 1), (x + 1, y)]
+            if 0 <= nx < self.mapa.hor_tiles and 0 <= ny < self.mapa.ver_tiles
+        ]
+
+    def is_walkable(self, pos):
+        if pos == self.target_pos and self.objective in ["POWER_UP", "EXIT"]:
+            return True
+        return pos not in self.blocked and not self.mapa.is_blocked(pos, wallpass=True)
+
+    def compute_heuristic(self, pos):
+        """
+        Function that estimates the cost between the start and a given position
+        @param pos: Position to estimate to
+        """
+        distance = self.start_distances[pos[0] * self.mapa.ver_tiles + pos[1]]
+        if distance is None:
+            return abs(pos[0] - self.start[0]) + abs(pos[1] - self.start[1])
+        return distance
+
+    def compute_key(self, pos):
+        cost = min(self.g.get(pos, INFINITY), self.rhs.get(pos, INFINITY))
+        return (cost + self.compute_heuristic(pos) + self.km, cost)
+
+    def push(self, pos):
+        key = self.compute_key(pos)
+        self.open_keys[pos] = key
+        heapq.heappush(self.open_nodes, (key, self.pushed_nodes_number, pos))
+        self.pushed_nodes_number += 1
+
+    def get_top(self):
+        while self.open_nodes:
+            key, _, pos = self.open_nodes[0]
+            if self.open_keys.get(pos) == key:
+                return key, pos
+            heapq.heappop(self.open_nodes)  # Stale entry
+        return None, None
+
+    def update_node(self, pos):
+        if pos not in self.goals:
+            self.rhs[pos] = min(
+                [
+                    self.g.get(neighbour, INFINITY) + 1
+                    for neighbour in self.get_neighbours(pos)
+                    if self.is_walkable(neighbour)
+                ],
+                default=INFINITY,
+            )
+
+        self.open_keys.pop(pos, None)
+        if self.g.get(pos, INFINITY) != self.rhs.get(pos, INFINITY):
+            self.push(pos)
+
+    def compute_shortest_path(self, limit):
+        """
+        Function that expands nodes until the start's cost is known again
+        @param limit: How many nodes we're allowed to expand
+        @returns: False if we gave up because of the limit
+        """
+        expanded_nodes = 0
+        while True:
+            key, pos = self.get_top()
+            if key is None or (
+                key >= self.compute_key(self.start)
+                and self.g.get(self.start, INFINITY) == self.rhs.get(self.start, INFINITY)
+            ):
+                return True
+
+            if expanded_nodes >= limit:
+                return False
+            expanded_nodes += 1
+            self.expanded_nodes += 1
+
+            heapq.heappop(self.open_nodes)
+            del self.open_keys[pos]
+
+            new_key = self.compute_key(pos)
+            if key < new_key:
+                self.push(pos)
+            elif self.g.get(pos, INFINITY) > self.rhs[pos]:
+                self.g[pos] = self.rhs[pos]
+                if self.is_walkable(pos):  # Otherwise no one can step into it anyway
+                    for neighbour in self.get_neighbours(pos):
+                        self.update_node(neighbour)
+            else:
+                self.g[pos] = INFINITY
+                self.update_node(pos)
+                if self.is_walkable(pos):
+                    for neighbour in self.get_neighbours(pos):
+                        self.update_node(neighbour)
+
+    def get_path(self):
+        """
+        Function used to follow the cheapest neighbours from the start to a goal and return our path
+        """
+        pos = self.start
+        if self.g.get(pos, INFINITY) == INFINITY:
+            return None
+
+        path = [pos]
+        while pos not in self.goals:
+            pos = min(
+                [n for n in self.get_neighbours(pos) if self.is_walkable(n)],
+                key=lambda n: self.g.get(n, INFINITY),
+                default=None,
+            )
+            if pos is None or self.g.get(pos, INFINITY) == INFINITY or len(path) > len(self.g):
+                return None
+            path.append(pos)
         return path
 
+
+class IncrementalSearchTree:
+    """
+    Drop-in replacement for SearchTree that replans incrementally across ticks. It keeps one
+    IncrementalSearch per (target, objective), so that going after the same target tick after
+    tick only costs as much as what changed since the last tick (our position, destroyed walls
+    and, with avoid_enemies, enemy moves)
+    """
+
+    def __init__(self, avoid_enemies=False, max_searches=8):
+        """
+        @param avoid_enemies: Whether enemies block us, for every objective (True or False) or
+        only for the objectives in it (e.g ("FIND_WALL", "EXIT"))
+        @param max_searches: How many searches are kept
+        """
+        self.searches = {}  # IncrementalSearch by (target, objective), least recently used first
+        self.avoid_enemies = avoid_enemies
+        self.max_searches = max_searches
+        self.limit = 1500
+
+        # Counters over every search, for telemetry
+        self.calls = 0
+        self.expanded_nodes = 0
+        self.limit_hits = 0
+
+    def search_for_path(
+        self,
+        mapa,
+        current_pos,
+        target_pos,
+        enemies,
+        time_to_explode=None,
+        objective="FIND_WALL",
+        dangerous_tiles=[],
+    ):
+        """
+        Function used to search for the best path between a given position and target
+        @param mapa: Our current map
+        @param current_pos: The position we're at
+        @param target_pos: Our target's position
+        @param enemies: The enemies on the map, which block us if avoid_enemies is set for the objective
+        """
+        blocked = {tuple(wall) for wall in mapa.walls}
+        if self.avoid_enemies is True or objective in (self.avoid_enemies or ()):
+            blocked.update(tuple(enemy["pos"]) for enemy in enemies)
+            blocked.discard(target_pos)
+
+        search = self.searches.pop((target_pos, objective), None)
+        if search is None or search.mapa is not mapa:
+            search = IncrementalSearch(mapa, target_pos, objective, blocked)
+        self.searches[(target_pos, objective)] = search
+
+        while len(self.searches) > self.max_searches:
+            del self.searches[next(iter(self.searches))]
+
+        self.calls += 1
+        expanded_nodes = search.expanded_nodes
+        path = search.search_for_path(current_pos, blocked, self.limit)
+        self.expanded_nodes += search.expanded_nodes - expanded_nodes
+        if search.limit_hit:
+            self.limit_hits += 1
+        return path
@@ -9,6 +9,8 @@ import websockets
 import logging
 import argparse
 import time
+from codec import decode_message
+from delta import DeltaDecoder
 from mapa import Map, Tiles
 
 logging.basicConfig(level=logging.DEBUG)
@@ -124,9 +126,9 @@ RANKS = {
 SPRITES = None
 
 
-async def messages_handler(ws_path, queue):
+async def messages_handler(ws_path, queue, format="delta"):
     async with websockets.connect(ws_path) as websocket:
-        await websocket.send(json.dumps({"cmd": "join"}))
+        await websocket.send(json.dumps({"cmd": "join", "delta": True, "format": format}))
 
         while True:
             r = await websocket.recv()
@@ -382,6 +384,7 @@ async def main_game():
     main_group.add(BomberMan(pos=mapa.bomberman_spawn))
 
     state = {"score": 0, "player": "player1", "bomberman": (1, 1)}
+    decoder = DeltaDecoder()  # We join asking for deltas (or binary frames)
 
     while True:
         SCREEN.blit(BACKGROUND, (0, 0))
@@ -517,7 +520,7 @@ async def main_game():
         pygame.display.flip()
 
         try:
-            state = json.loads(q.get_nowait())
+            state = decoder.apply(decode_message(q.get_nowait()))
 
             if (
                 "step" in state
@@ -551,6 +554,9 @@ if __name__ == "__main__":
         "--scale", help="reduce size of window by x times", type=int, default=1
     )
     parser.add_argument("--port", help="TCP port", type=int, default=PORT)
+    parser.add_argument(
+        "--format", help="format of the game states", choices=["delta", "binary"], default="delta"
+    )
     args = parser.parse_args()
     SCALE = args.scale
 
@@ -562,7 +568,7 @@ if __name__ == "__main__":
 
     try:
         LOOP.run_until_complete(
-            asyncio.gather(messages_handler(ws_path, q), main_loop(q))
+            asyncio.gather(messages_handler(ws_path, q, args.format), main_loop(q))
         )
     finally:
         LOOP.stop()